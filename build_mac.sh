@@ -1,7 +1,7 @@
 #!/bin/bash
 
 # 确保必要的依赖已安装
-pip3 install pyobjc psutil pyperclip py2app
+pip3 install pyobjc psutil pyperclip numpy py2app
 
 # 清理之前的构建
 rm -rf build dist
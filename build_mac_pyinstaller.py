@@ -9,7 +9,7 @@ import subprocess
 
 # 确保必要的依赖已安装
 print("安装必要的依赖...")
-subprocess.call([sys.executable, "-m", "pip", "install", "pyinstaller", "pyobjc", "psutil", "pyperclip"])
+subprocess.call([sys.executable, "-m", "pip", "install", "pyinstaller", "pyobjc", "psutil", "pyperclip", "numpy"])
 
 # 创建 spec 文件内容
 spec_content = """
@@ -22,7 +22,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['AppKit', 'Quartz', 'Foundation', 'objc', 'psutil', 'PyObjCTools.AppHelper'],
+    hiddenimports=['AppKit', 'Quartz', 'Foundation', 'objc', 'psutil', 'numpy', 'PyObjCTools.AppHelper'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -1,622 +1,4399 @@
-import pyperclip
-import re
 import time
+# 启动计时起点（--startup-profile）
+_MODULE_START = time.perf_counter()
+import re
 import threading
 import sys
 import os
 import subprocess
 import traceback
+import hashlib
+import struct
+import codecs
+import mmap
+import zipfile
+import queue
+import atexit
+import bisect
+import functools
+import math
+import json
+import multiprocessing
+import multiprocessing.connection
+import socket
+import select
+import concurrent.futures
 from datetime import datetime
+from collections import namedtuple, OrderedDict
 import platform
+import importlib
+import argparse
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
 
 # 检测操作系统类型
 SYSTEM = platform.system()
 IS_WINDOWS = SYSTEM == "Windows"
 IS_MAC = SYSTEM == "Darwin"
 
-# 根据操作系统导入相应的模块
-if IS_WINDOWS:
-    import win32con
-    import win32gui
-    import win32api
-    import win32clipboard
-    import ctypes
-    from ctypes import wintypes
-    try:
-        import psutil
-        import win32process
-    except ImportError:
-        print("正在安装必要的依赖: psutil和pywin32...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "psutil pywin32"])
-        import psutil
-        import win32process
-elif IS_MAC:
-    try:
-        import AppKit
-        import Quartz
-        import Foundation
-        import objc
-        import psutil
-        from PyObjCTools import AppHelper
-    except ImportError:
-        print("正在安装必要的依赖: pyobjc和psutil...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "pyobjc psutil"])
-        import AppKit
-        import Quartz
-        import Foundation
-        import objc
-        import psutil
-        from PyObjCTools import AppHelper
+# 各平台依赖的模块：(模块名, 安装包名)。启动监控时才导入（见 load_platform_modules），
+# 导入 safeclip 本身（基准脚本、匹配工作进程）不加载这些模块
+PLATFORM_DEPENDENCIES = {
+    "Windows": [("win32con", "pywin32"), ("win32gui", "pywin32"), ("win32api", "pywin32"),
+                ("win32clipboard", "pywin32"), ("win32process", "pywin32"), ("psutil", "psutil")],
+    "Darwin": [("AppKit", "pyobjc"), ("Quartz", "pyobjc"), ("psutil", "psutil")],
+    None: [("psutil", "psutil")],  # 其他平台只检测黑名单进程
+}
 
 # ------------ 配置区域（按需修改）------------
-# 敏感数据正则规则（可自定义）
+# 敏感数据正则规则（可自定义）：(规则ID, 正则表达式)
 SENSITIVE_PATTERNS = [
-    r'\b\d{17}[\dXx]\b',  # 简化的身份证号匹配（18位）
-    r'\b\d{15}\b',  # 简化的身份证号匹配（15位旧版）
-    r'\b\d{4}[ -]?\d{4}[ -]?\d{4}[ -]?\d{2}[ -]?\d{2}[ -]?\d{3}[ -]?[\dXx]\b',  # 身份证号（兼容空格/横线）
-    r'\b(1[3-9]\d{1})[ -]?\d{4}[ -]?\d{4}\b',  # 手机号（兼容空格/横线）
-    r'\b(张三|李四|王五)\b'  # 敏感姓名（示例）
+    ("id_card_18", r'\b\d{17}[\dXx]\b'),  # 简化的身份证号匹配（18位）
+    ("id_card_15", r'\b\d{15}\b'),  # 简化的身份证号匹配（15位旧版）
+    ("id_card_sep", r'\b\d(?:[ -]?\d){16}[ -]?[\dXx]\b'),  # 身份证号（18 位，允许单个空格/横线分隔，如 110101 19900307 123X）
+    ("mobile", r'\b(1[3-9]\d{1})[ -]?\d{4}[ -]?\d{4}\b'),  # 手机号（兼容空格/横线）
+    ("name", r'\b(张三|李四|王五)\b'),  # 敏感姓名（示例）
 ]
 
-# 黑名单应用窗口标题关键词
+# 规则命中后的结构校验（规则ID -> 校验器名）：排除订单号、快递单号等恰好位数相同的普通数字
+#   id_card_18: GB 11643 校验位 + 出生日期；id_card_15: 出生日期；mobile: 手机号段
+#   只用于规则ID和正则都与 SENSITIVE_PATTERNS 相同的内置规则；配置文件中的规则需要显式写出 validator
+RULE_VALIDATORS = {"id_card_18": "id_card_18", "id_card_sep": "id_card_18", "id_card_15": "id_card_15", "mobile": "mobile"}
+
+# 规则命中至少包含的数字个数（数字间允许单个空格/横线）：文本中没有这么长的数字串时跳过这些规则
+#   与 RULE_VALIDATORS 相同，只用于内置规则；配置文件中的规则需要显式写出 min_digits
+RULE_MIN_DIGITS = {"id_card_18": 17, "id_card_15": 15, "id_card_sep": 17, "mobile": 11}
+
+# 黑名单应用窗口标题关键词（不区分大小写）
 BLOCKED_APPS = ["微信", "wechat", "telegram", "skype", "whatsapp", "qq", "tim"]
 
-# 黑名单应用进程名称
+# 黑名单应用进程名称（不区分大小写）
 if IS_WINDOWS:
-    BLOCKED_PROCESSES = ["WeChat.exe", "wechat.exe", "QQ.exe", "qq.exe", "TIM.exe", "tim.exe", "Telegram.exe", "telegram.exe"]
+    BLOCKED_PROCESSES = ["WeChat.exe", "QQ.exe", "TIM.exe", "Telegram.exe"]
 elif IS_MAC:
-    BLOCKED_PROCESSES = ["WeChat", "wechat", "QQ", "Telegram", "TIM", "tim", "Skype", "WhatsApp"]
+    BLOCKED_PROCESSES = ["WeChat", "QQ", "Telegram", "TIM", "Skype", "WhatsApp"]
+else:
+    BLOCKED_PROCESSES = []
+
+# 加载规则时的性能检查："warn" 记录慢规则，"refuse" 拒绝加载包含慢规则的配置文件，"off" 不检查
+RULE_ANALYSIS = "warn"
+
+# 规则性能检查：最坏情况输入的最大长度（字符），以及单次匹配超过多少秒就停止加长输入并判定为慢规则
+RULE_ANALYSIS_MAX_LEN = 4096
+RULE_ANALYSIS_TIME_LIMIT = 0.05
+
+# 规则性能检查在独立进程中运行，超过该总时限（秒）就终止检查进程（失控的规则不会卡住调度线程）
+RULE_ANALYSIS_DEADLINE = 5.0
+
+# 普通文本上吞吐量低于此值（MB/s）的规则视为慢规则
+RULE_MIN_THROUGHPUT = 1.0
+
+# 外部配置文件（JSON，或 Python 3.11+ 下的 TOML）：可覆盖敏感规则、黑名单应用和检测频率，修改后自动生效
+CONFIG_FILE = "safeclip_config.json"
+
+# 检查配置文件是否修改的周期（秒，只比较修改时间和大小）
+CONFIG_CHECK_INTERVAL = 2.0
+
+# 本地控制接口地址（查询状态、重新加载规则、暂停/恢复保护）：Windows 为命名管道，macOS 为 Unix 域套接字，
+# "127.0.0.1:端口" 为本机 TCP（测试用）；空字符串表示不开启
+CONTROL_ADDRESS = r"\\.\pipe\safeclip" if IS_WINDOWS else os.path.expanduser("~/.safeclip.sock")
 
-# 检测频率（秒）
+# 控制接口认证密钥文件（首次启动时生成，只有当前用户可读）
+CONTROL_AUTHKEY_FILE = os.path.expanduser("~/.safeclip_control.key")
+
+# 内容摘要密钥文件（首次启动时生成，只有当前用户可读）：事件日志和上报中的摘要带密钥计算，
+# 拿到日志的人无法通过穷举手机号、身份证号等还原内容；replay --texts 读取同一密钥在本机匹配原文
+DIGEST_KEY_FILE = os.path.expanduser("~/.safeclip_digest.key")
+
+# 控制命令等待调度线程执行的最长时间（秒）
+CONTROL_TIMEOUT = 5.0
+
+# 检测频率（秒）：黑名单应用在前台、剪贴板持有敏感内容或刚有操作时的检测间隔
 CHECK_INTERVAL = 0.1
 
+# 安全时限（秒）：空闲时检测间隔按指数退避，但不超过此值（切换到黑名单应用后最迟多久能发现）
+MAX_CHECK_INTERVAL = 1.0
+
+# 空闲退避倍数（每次空闲检测后间隔乘以此值）
+CHECK_BACKOFF_FACTOR = 2.0
+
+# 剪贴板变化或窗口切换后保持最快检测频率的时间（秒）
+ACTIVITY_HOLD_TIME = 5.0
+
+# 进程名缓存条数（前台窗口解析器）
+WINDOW_CACHE_SIZE = 64
+
+# 黑名单应用匹配结果的缓存窗口数（按窗口标题和进程名）
+APP_POLICY_CACHE_SIZE = 256
+
+# 运行进程索引的刷新周期（秒）
+PROCESS_REFRESH_INTERVAL = 2.0
+
+# 激进清理周期（秒）：黑名单应用在前台时重复检查剪贴板
+CLEANER_INTERVAL = 0.2
+
+# 按键检测周期（秒）：黑名单应用在前台时检测 Ctrl+V（仅 Windows）
+KEY_POLL_INTERVAL = 0.01
+
+# 无变化事件可用时轮询剪贴板序列号的间隔（秒，只读序列号，不读取内容）
+CLIPBOARD_POLL_INTERVAL = 0.05
+
+# 读取剪贴板内容失败（如被其他程序占用）后的重试间隔（秒），连续失败时加倍，最长 SNAPSHOT_RETRY_MAX 秒
+SNAPSHOT_RETRY_DELAY = 0.02
+SNAPSHOT_RETRY_MAX = 1.0
+
+# 检测结果缓存条数（按内容摘要缓存，相同内容不重复扫描）
+VERDICT_CACHE_SIZE = 256
+
+# 超过该长度（字符）的剪贴板内容分块扫描，命中即停止
+SCAN_CHUNK_SIZE = 64 * 1024
+
+# 单次扫描最多检查的字符数
+SCAN_MAX_CHARS = 2 * 1024 * 1024
+
+# 单次扫描的时间预算（秒）
+SCAN_TIME_BUDGET = 0.2
+
+# 超出扫描预算或匹配超时时的处理策略："block" 视为敏感内容拦截（fail-closed），"allow" 放行（fail-open）
+SCAN_OVERBUDGET_POLICY = "block"
+
+# 规则匹配的运行方式："process" 在独立的工作进程中匹配（规则回溯失控时可以强制终止），"inline" 在检测线程中直接匹配
+SCAN_ISOLATION = "process"
+
+# 单次匹配的硬性时限（秒）：工作进程超时未返回时被终止并重启，本次内容按 SCAN_OVERBUDGET_POLICY 处理
+SCAN_HARD_TIMEOUT = 1.0
+
+# 检测线程等待匹配结果的最长时间（秒）：超过后先继续窗口和图片检测，结果返回后再处理
+SCAN_WAIT = 0.05
+
+# 工作进程启动的最长等待时间（秒）
+SCAN_WORKER_START_TIMEOUT = 30.0
+
+# 无上限长度的规则（如 .*）在分块扫描时使用的窗口重叠长度（字符）
+SCAN_OVERLAP = 1024
+
+# 是否检测复制的文件的内容（资源管理器 / 访达中复制的文件，包括 xlsx、docx 等 Office 文档）
+FILE_SCAN_ENABLED = True
+
+# 单个文件最多扫描的字节数，超出部分不扫描，按 SCAN_OVERBUDGET_POLICY 处理
+FILE_SCAN_MAX_BYTES = 64 * 1024 * 1024
+
+# 单个文件的扫描时间上限（秒）
+FILE_SCAN_TIME_BUDGET = 2.0
+
+# 一次复制最多检测的文件个数（复制目录时包括其中的文件），超出部分按 SCAN_OVERBUDGET_POLICY 处理
+FILE_SCAN_MAX_FILES = 50
+
+# 文件按块读取和解码的块大小（字节）
+FILE_SCAN_CHUNK_SIZE = 1024 * 1024
+
+# 并行扫描文件的线程数
+FILE_SCAN_WORKERS = 4
+
+# 文件检测结论缓存条数（按路径、大小、修改时间和 inode 缓存，重复复制同一文件不再扫描）
+FILE_VERDICT_CACHE_SIZE = 1024
+
+# 是否计算剪贴板图片的感知指纹（需要 numpy），按图片名单决定黑名单应用中能否粘贴；
+# 关闭或未安装 numpy 时所有图片按 IMAGE_UNKNOWN_POLICY 处理
+IMAGE_HASH_ENABLED = True
+
+# 允许在黑名单应用中粘贴的图片指纹（16 位十六进制，后面可以加空格和备注，如 "c3d1e0f0f0e1c3a1 架构图"）；
+# 图片的指纹见拦截日志或 --ctl status
+IMAGE_ALLOWLIST = []
+
+# 禁止粘贴的图片指纹（优先于允许名单）
+IMAGE_DENYLIST = []
+
+# 两个指纹的汉明距离（64 位中不同的位数）不超过此值时视为同一张图片（缩放、重新压缩后通常在 6 以内）
+IMAGE_HASH_MAX_DISTANCE = 8
+
+# 不在名单中或无法计算指纹的图片在黑名单应用中的处理方式："block" 拦截 / "allow" 放行
+IMAGE_UNKNOWN_POLICY = "block"
+
+# 黑名单应用中出现敏感文本时的处理方式："clear" 清空剪贴板 / "redact" 只遮盖命中的部分（如 1381234****），
+# 其余文本保留在剪贴板中；无法在扫描预算内找出全部命中位置时仍然清空
+CLIPBOARD_ACTION = "clear"
+
+# 遮盖使用的字符
+REDACT_MASK_CHAR = "*"
+
+# 遮盖时各规则保留的开头和结尾字符数：规则ID -> (开头, 结尾)，未列出的规则全部遮盖
+REDACT_KEEP = {"mobile": (7, 0), "id_card_18": (6, 0), "id_card_sep": (6, 0), "id_card_15": (6, 0), "name": (1, 0)}
+
+# 拦截提示去重窗口（秒）：同一提示在提示框关闭后这段时间内不再重复显示
+NOTIFY_DEDUP_WINDOW = 5.0
+
+# 两个提示框之间的最短间隔（秒），期间到达的提示合并为一条
+NOTIFY_MIN_INTERVAL = 2.0
+
+# 待显示提示的队列长度（超出时丢弃并计数）
+NOTIFY_QUEUE_SIZE = 32
+
+# 提示框无人点击时自动关闭的时间（秒，仅 macOS）
+NOTIFY_DIALOG_TIMEOUT = 30
+
+# 提示框自动关闭后再等待 osascript 应答的时间（秒），仍无应答时终止常驻进程，改用单次 osascript 显示
+NOTIFY_HELPER_GRACE = 5.0
+
+# 是否启用运行指标（各阶段耗时、调用次数、拦截原因；关闭时几乎没有开销）
+ENABLE_METRICS = False
+
+# 运行指标导出文件（.json 为 JSON，其他扩展名为 Prometheus 文本格式），为空则不导出
+METRICS_FILE = "safeclip_metrics.prom"
+
+# 运行指标导出周期（秒）
+METRICS_EXPORT_INTERVAL = 10
+
 # 是否启用日志
 ENABLE_LOG = True
 
 # 日志文件路径
 LOG_FILE = "safeclip_log.txt"
 
+# 日志级别：DEBUG / INFO / WARNING / ERROR
+LOG_LEVEL = "INFO"
+
+# 单个日志文件最大字节数，超过后轮转
+LOG_MAX_BYTES = 5 * 1024 * 1024
+
+# 按时间轮转的周期（秒），0 表示只按大小轮转
+LOG_ROTATE_INTERVAL = 24 * 3600
+
+# 保留的历史日志文件个数
+LOG_BACKUP_COUNT = 3
+
+# 日志队列长度（队列满时丢弃新日志，检测线程不等待）
+LOG_QUEUE_SIZE = 10000
+
+# 日志批量写盘间隔（秒）
+LOG_FLUSH_INTERVAL = 0.5
+
+# 重复消息最长合并时间（秒），超过后输出一次“重复 N 次”
+LOG_REPEAT_SUMMARY_INTERVAL = 60
+
+# 事件日志（JSONL，每行一条结构化记录）：剪贴板变化只记录摘要和长度，不记录明文；空字符串表示不记录
+JOURNAL_FILE = "safeclip_events.jsonl"
+
+# 单个事件日志分段的最大字节数，超过后轮转为 .1、.2 ...
+JOURNAL_MAX_BYTES = 10 * 1024 * 1024
+
+# 保留的历史分段个数
+JOURNAL_BACKUP_COUNT = 20
+
+# 事件上报地址（http:// 或 https://，收集所有终端的拦截事件）；空字符串表示不上报
+SHIP_URL = ""
+
+# 上报请求的 Authorization 头（例如 "Bearer xxx"），空字符串表示不发送
+SHIP_AUTH_HEADER = ""
+
+# 上报的事件类型
+SHIP_EVENT_TYPES = ("start", "stop", "ruleset", "block", "pause", "resume")
+
+# 待上报事件的本地缓存目录（程序重启后继续上报）和最大字节数（超出时丢弃最早的批次）
+SHIP_SPOOL_DIR = "safeclip_spool"
+SHIP_SPOOL_MAX_BYTES = 20 * 1024 * 1024
+
+# 每批最多事件数，以及攒批的最长等待时间（秒）
+SHIP_BATCH_SIZE = 200
+SHIP_FLUSH_INTERVAL = 5.0
+
+# 上报请求超时（秒），以及失败后重试的最长退避时间（秒）
+SHIP_TIMEOUT = 10.0
+SHIP_MAX_BACKOFF = 300.0
+
 # ------------ 核心代码 ------------
 
 # 全局变量
-g_is_running = True
-g_clipboard_content = ""
-g_last_check_time = 0
-g_is_sensitive = False
+g_clipboard_backend = None
+g_monitor = None
 
-# Windows 特定的初始化
-if IS_WINDOWS:
-    user32 = ctypes.WinDLL('user32', use_last_error=True)
-    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
-    WM_CLIPBOARDUPDATE = 0x031D
-    WNDPROC = ctypes.WINFUNCTYPE(ctypes.c_int, wintypes.HWND, ctypes.c_uint, wintypes.WPARAM, wintypes.LPARAM)
-    g_hwnd = None
-
-def log_message(message):
-    """记录日志"""
+WM_CLIPBOARDUPDATE = 0x031D
+
+class StartupProfile:
+    """启动耗时记录 - 按阶段记录模块导入和初始化的耗时（--startup-profile）"""
+
+    def __init__(self, start, clock=time.perf_counter):
+        self._clock = clock
+        self._start = start
+        self._last = start
+        self.phases = []  # (阶段, 耗时)
+
+    def mark(self, phase):
+        """记录从上一个阶段结束到现在的耗时"""
+        now = self._clock()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self):
+        """逐阶段输出耗时和累计耗时（毫秒）"""
+        lines = [f"{'耗时(ms)':>10}{'累计(ms)':>10}  阶段"]
+        total = 0.0
+        for phase, seconds in self.phases:
+            total += seconds
+            lines.append(f"{seconds * 1000:>12.1f}{total * 1000:>12.1f}  {phase}")
+        return "\n".join(lines)
+
+g_startup = StartupProfile(_MODULE_START)
+g_startup.mark("导入标准库和定义")
+
+class MissingDependencyError(ImportError):
+    """缺少平台依赖（不会在运行时自动安装）"""
+
+g_platform_loaded = False
+
+def load_platform_modules():
+    """导入当前平台依赖的模块（只导入一次）；缺少依赖时抛出 MissingDependencyError 并给出安装命令"""
+    global g_platform_loaded, ctypes, wintypes, user32, kernel32, WNDPROC
+    if g_platform_loaded:
+        return
+    missing = []
+    for module, package in PLATFORM_DEPENDENCIES.get(SYSTEM, PLATFORM_DEPENDENCIES[None]):
+        try:
+            globals()[module] = importlib.import_module(module)
+        except ImportError:
+            if package not in missing:
+                missing.append(package)
+        g_startup.mark(f"导入 {module}")
+    if missing:
+        raise MissingDependencyError(f"缺少依赖: {', '.join(missing)}，"
+                                     f"请先运行: {sys.executable} -m pip install {' '.join(missing)}")
+    if IS_WINDOWS:
+        import ctypes
+        from ctypes import wintypes
+        user32 = ctypes.WinDLL('user32', use_last_error=True)
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        WNDPROC = ctypes.WINFUNCTYPE(ctypes.c_int, wintypes.HWND, ctypes.c_uint, wintypes.WPARAM, wintypes.LPARAM)
+        g_startup.mark("初始化 user32")
+    g_platform_loaded = True
+
+# 日志级别
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+class AsyncLogger:
+    """异步日志 - 有界队列 + 后台写线程批量落盘，支持级别、按大小/时间轮转和重复消息合并"""
+
+    def __init__(self, path, level="INFO", max_bytes=None, backup_count=None, rotate_interval=None,
+                 queue_size=None, flush_interval=None, echo=True):
+        self.path = path
+        self.level = LOG_LEVELS[level]
+        self.max_bytes = LOG_MAX_BYTES if max_bytes is None else max_bytes
+        self.backup_count = LOG_BACKUP_COUNT if backup_count is None else backup_count
+        self.rotate_interval = LOG_ROTATE_INTERVAL if rotate_interval is None else rotate_interval
+        self.flush_interval = LOG_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.echo = echo
+        self._queue = queue.Queue(LOG_QUEUE_SIZE if queue_size is None else queue_size)
+        self._file = None
+        self._opened_at = 0.0
+        # 重复消息合并状态
+        self._last_message = None
+        self._repeats = 0
+        self._repeat_since = 0.0
+        self.written = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.rotations = 0
+        self._writer_thread = threading.Thread(target=self._writer, name="safeclip-log")
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
+
+    def log(self, message, level="INFO"):
+        """写入一条日志（只入队，不等待磁盘 I/O；队列满时丢弃）"""
+        if LOG_LEVELS[level] < self.level:
+            return
+        try:
+            self._queue.put_nowait((time.time(), level, message))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=2.0):
+        """写完队列中剩余的日志并关闭文件"""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._writer_thread.join(timeout)
+
+    def _writer(self):
+        """写线程：批量取出日志，合并重复消息后一次写盘"""
+        running = True
+        while running:
+            lines = []
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+                while True:
+                    if record is None:
+                        running = False
+                        break
+                    self._format(record, lines)
+                    record = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            if self._repeats and (not running or time.time() - self._repeat_since >= LOG_REPEAT_SUMMARY_INTERVAL):
+                self._flush_repeats(time.time(), lines)
+            if lines:
+                self._write(lines)
+        if self._file:
+            self._file.close()
+
+    def _format(self, record, lines):
+        timestamp, level, message = record
+        if (level, message) == self._last_message:
+            if not self._repeats:
+                self._repeat_since = timestamp
+            self._repeats += 1
+            self.coalesced += 1
+            return
+        self._flush_repeats(timestamp, lines)
+        self._last_message = (level, message)
+        lines.append(self._entry(timestamp, level, message))
+
+    def _flush_repeats(self, timestamp, lines):
+        """输出“上一条消息重复 N 次”"""
+        if self._repeats:
+            level, message = self._last_message
+            lines.append(self._entry(timestamp, level, f"上一条消息重复 {self._repeats} 次: {message}"))
+            self._repeats = 0
+
+    def _entry(self, timestamp, level, message):
+        text = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        prefix = "" if level == "INFO" else f"{level} "
+        return f"[{text}] {prefix}{message}\n"
+
+    def _write(self, lines):
+        data = "".join(lines)
+        if self.echo:
+            print(data, end="")
+        try:
+            self._rotate_if_needed()
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+                self._opened_at = time.time()
+            self._file.write(data)
+            self._file.flush()
+            self.written += len(lines)
+        except Exception as e:
+            print(f"写入日志失败: {str(e)}")
+
+    def _rotate_if_needed(self):
+        """按大小或时间轮转：safeclip_log.txt -> safeclip_log.txt.1 -> ..."""
+        if self._file is None:
+            return
+        too_big = self.max_bytes and self._file.tell() >= self.max_bytes
+        too_old = self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval
+        if not (too_big or too_old):
+            return
+        self._file.close()
+        self._file = None
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def stats(self):
+        """写入、丢弃、合并和轮转计数"""
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "rotations": self.rotations,
+        }
+
+# 全局日志（第一次写日志时创建）
+g_logger = None
+g_logger_lock = threading.Lock()
+
+def get_logger():
+    """获取全局异步日志，不存在时创建"""
+    global g_logger
+    if g_logger is None:
+        with g_logger_lock:
+            if g_logger is None:
+                g_logger = AsyncLogger(LOG_FILE, LOG_LEVEL)
+                atexit.register(g_logger.close)
+    return g_logger
+
+# 事件日志的记录类型
+JOURNAL_TYPES = ("start", "stop", "ruleset", "focus", "clipboard", "verdict", "paste", "block", "pause", "resume")
+
+class EventJournal(AsyncLogger):
+    """事件日志 - 追加写入的 JSONL 结构化记录（启动、规则集、窗口切换、剪贴板变化、拦截等），
+    与文本日志共用后台批量写盘和按大小轮转"""
+
+    def __init__(self, path, max_bytes=None, backup_count=None, queue_size=None, clock=time.time):
+        super().__init__(path, max_bytes=JOURNAL_MAX_BYTES if max_bytes is None else max_bytes,
+                         backup_count=JOURNAL_BACKUP_COUNT if backup_count is None else backup_count,
+                         rotate_interval=0, queue_size=queue_size, echo=False)
+        self._clock = clock
+
+    def record(self, type, **fields):
+        """写入一条记录（只入队；队列满时丢弃）"""
+        try:
+            self._queue.put_nowait((self._clock(), type, fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def _format(self, record, lines):
+        timestamp, type, fields = record
+        entry = {"t": round(timestamp, 3), "type": type}
+        entry.update(fields)
+        lines.append(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+def journal_segments(path):
+    """事件日志的所有分段，从最早到最新"""
+    segments = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        segments.append(f"{path}.{index}")
+        index += 1
+    segments.reverse()
+    if os.path.exists(path):
+        segments.append(path)
+    return segments
+
+def iter_journal(path, types=None, since=None, until=None):
+    """按时间顺序逐行读取事件日志的所有分段（内存占用与文件大小无关），按类型和时间（Unix 时间戳）过滤；
+    跳过无法解析的行（例如异常退出时写了一半的最后一行）"""
+    types = set(types) if types else None
+    for segment in journal_segments(path):
+        with open(segment, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    timestamp = entry["t"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if types is not None and entry.get("type") not in types:
+                    continue
+                if since is not None and timestamp < since:
+                    continue
+                if until is not None and timestamp >= until:
+                    continue
+                yield entry
+
+class EventShipper:
+    """事件上报 - 检测线程只把事件放入有界队列；后台线程攒批后 gzip 压缩写入本地缓存目录，
+    再通过一个保持连接的 HTTP 连接按从旧到新的顺序上报，成功后删除；失败时指数退避重试"""
+
+    def __init__(self, url, spool_dir=None, batch_size=None, flush_interval=None, max_spool_bytes=None,
+                 timeout=None, max_backoff=None, auth_header=None, queue_size=10000):
+        import urllib.parse
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ValueError(f"上报地址无效: {url}")
+        self.url = url
+        self._scheme = parsed.scheme
+        self._host = parsed.hostname
+        self._port = parsed.port
+        self._path = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+        self.spool_dir = SHIP_SPOOL_DIR if spool_dir is None else spool_dir
+        self.batch_size = SHIP_BATCH_SIZE if batch_size is None else batch_size
+        self.flush_interval = SHIP_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.max_spool_bytes = SHIP_SPOOL_MAX_BYTES if max_spool_bytes is None else max_spool_bytes
+        self.timeout = SHIP_TIMEOUT if timeout is None else timeout
+        self.max_backoff = SHIP_MAX_BACKOFF if max_backoff is None else max_backoff
+        self.auth_header = SHIP_AUTH_HEADER if auth_header is None else auth_header
+        import getpass
+        self._origin = {"host": socket.gethostname(), "user": getpass.getuser()}
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._queue = queue.Queue(queue_size)
+        self._stop = threading.Event()
+        self._conn = None
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._sequence = 0
+        # 缓存目录中是否有未上报的批次（上次运行留下的批次启动后继续上报）
+        self._unsent = bool(self._spool_files())
+        self.queued = 0
+        self.dropped = 0
+        self.spooled_batches = 0
+        self.spool_evicted = 0
+        self.sent_batches = 0
+        self.sent_events = 0
+        self.failures = 0
+        self.rejected = 0
+        self.connections = 0
+        self.last_send_time = 0.0
+        self._thread = threading.Thread(target=self._worker, name="safeclip-ship")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def ship(self, type, timestamp, fields):
+        """提交一条事件（不阻塞；队列满时丢弃并计数）"""
+        try:
+            self._queue.put_nowait((timestamp, type, fields))
+            self.queued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _worker(self):
+        batch = []
+        deadline = None  # 当前批次最晚写入缓存的时间
+        while True:
+            stopping = self._stop.is_set()
+            now = time.monotonic()
+            wait = self.flush_interval if deadline is None else deadline - now
+            if self._unsent:
+                wait = min(wait, self._retry_at - now)
+            try:
+                timestamp, type, fields = self._queue.get(timeout=0.0 if stopping else max(0.0, wait))
+                entry = {"t": round(timestamp, 3), "type": type}
+                entry.update(self._origin)
+                entry.update(fields)
+                batch.append(entry)
+                if deadline is None:
+                    deadline = now + self.flush_interval
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            if batch and (len(batch) >= self.batch_size or now >= deadline or stopping):
+                self._spool(batch)
+                batch = []
+                deadline = None
+            if self._unsent and now >= self._retry_at:
+                self._send_spooled()
+            if stopping and not batch and self._queue.empty():
+                break
+        if self._conn is not None:
+            self._conn.close()
+
+    def _spool_files(self):
+        """缓存目录中的批次文件，从旧到新"""
+        return sorted(name for name in os.listdir(self.spool_dir) if name.endswith(".jsonl.gz"))
+
+    def _spool(self, batch):
+        """把一批事件压缩写入缓存目录（先写临时文件再改名，崩溃时不会留下半个批次）"""
+        import gzip
+        self._sequence += 1
+        # 文件名：时间-序号-事件数，按名称排序即为写入顺序
+        name = f"{time.time_ns():020d}-{self._sequence:06d}-{len(batch)}.jsonl.gz"
+        path = os.path.join(self.spool_dir, name)
+        data = "".join(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n" for entry in batch)
+        try:
+            with open(path + ".tmp", "wb") as f:
+                f.write(gzip.compress(data.encode("utf-8")))
+            os.replace(path + ".tmp", path)
+            self.spooled_batches += 1
+            self._unsent = True
+        except OSError as e:
+            self.dropped += len(batch)
+            log_message(f"写入上报缓存失败: {str(e)}", "ERROR")
+            return
+        # 超出缓存上限时丢弃最早的批次
+        files = self._spool_files()
+        sizes = {name: os.path.getsize(os.path.join(self.spool_dir, name)) for name in files}
+        total = sum(sizes.values())
+        while total > self.max_spool_bytes and len(files) > 1:
+            oldest = files.pop(0)
+            os.remove(os.path.join(self.spool_dir, oldest))
+            total -= sizes[oldest]
+            self.spool_evicted += 1
+            log_message(f"上报缓存超过 {self.max_spool_bytes} 字节，丢弃最早的批次 {oldest}", "WARNING")
+
+    def _connect(self):
+        import http.client
+        if self._conn is None:
+            factory = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            self._conn = factory(self._host, self._port, timeout=self.timeout)
+            self.connections += 1
+        return self._conn
+
+    def _post(self, body):
+        """发送一个批次，返回 HTTP 状态码；连接断开时重连一次"""
+        headers = {"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}
+        if self.auth_header:
+            headers["Authorization"] = self.auth_header
+        import http.client
+        for attempt in range(2):
+            conn = self._connect()
+            try:
+                conn.request("POST", self._path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.will_close:
+                    conn.close()
+                    self._conn = None
+                return response.status
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                self._conn = None
+                # 服务端关闭了空闲的保持连接：重新连接再发一次
+                if attempt or not isinstance(e, ConnectionError):
+                    raise
+
+    def _send_spooled(self):
+        """按从旧到新的顺序上报缓存中的批次，失败时停止并安排退避重试"""
+        for name in self._spool_files():
+            path = os.path.join(self.spool_dir, name)
+            try:
+                with open(path, "rb") as f:
+                    body = f.read()
+            except OSError:
+                continue
+            start = time.perf_counter()
+            try:
+                status = self._post(body)
+            except Exception as e:
+                status = None
+                error = str(e)
+            elapsed = time.perf_counter() - start
+            if status is not None and 200 <= status < 300:
+                self.last_send_time = elapsed
+                if g_metrics.enabled:
+                    g_metrics.observe("ship_send", elapsed)
+                os.remove(path)
+                self.sent_batches += 1
+                self.sent_events += int(name.split("-")[2].split(".")[0])
+                self._backoff = 0.0
+                self._retry_at = 0.0
+                continue
+            if status in (400, 413, 422):
+                # 收集端拒绝的批次重试也不会成功，丢弃以免阻塞后面的批次
+                os.remove(path)
+                self.rejected += 1
+                log_message(f"上报批次 {name} 被拒绝（HTTP {status}），已丢弃", "ERROR")
+                continue
+            self.failures += 1
+            self._backoff = min(self.max_backoff, self._backoff * 2 if self._backoff else 1.0)
+            self._retry_at = time.monotonic() + self._backoff
+            log_message(f"事件上报失败（{f'HTTP {status}' if status else error}），{self._backoff:.0f} 秒后重试", "WARNING")
+            return
+        self._unsent = False
+
+    def close(self, timeout=None):
+        """把队列中的事件写入缓存并尽量上报一次，然后停止"""
+        self._stop.set()
+        self._thread.join(self.timeout if timeout is None else timeout)
+
+    def stats(self):
+        """队列深度、缓存批次、发送次数和最近一次发送耗时"""
+        try:
+            files = self._spool_files()
+            spool_bytes = sum(os.path.getsize(os.path.join(self.spool_dir, name)) for name in files)
+        except OSError:
+            files, spool_bytes = [], 0
+        return {
+            "queue_depth": self._queue.qsize(),
+            "spool_batches": len(files),
+            "spool_bytes": spool_bytes,
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "spool_evicted": self.spool_evicted,
+            "sent_batches": self.sent_batches,
+            "sent_events": self.sent_events,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "connections": self.connections,
+            "backoff_s": self._backoff,
+            "last_send_ms": self.last_send_time * 1000,
+        }
+
+def log_message(message, level="INFO"):
+    """记录日志（异步写盘，检测线程不会阻塞在磁盘 I/O 上）"""
     if not ENABLE_LOG:
         return
-        
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-    log_entry = f"[{timestamp}] {message}\n"
-    
-    print(log_entry.strip())
-    
+    get_logger().log(message, level)
+
+# 耗时直方图的桶上限（秒）
+METRIC_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+class _StageTimer:
+    """阶段计时上下文"""
+
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+class _NullTimer:
+    """关闭指标时使用的空计时上下文"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class Metrics:
+    """运行指标 - 各阶段耗时直方图、调用计数和拦截原因计数，可定期导出为 JSON 或 Prometheus 文本"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stages = {}  # 阶段 -> [各桶计数..., 总次数, 总耗时, 最大耗时]
+        self._counters = {}  # (名称, 标签) -> 计数
+        self._collectors = {}  # 名称 -> 返回 {指标: 数值} 的函数
+
+    def timer(self, stage):
+        """阶段计时：with g_metrics.timer("rule_scan"): ..."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, stage)
+
+    def timed(self, stage):
+        """阶段计时装饰器"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(stage, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def observe(self, stage, seconds):
+        """记录一次阶段耗时"""
+        with self._lock:
+            data = self._stages.get(stage)
+            if data is None:
+                data = self._stages[stage] = [0] * (len(METRIC_BUCKETS) + 1) + [0, 0.0, 0.0]
+            data[bisect.bisect_left(METRIC_BUCKETS, seconds)] += 1
+            data[-3] += 1
+            data[-2] += seconds
+            if seconds > data[-1]:
+                data[-1] = seconds
+
+    def inc(self, name, value=1, **labels):
+        """计数器加一"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add_collector(self, name, func):
+        """注册导出时采集的统计（如缓存、调度器的 stats()）"""
+        self._collectors[name] = func
+
+    def snapshot(self):
+        """返回所有指标的快照（JSON 可序列化）"""
+        with self._lock:
+            stages = {}
+            for stage, data in self._stages.items():
+                count = data[-3]
+                stages[stage] = {
+                    "count": count,
+                    "sum_s": data[-2],
+                    "avg_ms": data[-2] / count * 1000 if count else 0.0,
+                    "max_ms": data[-1] * 1000,
+                    "buckets": dict(zip([str(b) for b in METRIC_BUCKETS] + ["+Inf"], data[:-3])),
+                }
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in self._counters.items()]
+        collected = {}
+        for name, func in list(self._collectors.items()):
+            try:
+                collected[name] = func()
+            except Exception as e:
+                collected[name] = {"error": str(e)}
+        return {"timestamp": time.time(), "stages": stages, "counters": counters, "stats": collected}
+
+    def to_prometheus(self, snapshot=None):
+        """转换为 Prometheus 文本格式"""
+        snapshot = snapshot or self.snapshot()
+        lines = ["# TYPE safeclip_stage_seconds histogram"]
+        for stage, data in sorted(snapshot["stages"].items()):
+            cumulative = 0
+            for bound, count in data["buckets"].items():
+                cumulative += count
+                lines.append(f'safeclip_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'safeclip_stage_seconds_sum{{stage="{stage}"}} {data["sum_s"]}')
+            lines.append(f'safeclip_stage_seconds_count{{stage="{stage}"}} {data["count"]}')
+        for counter in sorted(snapshot["counters"], key=lambda c: (c["name"], sorted(c["labels"].items()))):
+            labels = ",".join(f'{k}="{v}"' for k, v in sorted(counter["labels"].items()))
+            lines.append(f'safeclip_{counter["name"]}_total{{{labels}}} {counter["value"]}')
+        for name, stats in sorted(snapshot["stats"].items()):
+            for key, value in sorted(stats.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"safeclip_{name}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """写入指标文件（.json 为 JSON，其他为 Prometheus 文本），先写临时文件再替换"""
+        snapshot = self.snapshot()
+        if path.endswith(".json"):
+            data = json.dumps(snapshot, ensure_ascii=False, indent=2)
+        else:
+            data = self.to_prometheus(snapshot)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+# 全局运行指标
+g_metrics = Metrics(ENABLE_METRICS)
+
+# 剪贴板格式分类
+FORMAT_TEXT = "text"
+FORMAT_IMAGE = "image"
+FORMAT_FILES = "files"
+
+class ClipboardSnapshot:
+    """剪贴板快照 - 一次打开剪贴板得到的序列号、格式和原始内容；文本在第一次使用时解码，
+    同一次检测的所有判断都基于同一份快照，不会在两次读取之间被其他程序改掉"""
+
+    __slots__ = ("sequence", "formats", "files", "image_data", "_raw", "_text", "_digest")
+
+    def __init__(self, sequence, formats, raw=None, files=(), image_data=None):
+        self.sequence = sequence
+        self.formats = frozenset(formats)
+        self.files = tuple(files)  # 复制的文件路径
+        self.image_data = image_data  # 图片原始数据（CF_DIB / PNG / TIFF），不计算指纹时为 None
+        self._raw = raw
+        self._text = None
+        self._digest = None
+
+    @property
+    def text(self):
+        """剪贴板文本（没有文本时为空字符串）"""
+        if self._text is None:
+            raw = self._raw
+            if raw is None:
+                raw = ""
+            elif isinstance(raw, bytes):
+                raw = raw.decode("utf-8", errors="ignore")
+            self._text = raw.rstrip("\0")
+            self._raw = None
+        return self._text
+
+    @property
+    def digest(self):
+        """文本内容摘要"""
+        if self._digest is None:
+            self._digest = content_digest(self.text)
+        return self._digest
+
+    @property
+    def has_text(self):
+        return FORMAT_TEXT in self.formats
+
+    @property
+    def has_image(self):
+        return FORMAT_IMAGE in self.formats
+
+    @property
+    def has_files(self):
+        return FORMAT_FILES in self.formats
+
+    @property
+    def is_text_only(self):
+        """不包含图片和文件"""
+        return not (self.has_image or self.has_files)
+
+    def __repr__(self):
+        return f"ClipboardSnapshot(sequence={self.sequence}, formats={sorted(self.formats)})"
+
+def _capture_win32_snapshot():
+    """Windows：打开一次剪贴板，枚举格式并读取文本；打开期间其他程序无法修改，序列号与内容一致"""
+    known = {
+        win32clipboard.CF_UNICODETEXT: FORMAT_TEXT,
+        win32clipboard.CF_TEXT: FORMAT_TEXT,
+        win32clipboard.CF_OEMTEXT: FORMAT_TEXT,
+        win32clipboard.CF_BITMAP: FORMAT_IMAGE,
+        win32clipboard.CF_DIB: FORMAT_IMAGE,
+        win32clipboard.CF_DIBV5: FORMAT_IMAGE,
+        win32clipboard.CF_HDROP: FORMAT_FILES,
+    }
+    win32clipboard.OpenClipboard()
     try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(log_entry)
-    except Exception as e:
-        print(f"写入日志失败: {str(e)}")
+        sequence = user32.GetClipboardSequenceNumber()
+        formats = set()
+        available = set()
+        fmt = win32clipboard.EnumClipboardFormats(0)
+        while fmt:
+            available.add(fmt)
+            if fmt in known:
+                formats.add(known[fmt])
+            fmt = win32clipboard.EnumClipboardFormats(fmt)
+        raw = None
+        if win32clipboard.CF_UNICODETEXT in available:
+            raw = win32clipboard.GetClipboardData(win32clipboard.CF_UNICODETEXT)
+        elif win32clipboard.CF_TEXT in available:
+            raw = win32clipboard.GetClipboardData(win32clipboard.CF_TEXT)
+        files = ()
+        if win32clipboard.CF_HDROP in available:
+            files = win32clipboard.GetClipboardData(win32clipboard.CF_HDROP)
+        image_data = None
+        if IMAGE_HASH_ENABLED and win32clipboard.CF_DIB in available:
+            # 只复制了 CF_BITMAP / CF_DIBV5 时系统也会提供转换后的 CF_DIB
+            image_data = win32clipboard.GetClipboardData(win32clipboard.CF_DIB)
+        return ClipboardSnapshot(sequence, formats, raw, files, image_data)
+    finally:
+        win32clipboard.CloseClipboard()
 
-def get_clipboard_content():
-    """获取剪贴板内容 - 使用多种方法"""
-    content = ""
-    
-    # 方法1: 使用pyperclip (跨平台)
+def _capture_mac_snapshot(pasteboard=None):
+    """macOS：一次读取 changeCount、类型列表和文本，前后 changeCount 不一致时重读"""
+    pasteboard = pasteboard or AppKit.NSPasteboard.generalPasteboard()
+    for _ in range(3):
+        sequence = pasteboard.changeCount()
+        types = pasteboard.types() or []
+        formats = set()
+        raw = None
+        files = ()
+        image_data = None
+        if AppKit.NSPasteboardTypeString in types:
+            formats.add(FORMAT_TEXT)
+            raw = pasteboard.stringForType_(AppKit.NSPasteboardTypeString)
+        if AppKit.NSPasteboardTypeTIFF in types or AppKit.NSPasteboardTypePNG in types:
+            formats.add(FORMAT_IMAGE)
+            if IMAGE_HASH_ENABLED:
+                data = (pasteboard.dataForType_(AppKit.NSPasteboardTypePNG)
+                        or pasteboard.dataForType_(AppKit.NSPasteboardTypeTIFF))
+                image_data = bytes(data) if data is not None else None
+        if AppKit.NSPasteboardTypeFileURL in types:
+            formats.add(FORMAT_FILES)
+            urls = pasteboard.readObjectsForClasses_options_(
+                [AppKit.NSURL], {AppKit.NSPasteboardURLReadingFileURLsOnlyKey: True}) or []
+            files = [url.path() for url in urls]
+        if pasteboard.changeCount() == sequence:
+            break
+    return ClipboardSnapshot(sequence, formats, raw, files, image_data)
+
+@g_metrics.timed("clipboard_snapshot")
+def capture_clipboard_snapshot(sequence=None):
+    """读取剪贴板快照；读取失败时返回 None（不能当作空剪贴板，否则这次变化会被跳过）"""
     try:
-        content = pyperclip.paste()
-        if content:
-            return content
+        if IS_WINDOWS:
+            return _capture_win32_snapshot()
+        if IS_MAC:
+            return _capture_mac_snapshot()
+        # 其他平台：只能通过 pyperclip 读取文本
+        import pyperclip
+        text = pyperclip.paste()
+        return ClipboardSnapshot(sequence, [FORMAT_TEXT] if text else [], text)
     except Exception as e:
-        log_message(f"pyperclip获取剪贴板失败: {str(e)}")
-    
-    # 方法2: 平台特定方法
-    if IS_WINDOWS:
-        try:
-            win32clipboard.OpenClipboard()
-            if win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_TEXT):
-                content = win32clipboard.GetClipboardData(win32clipboard.CF_TEXT)
-                if isinstance(content, bytes):
-                    content = content.decode('utf-8', errors='ignore')
-            elif win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_UNICODETEXT):
-                content = win32clipboard.GetClipboardData(win32clipboard.CF_UNICODETEXT)
-            win32clipboard.CloseClipboard()
-        except Exception as e:
-            log_message(f"win32clipboard获取剪贴板失败: {str(e)}")
+        log_message(f"读取剪贴板失败: {str(e)}", "ERROR")
+        if IS_WINDOWS:
             try:
                 win32clipboard.CloseClipboard()
             except:
                 pass
-    elif IS_MAC:
-        try:
-            pasteboard = AppKit.NSPasteboard.generalPasteboard()
-            content = pasteboard.stringForType_(AppKit.NSPasteboardTypeString)
-        except Exception as e:
-            log_message(f"Mac剪贴板获取失败: {str(e)}")
-            
-    return content
+        return None
+
+def get_clipboard_content():
+    """获取剪贴板内容"""
+    snapshot = capture_clipboard_snapshot()
+    return snapshot.text if snapshot is not None else ""
 
 def is_clipboard_text_only():
     """检查剪贴板是否只包含文本内容"""
+    snapshot = capture_clipboard_snapshot()
+    if snapshot is None:
+        return True
+    if not snapshot.is_text_only:
+        log_message("检测到剪贴板包含非文本内容（图片或文件）")
+    return snapshot.is_text_only
+
+def is_clipboard_has_image():
+    """检查剪贴板是否包含图片内容"""
+    snapshot = capture_clipboard_snapshot()
+    if snapshot is not None and snapshot.has_image:
+        log_message("检测到剪贴板包含图片内容")
+    return snapshot is not None and snapshot.has_image
+
+def clean_clipboard():
+    """清空剪贴板"""
     if IS_WINDOWS:
         try:
             win32clipboard.OpenClipboard()
-            
-            # 检查是否有图片格式
-            has_bitmap = win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_BITMAP)
-            has_dib = win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_DIB)
-            has_dibv5 = win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_DIBV5)
-            
-            # 检查是否有文件格式
-            has_hdrop = win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_HDROP)
-            
+            win32clipboard.EmptyClipboard()
             win32clipboard.CloseClipboard()
-            
-            # 如果存在图片或文件格式，则不是纯文本
-            if has_bitmap or has_dib or has_dibv5 or has_hdrop:
-                log_message("检测到剪贴板包含非文本内容（图片或文件）")
-                return False
-                
-            return True
+            log_message("清空剪贴板")
         except Exception as e:
-            log_message(f"检查剪贴板格式失败: {str(e)}")
+            log_message(f"清空剪贴板失败: {str(e)}", "ERROR")
             try:
                 win32clipboard.CloseClipboard()
             except:
                 pass
-            return True  # 出错时默认为文本，更安全
-    
     elif IS_MAC:
         try:
             pasteboard = AppKit.NSPasteboard.generalPasteboard()
-            types = pasteboard.types()
-            
-            # 检查是否有图片类型
-            has_image = AppKit.NSPasteboardTypeTIFF in types or AppKit.NSPasteboardTypePNG in types
-            
-            # 检查是否有文件类型
-            has_file = AppKit.NSPasteboardTypeFileURL in types
-            
-            if has_image or has_file:
-                log_message("检测到剪贴板包含非文本内容（图片或文件）")
-                return False
-                
-            return True
+            pasteboard.clearContents()
+            log_message("清空剪贴板")
         except Exception as e:
-            log_message(f"Mac检查剪贴板格式失败: {str(e)}")
-            return True  # 出错时默认为文本，更安全
-    
-    return True  # 默认为文本，更安全
+            log_message(f"Mac清空剪贴板失败: {str(e)}", "ERROR")
 
-def is_clipboard_has_image():
-    """检查剪贴板是否包含图片内容"""
-    if IS_WINDOWS:
-        try:
+def write_clipboard_text(text):
+    """用纯文本替换剪贴板内容（遮盖模式），返回是否成功"""
+    try:
+        if IS_WINDOWS:
             win32clipboard.OpenClipboard()
-            
-            # 检查是否有图片格式
-            has_bitmap = win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_BITMAP)
-            has_dib = win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_DIB)
-            has_dibv5 = win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_DIBV5)
-            
-            win32clipboard.CloseClipboard()
-            
-            # 如果存在图片格式，返回True
-            if has_bitmap or has_dib or has_dibv5:
-                log_message("检测到剪贴板包含图片内容")
-                return True
-                
-            return False
-        except Exception as e:
-            log_message(f"检查剪贴板图片失败: {str(e)}")
             try:
+                win32clipboard.EmptyClipboard()
+                win32clipboard.SetClipboardText(text, win32clipboard.CF_UNICODETEXT)
+            finally:
                 win32clipboard.CloseClipboard()
-            except:
-                pass
-            return False
-    
-    elif IS_MAC:
-        try:
+        elif IS_MAC:
             pasteboard = AppKit.NSPasteboard.generalPasteboard()
-            types = pasteboard.types()
-            
-            # 检查是否有图片类型
-            has_image = AppKit.NSPasteboardTypeTIFF in types or AppKit.NSPasteboardTypePNG in types
-            
-            if has_image:
-                log_message("检测到剪贴板包含图片内容")
-                return True
-                
-            return False
-        except Exception as e:
-            log_message(f"Mac检查剪贴板图片失败: {str(e)}")
-            return False
-    
-    return False
+            pasteboard.clearContents()
+            if not pasteboard.setString_forType_(text, AppKit.NSPasteboardTypeString):
+                raise RuntimeError("setString_forType_ 返回失败")
+        else:
+            import pyperclip
+            pyperclip.copy(text)
+        log_message("已用遮盖后的文本替换剪贴板内容")
+        return True
+    except Exception as e:
+        log_message(f"写入剪贴板失败: {str(e)}", "ERROR")
+        return False
 
-def clean_clipboard():
-    """清空剪贴板"""
-    if IS_WINDOWS:
+class ClipboardBackend:
+    """剪贴板后端基类 - 通过序列号感知剪贴板变化，只在内容真正变化时读取"""
+
+    def __init__(self):
+        self.reads = 0  # 实际读取剪贴板（打开剪贴板取快照）的次数
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """注册剪贴板变化回调（由支持变化事件的后端在事件线程中调用）"""
+        self._listeners.append(callback)
+
+    def _notify_change(self):
+        for callback in self._listeners:
+            callback()
+
+    def change_count(self):
+        """返回剪贴板序列号（每次内容变化递增）"""
+        raise NotImplementedError
+
+    def wait_for_change(self, last_count, timeout):
+        """等待剪贴板变化，最多等待 timeout 秒，返回当前序列号"""
+        deadline = time.monotonic() + timeout
+        while True:
+            count = self.change_count()
+            remaining = deadline - time.monotonic()
+            if count != last_count or remaining <= 0:
+                return count
+            time.sleep(min(CLIPBOARD_POLL_INTERVAL, remaining))
+
+    def snapshot(self):
+        """读取剪贴板快照（只打开一次剪贴板），读取失败时返回 None"""
+        self.reads += 1
+        return capture_clipboard_snapshot(self.change_count())
+
+    def clear(self):
+        """清空剪贴板"""
+        clean_clipboard()
+
+    def replace_text(self, text):
+        """用纯文本替换剪贴板内容，返回是否成功"""
+        return write_clipboard_text(text)
+
+    def close(self):
+        """释放后端资源"""
+        pass
+
+class Win32ClipboardBackend(ClipboardBackend):
+    """Windows 剪贴板后端 - 监听 WM_CLIPBOARDUPDATE，序列号取自 GetClipboardSequenceNumber"""
+
+    def __init__(self):
+        super().__init__()
+        self._changed = threading.Event()
+        self._hwnd = None
+        self._listening = False
+        listener = threading.Thread(target=self._listener_thread)
+        listener.daemon = True
+        listener.start()
+
+    def change_count(self):
+        return user32.GetClipboardSequenceNumber()
+
+    def wait_for_change(self, last_count, timeout):
+        if not self._listening:
+            # 监听窗口创建失败时退化为轮询序列号（仍然不读取内容）
+            return super().wait_for_change(last_count, timeout)
+        count = self.change_count()
+        if count == last_count:
+            self._changed.wait(timeout)
+            count = self.change_count()
+        self._changed.clear()
+        return count
+
+    def _wnd_proc(self, hwnd, msg, wparam, lparam):
+        if msg == WM_CLIPBOARDUPDATE:
+            self._changed.set()
+            self._notify_change()
+            return 0
+        if msg == win32con.WM_DESTROY:
+            user32.RemoveClipboardFormatListener(hwnd)
+            win32gui.PostQuitMessage(0)
+            return 0
+        return win32gui.DefWindowProc(hwnd, msg, wparam, lparam)
+
+    def _listener_thread(self):
+        """创建仅消息窗口并注册剪贴板监听，在本线程中泵消息"""
         try:
-            win32clipboard.OpenClipboard()
-            win32clipboard.EmptyClipboard()
-            win32clipboard.CloseClipboard()
-            log_message("清空剪贴板")
+            wc = win32gui.WNDCLASS()
+            wc.lpfnWndProc = self._wnd_proc
+            wc.lpszClassName = "SafeClipClipboardListener"
+            wc.hInstance = win32api.GetModuleHandle(None)
+            class_atom = win32gui.RegisterClass(wc)
+            self._hwnd = win32gui.CreateWindow(class_atom, "SafeClip", 0, 0, 0, 0, 0,
+                                               win32con.HWND_MESSAGE, 0, wc.hInstance, None)
+            if not user32.AddClipboardFormatListener(self._hwnd):
+                raise ctypes.WinError(ctypes.get_last_error())
+            self._listening = True
+            log_message("剪贴板变化监听已启动(WM_CLIPBOARDUPDATE)")
+            win32gui.PumpMessages()
         except Exception as e:
-            log_message(f"清空剪贴板失败: {str(e)}")
+            log_message(f"剪贴板变化监听启动失败，改为轮询序列号: {str(e)}", "WARNING")
+        finally:
+            self._listening = False
+            self._changed.set()
+
+    def close(self):
+        if self._hwnd:
             try:
-                win32clipboard.CloseClipboard()
-            except:
+                win32gui.PostMessage(self._hwnd, win32con.WM_CLOSE, 0, 0)
+            except Exception:
                 pass
-    elif IS_MAC:
+
+class MacClipboardBackend(ClipboardBackend):
+    """macOS 剪贴板后端 - 轮询开销很小的 NSPasteboard.changeCount"""
+
+    def __init__(self):
+        super().__init__()
+        self._pasteboard = AppKit.NSPasteboard.generalPasteboard()
+
+    def change_count(self):
+        return self._pasteboard.changeCount()
+
+    @g_metrics.timed("clipboard_snapshot")
+    def snapshot(self):
+        self.reads += 1
         try:
-            pasteboard = AppKit.NSPasteboard.generalPasteboard()
-            pasteboard.clearContents()
-            log_message("清空剪贴板")
+            return _capture_mac_snapshot(self._pasteboard)
         except Exception as e:
-            log_message(f"Mac清空剪贴板失败: {str(e)}")
+            log_message(f"Mac剪贴板读取失败: {str(e)}", "ERROR")
+            return None
 
-def get_active_window_info():
-    """获取当前活动窗口信息（标题和进程）"""
-    title = ""
-    process_name = ""
-    
-    if IS_WINDOWS:
+class MemoryClipboardBackend(ClipboardBackend):
+    """内存剪贴板后端 - 不依赖任何系统 API，作为 Linux 下测试和基准的快照来源"""
+
+    def __init__(self, text=""):
+        super().__init__()
+        self._text = text
+        self._image = False
+        self._files = False
+        self._count = 0
+        self._cond = threading.Condition()
+
+    def set_text(self, text, image=False, files=False):
+        """模拟用户复制文本（image 为 True 或图片数据（DIB / BMP）表示同时包含图片，
+        files 为 True 或文件路径列表表示同时包含文件）"""
+        with self._cond:
+            self._text = text
+            self._image = image
+            self._files = files
+            self._count += 1
+            self._cond.notify_all()
+        self._notify_change()
+
+    def change_count(self):
+        with self._cond:
+            return self._count
+
+    def wait_for_change(self, last_count, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self._count != last_count, timeout)
+            return self._count
+
+    def snapshot(self):
+        with self._cond:
+            self.reads += 1
+            formats = []
+            if self._text:
+                formats.append(FORMAT_TEXT)
+            if self._image:
+                formats.append(FORMAT_IMAGE)
+            if self._files:
+                formats.append(FORMAT_FILES)
+            files = self._files if isinstance(self._files, (list, tuple)) else ()
+            image_data = self._image if isinstance(self._image, (bytes, bytearray)) else None
+            return ClipboardSnapshot(self._count, formats, self._text, files, image_data)
+
+    def clear(self):
+        self.set_text("")
+
+    def replace_text(self, text):
+        self.set_text(text)
+        return True
+
+def create_clipboard_backend():
+    """根据操作系统创建剪贴板后端"""
+    load_platform_modules()
+    return PLATFORM_BACKENDS.get(SYSTEM, PLATFORM_BACKENDS[None])[0]()
+
+# 前台窗口快照（不可变，同一检测周期内所有线程共享）
+WindowInfo = namedtuple("WindowInfo", ["title", "process_name", "pid", "handle", "timestamp"])
+
+class WindowResolver:
+    """前台窗口解析器基类 - 缓存 pid→进程名（检测 PID 复用），每个周期只查询一次系统"""
+
+    def __init__(self, max_age=None, clock=time.monotonic):
+        self.max_age = CHECK_INTERVAL / 2 if max_age is None else max_age
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._names = {}  # pid -> (窗口句柄, 进程标识, 进程名)
+        self.queries = 0
+        self.name_hits = 0
+        self.name_misses = 0
+
+    def snapshot(self):
+        """返回当前前台窗口快照，快照未过期时直接复用"""
+        with self._lock:
+            now = self._clock()
+            if self._snapshot is None or now - self._snapshot.timestamp >= self.max_age:
+                self.queries += 1
+                with g_metrics.timer("window_query"):
+                    title, pid, handle = self._query_foreground()
+                    self._snapshot = WindowInfo(title, self._process_name(pid, handle), pid, handle, now)
+            return self._snapshot
+
+    def _query_foreground(self):
+        """查询系统前台窗口，返回 (标题, pid, 窗口句柄)；句柄需要随进程变化（PID 被复用时不同），
+        无法取得时为 None（每次核对进程标识）"""
+        raise NotImplementedError
+
+    def _process_identity(self, pid):
+        """返回进程标识（如启动时间），用于识别 PID 复用"""
+        raise NotImplementedError
+
+    def _lookup_process_name(self, pid):
+        """向系统查询进程名"""
+        raise NotImplementedError
+
+    def _process_name(self, pid, handle):
+        """解析进程名 - 同一窗口句柄直接命中缓存，句柄变化或没有句柄时核对进程标识"""
+        if not pid:
+            return ""
         try:
-            hwnd = win32gui.GetForegroundWindow()
-            title = win32gui.GetWindowText(hwnd)
-            
-            try:
-                _, pid = win32process.GetWindowThreadProcessId(hwnd)
-                process = psutil.Process(pid)
-                process_name = process.name()
-            except Exception as e:
-                log_message(f"获取窗口进程失败: {str(e)}")
+            cached = self._names.get(pid)
+            if cached is not None:
+                cached_handle, identity, name = cached
+                if handle is not None and cached_handle == handle:
+                    self.name_hits += 1
+                    return name
+                if identity == self._process_identity(pid):
+                    self.name_hits += 1
+                    self._names[pid] = (handle, identity, name)
+                    return name
+            self.name_misses += 1
+            identity = self._process_identity(pid)
+            name = self._lookup_process_name(pid)
+            if len(self._names) >= WINDOW_CACHE_SIZE:
+                self._names.clear()
+            self._names[pid] = (handle, identity, name)
+            return name
         except Exception as e:
-            log_message(f"获取窗口标题失败: {str(e)}")
-    
-    elif IS_MAC:
+            self._names.pop(pid, None)
+            log_message(f"获取窗口进程失败: {str(e)}", "ERROR")
+            return ""
+
+    def stats(self):
+        """系统查询次数和进程名缓存命中情况"""
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "name_hits": self.name_hits,
+                "name_misses": self.name_misses,
+                "cached_processes": len(self._names),
+            }
+
+class Win32WindowResolver(WindowResolver):
+    """Windows 前台窗口解析器"""
+
+    def _query_foreground(self):
+        hwnd = win32gui.GetForegroundWindow()
+        title = win32gui.GetWindowText(hwnd)
+        pid = 0
         try:
-            # 获取当前活动窗口
-            windows = Quartz.CGWindowListCopyWindowInfo(
-                Quartz.kCGWindowListOptionOnScreenOnly | Quartz.kCGWindowListExcludeDesktopElements,
-                Quartz.kCGNullWindowID
-            )
-            
-            for window in windows:
-                if window.get('kCGWindowLayer', 0) == 0:  # 应用窗口通常在第0层
-                    title = window.get('kCGWindowOwnerName', '')
-                    if title:
-                        # 尝试获取进程名称
-                        app_name = window.get('kCGWindowOwnerName', '')
-                        if app_name:
-                            process_name = app_name
-                            break
+            _, pid = win32process.GetWindowThreadProcessId(hwnd)
         except Exception as e:
-            log_message(f"Mac获取窗口信息失败: {str(e)}")
-    
-    return title, process_name
+            log_message(f"获取窗口进程失败: {str(e)}", "ERROR")
+        return title, pid, hwnd
+
+    def _process_identity(self, pid):
+        return psutil.Process(pid).create_time()
+
+    def _lookup_process_name(self, pid):
+        return psutil.Process(pid).name()
+
+class MacWindowResolver(WindowResolver):
+    """macOS 前台窗口解析器 - 通过 NSWorkspace 获取前台应用，不再遍历整个窗口列表"""
+
+    def __init__(self, max_age=None, clock=time.monotonic):
+        super().__init__(max_age, clock)
+        self._workspace = AppKit.NSWorkspace.sharedWorkspace()
+        self._front = None  # 最近一次查询到的前台应用（NSRunningApplication）
+
+    def _query_foreground(self):
+        app = self._workspace.frontmostApplication()
+        self._front = app
+        if app is None:
+            return self._query_window_list()
+        pid = app.processIdentifier()
+        # 句柄取 (pid, 启动时间)：PID 被复用时启动时间不同，不会命中旧进程的缓存；
+        # 没有启动时间的应用句柄为 None，每次核对进程标识
+        launched = app.launchDate()
+        handle = (pid, launched.timeIntervalSince1970()) if launched is not None else None
+        # 与窗口列表中的 kCGWindowOwnerName 一致，标题使用应用名称
+        return app.localizedName() or "", pid, handle
+
+    def _query_window_list(self):
+        """备用方法：遍历屏幕上的窗口，取第0层的第一个应用窗口"""
+        windows = Quartz.CGWindowListCopyWindowInfo(
+            Quartz.kCGWindowListOptionOnScreenOnly | Quartz.kCGWindowListExcludeDesktopElements,
+            Quartz.kCGNullWindowID
+        )
+        for window in windows:
+            if window.get('kCGWindowLayer', 0) == 0:  # 应用窗口通常在第0层
+                title = window.get('kCGWindowOwnerName', '')
+                if title:
+                    # 窗口列表中没有进程的启动时间，句柄为 None
+                    return title, window.get('kCGWindowOwnerPID', 0), None
+        return "", 0, None
+
+    def _running_app(self, pid):
+        """pid 对应的 NSRunningApplication（前台应用直接复用刚查询到的对象）"""
+        app = self._front
+        if app is not None and app.processIdentifier() == pid:
+            return app
+        return AppKit.NSRunningApplication.runningApplicationWithProcessIdentifier_(pid)
+
+    def _process_identity(self, pid):
+        app = self._running_app(pid)
+        launched = app.launchDate() if app is not None else None
+        return launched.timeIntervalSince1970() if launched is not None else None
+
+    def _lookup_process_name(self, pid):
+        app = self._running_app(pid)
+        return app.localizedName() if app is not None else ""
+
+class FakeWindowResolver(WindowResolver):
+    """模拟前台窗口解析器 - 用于 Linux 下的测试和基准，统计模拟的系统调用次数"""
+
+    def __init__(self, max_age=None, clock=time.monotonic):
+        super().__init__(max_age, clock)
+        self._foreground = ("", 0, 0)
+        self._processes = {}  # pid -> (启动时间, 进程名)
+        self.os_calls = 0
+
+    def set_foreground(self, title, process_name="", pid=0, handle=None, started=0.0):
+        """模拟切换前台窗口；同一 pid 传入不同的 started 表示 PID 被复用（默认句柄与 macOS 相同，为 (pid, 启动时间)）"""
+        self._foreground = (title, pid, handle if handle is not None else (pid, started))
+        if pid:
+            self._processes[pid] = (started, process_name)
+
+    def _query_foreground(self):
+        self.os_calls += 2  # GetForegroundWindow + GetWindowText
+        return self._foreground
+
+    def _process_identity(self, pid):
+        self.os_calls += 1
+        return self._processes.get(pid, (None, ""))[0]
+
+    def _lookup_process_name(self, pid):
+        self.os_calls += 1
+        return self._processes.get(pid, (None, ""))[1]
+
+# 各平台的 (剪贴板后端, 前台窗口解析器)；None 为其他平台（内存剪贴板，不检测窗口）
+PLATFORM_BACKENDS = {
+    "Windows": (Win32ClipboardBackend, Win32WindowResolver),
+    "Darwin": (MacClipboardBackend, MacWindowResolver),
+    None: (MemoryClipboardBackend, FakeWindowResolver),
+}
+
+def create_window_resolver():
+    """根据操作系统创建前台窗口解析器"""
+    load_platform_modules()
+    return PLATFORM_BACKENDS.get(SYSTEM, PLATFORM_BACKENDS[None])[1]()
+
+# 全局前台窗口解析器（在 main 中创建）
+g_window_resolver = None
+
+def get_active_window_info():
+    """获取当前活动窗口信息（标题和进程）"""
+    try:
+        info = g_window_resolver.snapshot()
+        return info.title, info.process_name
+    except Exception as e:
+        log_message(f"获取窗口信息失败: {str(e)}", "ERROR")
+        return "", ""
+
+def _get_process_name(pid):
+    """获取进程名称，进程已退出时返回 None"""
+    try:
+        return psutil.Process(pid).name()
+    except psutil.NoSuchProcess:
+        return None
+    except psutil.AccessDenied:
+        return ""
+
+def _get_process_create_time(pid):
+    """获取进程启动时间（识别 PID 复用），进程已退出或无权限时返回 None"""
+    try:
+        return psutil.Process(pid).create_time()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return None
+
+class ProcessIndex:
+    """运行进程索引 - 按 (PID, 启动时间) 差量刷新并缓存 pid→进程名，O(1) 判断是否有黑名单进程在运行"""
+
+    def __init__(self, blocked_names, refresh_interval=None, list_pids=None, get_name=None, clock=time.monotonic,
+                 get_identity=None):
+        self.blocked_names = frozenset(name.casefold() for name in blocked_names)
+        self.refresh_interval = PROCESS_REFRESH_INTERVAL if refresh_interval is None else refresh_interval
+        self._list_pids = list_pids or (lambda: psutil.pids())
+        self._get_name = get_name or _get_process_name
+        self._get_identity = get_identity or _get_process_create_time
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._names = {}  # pid -> 进程名
+        self._identities = {}  # pid -> 进程启动时间
+        self._blocked_pids = set()
+        self._last_refresh = None
+        self.refreshes = 0
+        self.name_lookups = 0
+        self.last_refresh_time = 0.0
+        self.total_refresh_time = 0.0
+
+    def refresh(self, force=False):
+        """到达刷新周期时与当前 PID 列表做差量更新，只为新出现（或启动时间变化，即 PID 被复用）的 PID 查询进程名"""
+        with self._lock:
+            now = self._clock()
+            if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+                return
+            start = time.perf_counter()
+            pids = set(self._list_pids())
+            for pid in list(self._names):
+                # 进程已退出，或 PID 已被新进程复用（启动时间不同）
+                if pid not in pids or self._get_identity(pid) != self._identities[pid]:
+                    del self._names[pid]
+                    del self._identities[pid]
+                    self._blocked_pids.discard(pid)
+            for pid in pids - set(self._names):
+                # 先取启动时间再取进程名：两次查询之间 PID 被复用时，下次刷新会发现启动时间不一致
+                identity = self._get_identity(pid)
+                name = self._get_name(pid)
+                self.name_lookups += 1
+                if name is None:
+                    continue
+                self._names[pid] = name
+                self._identities[pid] = identity
+                if name.casefold() in self.blocked_names:
+                    self._blocked_pids.add(pid)
+            self._last_refresh = now
+            self.refreshes += 1
+            self.last_refresh_time = time.perf_counter() - start
+            self.total_refresh_time += self.last_refresh_time
+            if g_metrics.enabled:
+                g_metrics.observe("process_refresh", self.last_refresh_time)
+
+    def set_blocked_names(self, blocked_names):
+        """更换黑名单进程名（规则集重新加载时），用已索引的进程名重新计算，不需要重新遍历进程"""
+        blocked_names = frozenset(name.casefold() for name in blocked_names)
+        with self._lock:
+            self.blocked_names = blocked_names
+            self._blocked_pids = {pid for pid, name in self._names.items() if name.casefold() in blocked_names}
+
+    def is_blocked_running(self):
+        """是否有黑名单进程正在运行（索引过期时先刷新）"""
+        try:
+            self.refresh()
+        except Exception as e:
+            log_message(f"获取进程列表失败: {str(e)}", "ERROR")
+        return bool(self._blocked_pids)
+
+    def running_blocked_names(self):
+        """正在运行的黑名单进程名称"""
+        with self._lock:
+            return sorted({self._names[pid] for pid in self._blocked_pids})
+
+    def names(self):
+        """所有已索引的进程名称"""
+        with self._lock:
+            return list(self._names.values())
+
+    def stats(self):
+        """刷新次数、耗时和索引陈旧程度（秒）"""
+        with self._lock:
+            return {
+                "processes": len(self._names),
+                "blocked_running": len(self._blocked_pids),
+                "refreshes": self.refreshes,
+                "name_lookups": self.name_lookups,
+                "last_refresh_ms": self.last_refresh_time * 1000,
+                "avg_refresh_ms": self.total_refresh_time / self.refreshes * 1000 if self.refreshes else 0.0,
+                "staleness_s": self._clock() - self._last_refresh if self._last_refresh is not None else None,
+            }
+
+# 全局进程索引（在 main 中创建）
+g_process_index = None
 
 def get_all_running_processes():
     """获取所有正在运行的进程名称"""
     try:
-        return [p.name() for p in psutil.process_iter()]
+        g_process_index.refresh()
     except Exception as e:
-        log_message(f"获取进程列表失败: {str(e)}")
-        return []
+        log_message(f"获取进程列表失败: {str(e)}", "ERROR")
+    return g_process_index.names()
 
 def is_blocked_app_active():
     """检测当前窗口是否在黑名单应用中"""
     # 获取当前窗口信息
     title, process_name = get_active_window_info()
+    return is_blocked_window(title, process_name, g_process_index)
+
+def is_blocked_window(title, process_name, process_index):
+    """检测指定窗口（标题和进程）是否属于黑名单应用"""
+    return blocked_app_reason(title, process_name, process_index) is not None
+
+def blocked_app_reason(title, process_name, process_index, policy=None):
+    """返回窗口被判定为黑名单应用的依据："title" / "process" / "running"，不是黑名单应用返回 None"""
+    # 方法1、2: 窗口标题关键字和进程名称（同一窗口只计算一次）
+    reason = (policy or g_ruleset.app_policy).match(title, process_name)
+    if reason is not None:
+        return reason
     
-    # 记录窗口信息
-    log_message(f"当前窗口标题：{title}")
-    if process_name:
-        log_message(f"当前窗口进程：{process_name}")
+    # 方法3: 检查所有运行的进程（进程索引按周期差量刷新）
+    if process_index.is_blocked_running():
+        # 如果黑名单应用正在运行，并且窗口标题不明确，我们假设它可能是活动窗口
+        if title == "" or len(title) < 3:
+            log_message(f"检测到黑名单应用正在运行: {', '.join(process_index.running_blocked_names())}", "DEBUG")
+            log_message("窗口标题不明确，假设为黑名单应用", "DEBUG")
+            return "running"
     
-    # 方法1: 通过窗口标题检测
-    title_lower = title.lower()
-    for app in BLOCKED_APPS:
-        if app.lower() in title_lower:
-            log_message(f"匹配到黑名单应用(标题): {app}")
+    return None
+
+class AppPolicy:
+    """黑名单应用匹配器 - 启动时编译一次：进程名为大小写无关的集合，标题关键字合并为一个正则；
+    按 (标题, 进程) 缓存结果，只有前台窗口变化时才重新计算"""
+
+    def __init__(self, apps, processes, cache_size=None):
+        self.apps = tuple(dict.fromkeys(app.casefold() for app in apps if app))
+        self.processes = frozenset(name.casefold() for name in processes if name)
+        # 长关键字优先，命中时报告最具体的应用名
+        keywords = sorted(self.apps, key=len, reverse=True)
+        self._title_regex = re.compile("|".join(re.escape(app) for app in keywords)) if keywords else None
+        self.cache_size = APP_POLICY_CACHE_SIZE if cache_size is None else cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, title, process_name):
+        """返回 "title" / "process"，不匹配返回 None"""
+        key = (title, process_name)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+        reason = self._evaluate(title, process_name)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = reason
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return reason
+
+    def _evaluate(self, title, process_name):
+        """计算一个窗口的匹配结果"""
+        log_message(f"当前窗口标题：{title}", "DEBUG")
+        if process_name:
+            log_message(f"当前窗口进程：{process_name}", "DEBUG")
+        if self._title_regex is not None and title:
+            found = self._title_regex.search(title.casefold())
+            if found:
+                log_message(f"匹配到黑名单应用(标题): {found.group()}", "DEBUG")
+                return "title"
+        if process_name and process_name.casefold() in self.processes:
+            log_message(f"匹配到黑名单应用(进程): {process_name}", "DEBUG")
+            return "process"
+        return None
+
+    def stats(self):
+        """规则数量和缓存命中情况"""
+        with self._lock:
+            return {
+                "apps": len(self.apps),
+                "processes": len(self.processes),
+                "cached": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+# 规则命中结果
+RuleMatch = namedtuple("RuleMatch", ["rule_id", "start", "end", "text"])
+
+# 检测结论：是否敏感、首个命中的规则、命中位置 ((start, end), ...)、是否扫描了全部内容
+Verdict = namedtuple("Verdict", ["sensitive", "rule_id", "spans", "complete"])
+
+# 超出扫描预算且策略为 block 时使用的规则ID
+SCAN_BUDGET_RULE = "scan_budget_exceeded"
+
+# 内容摘要密钥（main 中从 DIGEST_KEY_FILE 读取；为 None 时摘要不带密钥，如基准测试）
+g_digest_key = None
+
+def content_digest(text):
+    """计算剪贴板内容摘要（不保留明文，带本机密钥）"""
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16,
+                           key=g_digest_key or b"").hexdigest()
+
+def version_digest(text):
+    """规则版本摘要（不带密钥，同样的规则在任何机器上版本相同）"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()[:12]
+
+# GB 11643 身份证号前 17 位的加权系数和校验码
+GB11643_WEIGHTS = (7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2)
+GB11643_CHECK_CODES = "10X98765432"
+
+# 手机号段（前三位）
+_MOBILE_PREFIX = re.compile(r"1(?:3\d|4[5-9]|5[0-35-9]|6[2567]|7[0-8]|8\d|9[0-35-9])")
+
+def _id_chars(text):
+    """去掉分隔符，只保留数字（统一为 ASCII 数字，兼容全角）和校验码 X"""
+    return "".join(str(int(ch)) if ch.isdecimal() else "X" for ch in text if ch.isdecimal() or ch in "Xx")
+
+def _valid_birth_date(year, month, day):
+    """出生日期是否存在且不晚于今天"""
+    try:
+        born = datetime(year, month, day)
+    except ValueError:
+        return False
+    return year >= 1900 and born <= datetime.now()
+
+def validate_id_card_18(text):
+    """18 位身份证号：行政区划首位非 0、出生日期合法、GB 11643 mod-11 校验位正确"""
+    chars = _id_chars(text)
+    if len(chars) != 18 or not chars[:17].isdecimal() or chars[0] == "0":
+        return False
+    if not _valid_birth_date(int(chars[6:10]), int(chars[10:12]), int(chars[12:14])):
+        return False
+    total = sum(int(ch) * weight for ch, weight in zip(chars, GB11643_WEIGHTS))
+    return GB11643_CHECK_CODES[total % 11] == chars[17]
+
+def validate_id_card_15(text):
+    """15 位旧版身份证号：行政区划首位非 0、出生日期（19xx 年）合法"""
+    chars = _id_chars(text)
+    if len(chars) != 15 or not chars.isdecimal() or chars[0] == "0":
+        return False
+    return _valid_birth_date(1900 + int(chars[6:8]), int(chars[8:10]), int(chars[10:12]))
+
+def validate_mobile(text):
+    """手机号：11 位且属于已分配的号段"""
+    chars = _id_chars(text)
+    return len(chars) == 11 and chars.isdecimal() and _MOBILE_PREFIX.match(chars) is not None
+
+# 校验器名称 -> 校验函数
+VALIDATORS = {
+    "id_card_18": validate_id_card_18,
+    "id_card_15": validate_id_card_15,
+    "mobile": validate_mobile,
+}
+
+# 正则字符类别对应的字符类写法
+_CATEGORY_CLASSES = {
+    sre_parse.CATEGORY_DIGIT: r"\d",
+    sre_parse.CATEGORY_NOT_DIGIT: r"\D",
+    sre_parse.CATEGORY_WORD: r"\w",
+    sre_parse.CATEGORY_NOT_WORD: r"\W",
+    sre_parse.CATEGORY_SPACE: r"\s",
+    sre_parse.CATEGORY_NOT_SPACE: r"\S",
+}
+
+def _first_char_class(items):
+    """从正则语法树推导匹配的首字符集合（字符类片段列表），无法推导时返回 None"""
+    for op, av in items:
+        if op is sre_parse.AT:
+            continue  # 零宽断言（如 \b）不消耗字符
+        if op is sre_parse.LITERAL:
+            return [re.escape(chr(av))]
+        if op is sre_parse.IN:
+            parts = []
+            for item_op, item_av in av:
+                if item_op is sre_parse.LITERAL:
+                    parts.append(re.escape(chr(item_av)))
+                elif item_op is sre_parse.RANGE:
+                    parts.append(f"{re.escape(chr(item_av[0]))}-{re.escape(chr(item_av[1]))}")
+                elif item_op is sre_parse.CATEGORY and item_av in _CATEGORY_CLASSES:
+                    parts.append(_CATEGORY_CLASSES[item_av])
+                else:
+                    return None
+            return parts
+        if op is sre_parse.SUBPATTERN:
+            return _first_char_class(av[-1])
+        if op is sre_parse.BRANCH:
+            parts = []
+            for branch in av[1]:
+                branch_parts = _first_char_class(branch)
+                if branch_parts is None:
+                    return None
+                parts.extend(branch_parts)
+            return parts
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            return _first_char_class(av[2])
+        return None
+    return None
+
+def _has_group_reference(items):
+    """规则中是否有分组引用（如 (\\d)\\1、(?(1)...)）：合并为一个正则后分组编号会变化"""
+    for op, av in items:
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
             return True
-    
-    # 方法2: 通过进程名称检测
-    if process_name and process_name in BLOCKED_PROCESSES:
-        log_message(f"匹配到黑名单应用(进程): {process_name}")
-        return True
-    
-    # 方法3: 检查所有运行的进程
-    running_processes = get_all_running_processes()
-    for proc in BLOCKED_PROCESSES:
-        if proc in running_processes:
-            log_message(f"检测到黑名单应用正在运行: {proc}")
-            # 如果黑名单应用正在运行，并且窗口标题不明确，我们假设它可能是活动窗口
-            if title == "" or len(title) < 3:
-                log_message("窗口标题不明确，假设为黑名单应用")
+        for part in av if isinstance(av, (tuple, list)) else (av,):
+            branches = part if isinstance(part, list) else (part,)
+            if any(isinstance(branch, sre_parse.SubPattern) and _has_group_reference(branch)
+                   for branch in branches):
                 return True
-    
     return False
 
-def is_sensitive_content(text):
-    """用正则检测敏感内容"""
-    if not text or not isinstance(text, str):
-        return False
-        
-    for pattern in SENSITIVE_PATTERNS:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            log_message(f"匹配到敏感内容: {match.group(0)}")
+def _combine_rules(alternatives, first_chars, flags):
+    """把各规则的命名分组合并为一个正则；所有规则的首字符集合可推导时，加一个前瞻字符类做快速过滤，
+    避免在每个位置都逐条尝试规则"""
+    if not alternatives:
+        return None
+    combined = "|".join(alternatives)
+    if first_chars:
+        combined = f"(?=[{''.join(dict.fromkeys(first_chars))}])(?:{combined})"
+    return re.compile(combined, flags)
+
+def builtin_rule_checks(patterns):
+    """返回 (校验器, 数字个数)：只包含规则ID和正则都与 SENSITIVE_PATTERNS 相同的规则，
+    改写过正则的同名规则不会继承内置规则的校验和预检条件"""
+    builtin = set(SENSITIVE_PATTERNS)
+    validators = {}
+    min_digits = {}
+    for rule_id, pattern in patterns:
+        if (rule_id, pattern) not in builtin:
+            continue
+        if rule_id in RULE_VALIDATORS:
+            validators[rule_id] = RULE_VALIDATORS[rule_id]
+        if rule_id in RULE_MIN_DIGITS:
+            min_digits[rule_id] = RULE_MIN_DIGITS[rule_id]
+    return validators, min_digits
+
+class RuleEngine:
+    """敏感规则引擎 - 所有规则预编译为一个带命名分组的正则，单次扫描文本（引用了分组的规则单独编译）；
+    长数字规则先用数字串预检跳过，命中后再做结构校验"""
+
+    def __init__(self, patterns, flags=re.IGNORECASE, validators=None, min_digits=None):
+        patterns = list(patterns)
+        if validators is None or min_digits is None:
+            builtin_validators, builtin_min_digits = builtin_rule_checks(patterns)
+            validators = builtin_validators if validators is None else validators
+            min_digits = builtin_min_digits if min_digits is None else min_digits
+        self.rules = []
+        self._group_rules = {}
+        self._validators = {}  # 分组名 -> 校验函数
+        # 每条规则单独编译的正则（正则 -> 分组名；按规则顺序的 (分组名, 正则, 是否需要长数字串)），
+        # 用于合并正则的命中被校验排除后，在同一位置依次尝试后面的规则
+        self._rule_groups = {}
+        self._rule_regexes = []
+        # 引用了分组、不能放进合并正则的规则，以及不需要长数字串的那部分
+        self._separate = []
+        self._plain_separate = []
+        alternatives = []
+        plain_alternatives = []  # 不需要长数字串的规则
+        first_chars = []
+        plain_first_chars = []
+        gate = None
+        for index, (rule_id, pattern) in enumerate(patterns):
+            # 单独编译一次，规则写错时能直接定位到具体规则
+            try:
+                regex = re.compile(pattern, flags)
+            except re.error as e:
+                raise ValueError(f"敏感规则 {rule_id} 无效: {str(e)}")
+            group = f"_r{index}"
+            self._group_rules[group] = rule_id
+            self.rules.append((rule_id, pattern))
+            if rule_id in validators:
+                if validators[rule_id] not in VALIDATORS:
+                    raise ValueError(f"敏感规则 {rule_id} 的校验器 {validators[rule_id]} 不存在")
+                self._validators[group] = VALIDATORS[validators[rule_id]]
+            gated = bool(min_digits.get(rule_id))
+            if gated:
+                gate = min_digits[rule_id] if gate is None else min(gate, min_digits[rule_id])
+            self._rule_groups[regex] = group
+            self._rule_regexes.append((group, regex, gated))
+            tree = sre_parse.parse(pattern, flags)
+            if _has_group_reference(tree):
+                # 包进命名分组后 \1 等编号引用会指向别的分组，这类规则单独匹配
+                self._separate.append(regex)
+                if not gated:
+                    self._plain_separate.append(regex)
+                continue
+            alternative = f"(?P<{group}>{pattern})"
+            alternatives.append(alternative)
+            parts = _first_char_class(tree)
+            if first_chars is not None:
+                first_chars = None if parts is None else first_chars + parts
+            if not gated:
+                plain_alternatives.append(alternative)
+                if plain_first_chars is not None:
+                    plain_first_chars = None if parts is None else plain_first_chars + parts
+
+        self._regex = _combine_rules(alternatives, first_chars, flags)
+        # 数字串预检：文本中没有足够长的数字串（允许单个空格/横线分隔）时只运行其余规则
+        self.min_digits = gate
+        if gate is not None:
+            # 先用只有字符类的粗筛（数字开头、连续 gate 个数字或分隔符）快速跳过，命中后再精确检查数字个数
+            self._digit_span = re.compile(r"\d[\d -]{%d,}" % (gate - 1))
+            self._digit_run = re.compile(r"\d(?:[ -]?\d){%d}" % (gate - 1))
+            self._plain_regex = _combine_rules(plain_alternatives, plain_first_chars, flags)
+        else:
+            self._digit_span = self._digit_run = None
+            self._plain_regex = self._regex
+            self._plain_separate = self._separate
+        # 分块扫描时窗口之间的重叠长度：取所有规则的最长匹配长度，无上限的规则按 SCAN_OVERLAP 处理
+        self.overlap = 1
+        for _, pattern in self.rules:
+            max_width = sre_parse.parse(pattern, flags).getwidth()[1]
+            self.overlap = max(self.overlap, SCAN_OVERLAP if max_width >= sre_parse.MAXREPEAT else max_width)
+        # 规则版本：规则、校验器或预检条件变化时版本随之变化，缓存的检测结论自动失效
+        checks = sorted((rule_id, validators.get(rule_id), min_digits.get(rule_id)) for rule_id, _ in self.rules)
+        self.version = version_digest(repr((self.rules, flags, checks)))
+        # 实际使用的校验器和数字个数（匹配工作进程按此重建同样的引擎）
+        rule_ids = {rule_id for rule_id, _ in self.rules}
+        self.checks = ({k: v for k, v in validators.items() if k in rule_ids},
+                       {k: v for k, v in min_digits.items() if k in rule_ids and v})
+        self.prefilter_skips = 0
+        self.rejected = 0
+
+    def _matches(self, text, pos, end):
+        """依次产生 text[pos:end] 中通过校验的匹配（不复制字符串）"""
+        regex = self._regex
+        separate = self._separate
+        gated = True  # 是否运行需要长数字串的规则
+        if self._digit_run is not None and not self._has_digit_run(text, pos, end):
+            self.prefilter_skips += 1
+            regex = self._plain_regex
+            separate = self._plain_separate
+            gated = False
+        if regex is None and not separate:
+            return
+        while pos <= end:
+            match = regex.search(text, pos, end) if regex is not None else None
+            for rule_regex in separate:
+                # 取开始位置最早的匹配，同一位置按规则顺序（与合并正则中的分支顺序一致）
+                candidate = rule_regex.search(text, pos, end)
+                if candidate is not None and (match is None or self._order(candidate) < self._order(match)):
+                    match = candidate
+            if match is None:
+                return
+            validator = self._validators.get(self._group(match))
+            if validator is not None and not validator(match.group(0)):
+                # 结构校验不通过（如普通的 18 位订单号，或手机号后面紧跟数字被当成身份证号）：
+                # 同一位置按顺序尝试后面的规则，都不命中再从下一个位置继续查找
+                self.rejected += 1
+                start = match.start()
+                match = self._match_after(text, match, end, gated)
+                if match is None:
+                    pos = start + 1
+                    continue
+            yield match
+            pos = max(match.end(), match.start() + 1)
+
+    def _match_after(self, text, rejected, end, gated):
+        """在被排除的匹配的开始位置，按规则顺序尝试排在它后面的规则（合并正则在同一位置只会给出第一条
+        命中的规则，排在前面的规则在这个位置都没有命中），返回第一个通过校验的匹配"""
+        start = rejected.start()
+        index = int(self._group(rejected)[2:])
+        for group, regex, needs_digits in self._rule_regexes[index + 1:]:
+            if needs_digits and not gated:
+                continue
+            match = regex.match(text, start, end)
+            if match is None:
+                continue
+            validator = self._validators.get(group)
+            if validator is not None and not validator(match.group(0)):
+                self.rejected += 1
+                continue
+            return match
+        return None
+
+    def _has_digit_run(self, text, pos, end):
+        """text[pos:end] 中是否有足够长的数字串（线性时间）"""
+        candidate = self._digit_span.search(text, pos, end)
+        return candidate is not None and self._digit_run.search(text, candidate.start(), end) is not None
+
+    def _group(self, match):
+        """匹配所属规则的分组名"""
+        return self._rule_groups.get(match.re) or match.lastgroup
+
+    def _order(self, match):
+        return match.start(), int(self._group(match)[2:])
+
+    def _rule_match(self, match):
+        return RuleMatch(self._group_rules[self._group(match)], match.start(), match.end(), match.group(0))
+
+    def scan(self, text):
+        """扫描文本，返回最先命中的 RuleMatch，未命中返回 None"""
+        if not text:
+            return None
+        for match in self._matches(text, 0, len(text)):
+            return self._rule_match(match)
+        return None
+
+    def scan_bounded(self, text, max_chars, time_budget, chunk_size=None):
+        """分块扫描：窗口间重叠最长匹配长度，命中即停止，受字符数和时间预算限制
+
+        返回 (RuleMatch 或 None, 是否扫描了全部内容)。
+        """
+        if not text or not self.rules:
+            return None, True
+        chunk_size = max(chunk_size or SCAN_CHUNK_SIZE, self.overlap * 2)
+        limit = min(len(text), max_chars)
+        deadline = time.perf_counter() + time_budget
+        pos = 0
+        while True:
+            end = min(pos + chunk_size, limit)
+            match = self._search_window(text, pos, end)
+            if match is not None:
+                return match, True
+            if end >= limit:
+                return None, limit == len(text)
+            if time.perf_counter() > deadline:
+                return None, False
+            pos = end - self.overlap
+
+    def scan_stream(self, chunks, time_budget):
+        """流式扫描依次到达的文本块（如文件内容）：相邻块之间保留最长匹配长度的重叠，命中即停止
+
+        返回 (RuleMatch 或 None, 是否扫描了全部内容)。
+        """
+        if not self.rules:
+            return None, True
+        deadline = time.perf_counter() + time_budget
+        # 上一块末尾的重叠部分，前面再多留一个字符供 \b 等边界判断
+        carry = ""
+        for chunk in chunks:
+            text = carry + chunk
+            start = 1 if carry else 0
+            # 后面还有内容，恰好到末尾的匹配可能被截断，留给下一块判断
+            match = self._search_window(text, start, len(text), partial=True)
+            if match is not None:
+                return match, True
+            carry = text[-(self.overlap + 1):]
+            if time.perf_counter() > deadline:
+                return None, False
+        if carry:
+            match = self._search_window(carry, 1 if len(carry) > self.overlap else 0, len(carry))
+            if match is not None:
+                return match, True
+        return None, True
+
+    def find_spans(self, text, max_chars=None, time_budget=None, chunk_size=None):
+        """单次扫描找出所有规则的全部命中位置（超大内容分块，窗口间重叠最长匹配长度），合并重叠和相邻的区间
+
+        返回 ([(start, end, 规则ID), ...], 是否扫描了全部内容)。
+        """
+        if not text or not self.rules:
+            return [], True
+        chunk_size = max(chunk_size or SCAN_CHUNK_SIZE, self.overlap * 2)
+        limit = min(len(text), SCAN_MAX_CHARS if max_chars is None else max_chars)
+        deadline = time.perf_counter() + (SCAN_TIME_BUDGET if time_budget is None else time_budget)
+        spans = []
+        pos = 0
+        while True:
+            end = min(pos + chunk_size, limit)
+            for match in self._matches(text, pos, end):
+                # 恰好到窗口末尾的匹配可能被截断，由下一个窗口完整匹配
+                if match.end() == end and end < len(text):
+                    continue
+                spans.append((match.start(), match.end(), self._group_rules[self._group(match)]))
+            if end >= limit:
+                return merge_spans(spans), limit == len(text)
+            if time.perf_counter() > deadline:
+                return merge_spans(spans), False
+            pos = end - self.overlap
+
+    def _search_window(self, text, pos, end, partial=False):
+        """在 text[pos:end] 中搜索（不复制字符串）；partial 表示 text 之后还有内容"""
+        for match in self._matches(text, pos, end):
+            # 匹配恰好到窗口末尾时可能是被截断的假匹配（如 \b 在窗口边界成立），
+            # 交给下一个重叠窗口判断
+            if match.end() == end and (partial or end < len(text)):
+                continue
+            return self._rule_match(match)
+        return None
+
+    def evaluate(self, text):
+        """单次扫描文本，返回包含所有命中位置的 Verdict"""
+        if not text:
+            return Verdict(False, None, (), True)
+        rule_id = None
+        spans = []
+        for match in self._matches(text, 0, len(text)):
+            if rule_id is None:
+                rule_id = self._group_rules[self._group(match)]
+            spans.append(match.span())
+        return Verdict(rule_id is not None, rule_id, tuple(spans), True)
+
+    def stats(self):
+        """预检跳过和校验排除的次数"""
+        return {"rules": len(self.rules), "prefilter_skips": self.prefilter_skips, "rejected": self.rejected}
+
+class VerdictCache:
+    """检测结论缓存 - 以 (内容摘要, 规则版本) 为键的有界 LRU，所有监控线程共享"""
+
+    def __init__(self, max_entries=VERDICT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """查询缓存，未命中返回 None"""
+        with self._lock:
+            verdict = self._entries.get(key)
+            if verdict is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return verdict
+
+    def put(self, key, verdict):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._entries[key] = verdict
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存（计数保留）"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """返回命中/未命中/淘汰计数，用于调整缓存大小"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+# 全局检测结论缓存
+g_verdict_cache = VerdictCache()
+
+# numpy 是可选依赖，第一次计算图片指纹时才导入
+np = None
+_numpy_checked = False
+
+def load_numpy():
+    """导入 numpy（只尝试一次）；未安装时返回 None"""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            np = importlib.import_module("numpy")
+        except ImportError:
+            log_message(f"未安装 numpy，无法计算图片指纹，图片按 IMAGE_UNKNOWN_POLICY 处理"
+                        f"（安装: {sys.executable} -m pip install numpy）", "WARNING")
+    return np
+
+# 感知指纹：缩小到 PHASH_SIZE x PHASH_SIZE 后做 DCT，取左上角 PHASH_LOW x PHASH_LOW 低频系数（64 位）
+PHASH_SIZE = 32
+PHASH_LOW = 8
+
+# 大图缩小前先等距抽样，每边至少保留的像素数
+PHASH_SAMPLE = 256
+
+# 位图压缩方式
+BI_RGB = 0
+BI_BITFIELDS = 3
+
+_phash_tables = None
+
+def _get_phash_tables():
+    """DCT 矩阵和 8 位数位统计表（第一次使用时生成）"""
+    global _phash_tables
+    if _phash_tables is None:
+        n = np.arange(PHASH_SIZE)
+        dct = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * PHASH_SIZE)) * math.sqrt(2 / PHASH_SIZE)
+        dct[0] /= math.sqrt(2)
+        popcount = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+        _phash_tables = (dct.astype(np.float32), popcount)
+    return _phash_tables
+
+def _mask_byte(mask):
+    """BI_BITFIELDS 掩码对应的字节位置（只支持按字节对齐的 8 位通道）"""
+    for index in range(4):
+        if mask == 0xFF << (8 * index):
+            return index
+    raise ValueError(f"不支持的位图通道掩码: {mask:#x}")
+
+def _decode_dib(data, offset=None):
+    """把 DIB（CF_DIB，或 BMP 文件去掉 14 字节文件头）解码为灰度图（float32 二维数组，大图已等距抽样）；
+    offset 为像素数据相对 DIB 开头的位置，None 时按头部、掩码和调色板推算"""
+    if len(data) < 40:
+        raise ValueError("位图数据不完整")
+    header_size, width, height, _, bits, compression = struct.unpack_from("<IiiHHI", data, 0)
+    colors = struct.unpack_from("<I", data, 32)[0]
+    if header_size < 40 or width <= 0 or height == 0:
+        raise ValueError("无效的位图头")
+    masks = None
+    mask_bytes = 0
+    if compression == BI_BITFIELDS:
+        # 40 字节的头后面紧跟 3 个掩码；V4/V5 头中掩码在同一位置
+        masks = struct.unpack_from("<III", data, 40)
+        mask_bytes = 12 if header_size == 40 else 0
+    elif compression != BI_RGB:
+        raise ValueError(f"不支持的位图压缩方式: {compression}")
+    palette = colors or (1 << bits if bits <= 8 else 0)
+    palette_offset = header_size + mask_bytes
+    if offset is None:
+        offset = palette_offset + palette * 4
+    rows = abs(height)
+    stride = (width * bits + 31) // 32 * 4
+    if len(data) < offset + stride * rows:
+        raise ValueError("位图数据不完整")
+    pixels = np.frombuffer(data, np.uint8, stride * rows, offset).reshape(rows, stride)
+    if height > 0:
+        pixels = pixels[::-1]  # 自下而上存储
+    # 只取抽样后的行和列，后面的转换不复制整张图
+    step_y = max(1, rows // PHASH_SAMPLE)
+    step_x = max(1, width // PHASH_SAMPLE)
+    pixels = pixels[::step_y]
+    if bits in (24, 32):
+        pixels = pixels[:, :width * (bits // 8)].reshape(len(pixels), width, bits // 8)[:, ::step_x]
+        r, g, b = (2, 1, 0) if masks is None else (_mask_byte(mask) for mask in masks)
+        return (pixels[..., r] * np.float32(0.299) + pixels[..., g] * np.float32(0.587)
+                + pixels[..., b] * np.float32(0.114))
+    if bits == 8:
+        table = np.frombuffer(data, np.uint8, palette * 4, palette_offset).reshape(palette, 4)
+        gray = table[:, 2] * np.float32(0.299) + table[:, 1] * np.float32(0.587) + table[:, 0] * np.float32(0.114)
+        return gray.take(pixels[:, :width:step_x], mode="clip")
+    raise ValueError(f"不支持的位图格式: {bits} 位")
+
+def decode_clipboard_image(data):
+    """把剪贴板图片解码为灰度图：CF_DIB 和 BMP 直接解码；PNG / TIFF（macOS）先由系统转换为 BMP"""
+    if data[:2] == b"BM":
+        return _decode_dib(memoryview(data)[14:], struct.unpack_from("<I", data, 10)[0] - 14)
+    if data[:8] == b"\x89PNG\r\n\x1a\n" or data[:4] in (b"II*\0", b"MM\0*"):
+        if not IS_MAC or "AppKit" not in globals():
+            raise ValueError("当前平台无法解码 PNG / TIFF 图片")
+        rep = AppKit.NSBitmapImageRep.imageRepWithData_(data)
+        bmp = rep.representationUsingType_properties_(AppKit.NSBitmapImageFileTypeBMP, {}) if rep else None
+        if bmp is None:
+            raise ValueError("无法解码图片")
+        return decode_clipboard_image(bytes(bmp))
+    return _decode_dib(data)
+
+def _shrink_axis(values, axis):
+    """沿一个方向区域平均缩小（不足 PHASH_SIZE 时按最近邻放大）到 PHASH_SIZE"""
+    n = values.shape[axis]
+    bounds = np.arange(PHASH_SIZE) * n // PHASH_SIZE
+    if n < PHASH_SIZE:
+        return values.take(bounds, axis=axis)
+    counts = np.diff(np.append(bounds, n)).astype(np.float32)
+    return np.add.reduceat(values, bounds, axis=axis) / (counts[:, None] if axis == 0 else counts)
+
+def image_phash(gray):
+    """感知指纹（pHash）：区域平均缩小到 32x32，二维 DCT 后取 8x8 低频系数与中位数比较，得到 64 位整数"""
+    dct, _ = _get_phash_tables()
+    small = _shrink_axis(_shrink_axis(gray, 0), 1)
+    low = (dct @ small @ dct.T)[:PHASH_LOW, :PHASH_LOW].ravel()
+    # 直流分量只反映平均亮度，不参与中位数
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+def format_image_hash(value):
+    return f"{value:016x}"
+
+def parse_image_hash(entry):
+    """解析名单中的一项："16 位十六进制指纹 [备注]" -> (指纹, 备注)"""
+    parts = entry.split(None, 1) if isinstance(entry, str) else []
+    if not parts or not re.fullmatch(r"[0-9a-fA-F]{16}", parts[0]):
+        raise ValueError(f"无效的图片指纹: {entry!r}")
+    return int(parts[0], 16), parts[1].strip() if len(parts) > 1 else parts[0].lower()
+
+class ImageHashIndex:
+    """图片指纹索引 - 指纹按位打包为 uint64 数组，一次向量化的异或 + 数位统计求出到所有条目的汉明距离"""
+
+    def __init__(self, entries):
+        self.hashes = [value for value, _ in entries]
+        self.labels = [label for _, label in entries]
+        self._array = None  # 第一次查询时生成（编译规则集时不需要 numpy）
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def nearest(self, value):
+        """返回 (最小汉明距离, 备注)；索引为空时返回 (None, None)"""
+        if not self.hashes:
+            return None, None
+        if self._array is None:
+            self._array = np.array(self.hashes, dtype=np.uint64)
+        xor = self._array ^ np.uint64(value)
+        if hasattr(np, "bitwise_count"):  # numpy 2.0+
+            distances = np.bitwise_count(xor)
+        else:
+            distances = _get_phash_tables()[1][xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+        index = int(distances.argmin())
+        return int(distances[index]), self.labels[index]
+
+# 图片检测结论：指纹（无法计算时为 None）、是否允许粘贴、原因
+ImageVerdict = namedtuple("ImageVerdict", ["hash", "allowed", "reason"])
+
+class ImagePolicy:
+    """图片名单 - 禁止名单优先，其次允许名单，都不匹配时按 IMAGE_UNKNOWN_POLICY 处理"""
+
+    def __init__(self, allow=(), deny=(), max_distance=IMAGE_HASH_MAX_DISTANCE, unknown_policy=IMAGE_UNKNOWN_POLICY):
+        self.allow = ImageHashIndex([parse_image_hash(entry) for entry in allow])
+        self.deny = ImageHashIndex([parse_image_hash(entry) for entry in deny])
+        self.max_distance = max_distance
+        self.unknown_allowed = unknown_policy == "allow"
+
+    def check(self, value):
+        if value is None:
+            return ImageVerdict(None, self.unknown_allowed, "无法计算指纹")
+        distance, label = self.deny.nearest(value)
+        if distance is not None and distance <= self.max_distance:
+            return ImageVerdict(value, False, f"禁止名单: {label}（距离 {distance}）")
+        distance, label = self.allow.nearest(value)
+        if distance is not None and distance <= self.max_distance:
+            return ImageVerdict(value, True, f"允许名单: {label}（距离 {distance}）")
+        return ImageVerdict(value, self.unknown_allowed, "不在名单中")
+
+    def stats(self):
+        return {"allow": len(self.allow), "deny": len(self.deny)}
+
+@g_metrics.timed("image_check")
+def check_image(snapshot, policy=None):
+    """计算剪贴板图片的感知指纹并按图片名单给出结论；未开启、缺少 numpy 或无法解码时指纹为 None"""
+    policy = policy or g_ruleset.image_policy
+    value = None
+    if IMAGE_HASH_ENABLED and snapshot.image_data and load_numpy() is not None:
+        try:
+            value = image_phash(decode_clipboard_image(snapshot.image_data))
+        except (ValueError, struct.error) as e:
+            log_message(f"无法计算图片指纹: {str(e)}", "WARNING")
+    return policy.check(value)
+
+# 编译后的规则集（不可变；配置文件修改后整体替换）
+Ruleset = namedtuple("Ruleset", ["version", "source", "engine", "app_policy", "blocked_processes", "check_interval",
+                                 "image_policy"])
+
+# 配置文件中可以出现的键
+CONFIG_KEYS = ("sensitive_patterns", "blocked_apps", "blocked_processes", "check_interval",
+               "image_allowlist", "image_denylist")
+
+def _config_string_list(config, key, default):
+    """读取字符串列表配置项"""
+    value = config.get(key, default)
+    if not isinstance(value, (list, tuple)) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"{key} 必须是字符串列表")
+    return list(value)
+
+def _config_patterns(config):
+    """读取敏感规则：[["规则ID", "正则"], ...] 或
+    [{"id": "规则ID", "pattern": "正则", "validator": "校验器", "min_digits": 数字个数}, ...]（后两项可选）；
+    返回 (规则, 校验器, 数字个数)，与内置规则完全相同的规则沿用内置的校验器和数字个数"""
+    value = config.get("sensitive_patterns", SENSITIVE_PATTERNS)
+    if not isinstance(value, (list, tuple)) or not value:
+        raise ValueError("sensitive_patterns 必须是非空列表")
+    patterns = []
+    validators = {}
+    min_digits = {}
+    for item in value:
+        validator = digits = None
+        if isinstance(item, dict):
+            validator = item.get("validator")
+            digits = item.get("min_digits")
+            item = (item.get("id"), item.get("pattern"))
+        if (not isinstance(item, (list, tuple)) or len(item) != 2
+                or not all(isinstance(part, str) and part for part in item)):
+            raise ValueError(f"无效的敏感规则: {item!r}")
+        rule_id = item[0]
+        patterns.append((rule_id, item[1]))
+        if validator is not None:
+            if validator not in VALIDATORS:
+                raise ValueError(f"敏感规则 {rule_id} 的校验器 {validator!r} 不存在"
+                                 f"（可用: {', '.join(sorted(VALIDATORS))}）")
+            validators[rule_id] = validator
+        if digits is not None:
+            if isinstance(digits, bool) or not isinstance(digits, int) or not 1 <= digits <= 64:
+                raise ValueError(f"敏感规则 {rule_id} 的 min_digits 必须是 1 ~ 64 之间的整数")
+            min_digits[rule_id] = digits
+    ids = [rule_id for rule_id, _ in patterns]
+    if len(set(ids)) != len(ids):
+        raise ValueError("sensitive_patterns 中有重复的规则ID")
+    builtin_validators, builtin_min_digits = builtin_rule_checks(patterns)
+    for rule_id, name in builtin_validators.items():
+        validators.setdefault(rule_id, name)
+    for rule_id, count in builtin_min_digits.items():
+        min_digits.setdefault(rule_id, count)
+    return patterns, validators, min_digits
+
+def compile_ruleset(config, source="内置配置"):
+    """校验配置并编译为规则集，配置无效时抛出 ValueError；未出现的配置项使用 safeclip.py 中的默认值"""
+    if not isinstance(config, dict):
+        raise ValueError("配置文件的顶层必须是对象")
+    unknown = sorted(set(config) - set(CONFIG_KEYS))
+    if unknown:
+        raise ValueError(f"未知的配置项: {', '.join(unknown)}")
+    patterns, validators, min_digits = _config_patterns(config)
+    apps = _config_string_list(config, "blocked_apps", BLOCKED_APPS)
+    processes = _config_string_list(config, "blocked_processes", BLOCKED_PROCESSES)
+    check_interval = config.get("check_interval", CHECK_INTERVAL)
+    if isinstance(check_interval, bool) or not isinstance(check_interval, (int, float)) \
+            or not 0 < check_interval <= MAX_CHECK_INTERVAL:
+        raise ValueError(f"check_interval 必须在 0 ~ {MAX_CHECK_INTERVAL} 秒之间")
+    image_allow = _config_string_list(config, "image_allowlist", IMAGE_ALLOWLIST)
+    image_deny = _config_string_list(config, "image_denylist", IMAGE_DENYLIST)
+    try:
+        engine = RuleEngine(patterns, validators=validators, min_digits=min_digits)
+    except re.error as e:
+        raise ValueError(f"敏感规则编译失败: {str(e)}")
+    version = version_digest(json.dumps([patterns, validators, min_digits, apps, processes, check_interval,
+                                         image_allow, image_deny], ensure_ascii=False, sort_keys=True))
+    return Ruleset(version, source, engine, AppPolicy(apps, processes),
+                   frozenset(name.casefold() for name in processes), float(check_interval),
+                   ImagePolicy(image_allow, image_deny))
+
+def load_ruleset(path):
+    """读取并编译配置文件（.toml 为 TOML，其他为 JSON）"""
+    if path.endswith(".toml"):
+        try:
+            import tomllib  # Python 3.11+，只在使用 TOML 配置时导入
+        except ImportError:
+            raise ValueError("读取 TOML 配置需要 Python 3.11 或更高版本，请改用 JSON")
+        with open(path, "rb") as f:
+            try:
+                config = tomllib.load(f)
+            except tomllib.TOMLDecodeError as e:
+                raise ValueError(f"TOML 格式错误: {str(e)}")
+    else:
+        with open(path, encoding="utf-8") as f:
+            try:
+                config = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"JSON 格式错误: {str(e)}")
+    return compile_ruleset(config, path)
+
+# 规则性能检查结果：静态检查发现的问题、普通文本吞吐量、最坏情况耗时曲线 [(长度, 秒), ...]、增长趋势、是否为慢规则
+RuleReport = namedtuple("RuleReport", ["rule_id", "warnings", "typical_mb_s", "worst_curve", "growth", "slow"])
+
+_REPEAT_OPS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+
+# 判断两个字符集合是否重叠时使用的样本字符
+_SAMPLE_CHARS = "".join(chr(code) for code in range(32, 127)) + "\t\n张李王微信中文０１２３"
+
+# 测量普通文本吞吐量使用的文本片段
+_TYPICAL_TEXT = "今天下午三点开会，项目进度 order #42 shipped v1.2.3 价格 99.5 ok 收到。"
+
+def _chars_overlap(a, b):
+    """两个首字符集合（字符类片段列表）是否可能有共同字符；无法推导时按重叠处理"""
+    if a is None or b is None:
+        return True
+    class_a = re.compile(f"[{''.join(a)}]")
+    class_b = re.compile(f"[{''.join(b)}]")
+    return any(class_a.match(ch) and class_b.match(ch) for ch in _SAMPLE_CHARS)
+
+def _max_repeat(items):
+    """语法树中最大的重复次数上限（没有重复时为 1）"""
+    result = 1
+    for op, av in items:
+        if op in _REPEAT_OPS:
+            result = max(result, av[1], _max_repeat(av[2]))
+        elif op is sre_parse.SUBPATTERN:
+            result = max(result, _max_repeat(av[-1]))
+        elif op is sre_parse.BRANCH:
+            for branch in av[1]:
+                result = max(result, _max_repeat(branch))
+    return result
+
+def _overlapping_branches(items):
+    """是否有首字符可能相同的分支（如 (\d|\d\d)）"""
+    for op, av in items:
+        if op is sre_parse.SUBPATTERN and _overlapping_branches(av[-1]):
             return True
+        if op is sre_parse.BRANCH:
+            firsts = [_first_char_class(branch) for branch in av[1] if branch]
+            for i in range(len(firsts)):
+                for j in range(i + 1, len(firsts)):
+                    if _chars_overlap(firsts[i], firsts[j]):
+                        return True
     return False
 
+def _check_tree(items, warnings):
+    """静态检查正则语法树中容易灾难性回溯的结构"""
+    previous = None  # 前一个无界单字符重复的字符集合
+    for op, av in items:
+        if op is sre_parse.AT:
+            continue
+        current = None
+        if op in _REPEAT_OPS:
+            low, high, body = av
+            unbounded = high == sre_parse.MAXREPEAT
+            inner = _max_repeat(body)
+            if (unbounded and inner > 1) or (high > 1 and inner == sre_parse.MAXREPEAT):
+                warnings.append("嵌套量词（如 (\\d+)+），可能发生指数级回溯")
+            elif unbounded and len(set(body.getwidth())) > 1:
+                warnings.append("无界量词内的内容长度可变（如 (\\d\\d?)+），可能发生指数级回溯")
+            if unbounded and _overlapping_branches(body):
+                warnings.append("量词内的分支可以匹配相同内容（如 (\\d|\\d\\d)+），可能发生指数级回溯")
+            if unbounded and len(body) == 1 and body[0][0] in (sre_parse.LITERAL, sre_parse.IN, sre_parse.ANY):
+                current = _first_char_class(body)
+                if previous is not None and _chars_overlap(previous, current):
+                    warnings.append("相邻的无界量词可以匹配相同字符（如 \\d+\\d+），可能发生多项式级回溯")
+            _check_tree(body, warnings)
+        elif op is sre_parse.SUBPATTERN:
+            _check_tree(av[-1], warnings)
+        elif op is sre_parse.BRANCH:
+            for branch in av[1]:
+                _check_tree(branch, warnings)
+        # 可选项（如 [ -]?）不打断相邻关系
+        if current is not None or not (op in _REPEAT_OPS and av[0] == 0):
+            previous = current
+
+def analyze_pattern(pattern, flags=re.IGNORECASE):
+    """静态检查规则，返回发现的问题列表"""
+    warnings = []
+    _check_tree(sre_parse.parse(pattern, flags), warnings)
+    return list(dict.fromkeys(warnings))
+
+def _attack_units(pattern, flags):
+    """最坏情况输入的重复单元：常见的数字/字母/分隔符组合，加上能匹配规则首字符的样本字符"""
+    units = ["1", "1 ", "1-", "a", "a "]
+    first = _first_char_class(sre_parse.parse(pattern, flags))
+    if first:
+        first_class = re.compile(f"[{''.join(first)}]", flags)
+        units.extend(ch for ch in _SAMPLE_CHARS if first_class.match(ch) and ch not in units)
+    return units[:12]
+
+def _min_time(func, repeat=3, limit=None):
+    """多次调用取最短耗时（秒）；单次超过 limit 时不再重复"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if limit is not None and elapsed > limit:
+            break
+    return best
+
+def measure_pattern(pattern, flags=re.IGNORECASE, max_len=None, time_limit=None):
+    """测量规则的普通文本吞吐量（MB/s）和最坏情况耗时曲线
+
+    最坏情况输入的长度逐步加长（先每次加 4 个字符，再翻倍），单次匹配超过 time_limit 秒就停止，
+    指数级回溯的规则在耗时失控前就会被发现。返回 (吞吐量, 曲线, 增长趋势)。
+    """
+    max_len = RULE_ANALYSIS_MAX_LEN if max_len is None else max_len
+    time_limit = RULE_ANALYSIS_TIME_LIMIT if time_limit is None else time_limit
+    regex = re.compile(pattern, flags)
+    typical = (_TYPICAL_TEXT * (64 * 1024 // len(_TYPICAL_TEXT) + 1))[:64 * 1024]
+    elapsed = _min_time(lambda: sum(1 for _ in regex.finditer(typical)))
+    typical_mb_s = len(typical.encode("utf-8")) / elapsed / 1e6 if elapsed > 0 else float("inf")
+
+    units = _attack_units(pattern, flags)
+    lengths = list(range(8, 65, 4))
+    while lengths[-1] < max_len:
+        lengths.append(min(lengths[-1] * 2, max_len))
+    curve = []
+    for length in lengths:
+        worst = 0.0
+        for unit in units:
+            text = (unit * length)[:length] + "\0"
+            worst = max(worst, _min_time(lambda: regex.search(text), repeat=2, limit=time_limit))
+            if worst > time_limit:
+                break
+        curve.append((length, worst))
+        if worst > time_limit:
+            return typical_mb_s, curve, "exceeded"
+    # 用 128 字符以上的两端估算增长指数：约 1 为线性，约 2 为平方
+    base = next(((n, t) for n, t in curve if n >= 128 and t > 0), None)
+    last = curve[-1]
+    if base is None or last[0] == base[0] or last[1] <= 0:
+        return typical_mb_s, curve, "linear"
+    exponent = math.log(last[1] / base[1]) / math.log(last[0] / base[0])
+    growth = "linear" if exponent < 1.5 else "quadratic" if exponent < 2.5 else "exponential"
+    return typical_mb_s, curve, growth
+
+def analyze_rules(patterns, flags=re.IGNORECASE, max_len=None, time_limit=None):
+    """静态检查并测量每条规则，返回 RuleReport 列表"""
+    reports = []
+    for rule_id, pattern in patterns:
+        warnings = analyze_pattern(pattern, flags)
+        typical_mb_s, curve, growth = measure_pattern(pattern, flags, max_len, time_limit)
+        slow = growth in ("exceeded", "exponential") or typical_mb_s < RULE_MIN_THROUGHPUT
+        reports.append(RuleReport(rule_id, warnings, typical_mb_s, curve, growth, slow))
+    return reports
+
+def _rule_analysis_main(conn, patterns, max_len, time_limit):
+    """规则性能检查进程：测量所有规则，返回 RuleReport 列表"""
+    conn.send(analyze_rules(patterns, max_len=max_len, time_limit=time_limit))
+    conn.close()
+
+def analyze_rules_isolated(patterns, deadline=None):
+    """在独立进程中运行 analyze_rules；超过 deadline 秒或检查进程异常时终止该进程并返回 None"""
+    deadline = RULE_ANALYSIS_DEADLINE if deadline is None else deadline
+    context = multiprocessing.get_context("spawn")
+    conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_rule_analysis_main, name="safeclip-rule-analysis",
+                              args=(child_conn, list(patterns), RULE_ANALYSIS_MAX_LEN, RULE_ANALYSIS_TIME_LIMIT))
+    process.daemon = True
+    try:
+        process.start()
+        child_conn.close()
+        if conn.poll(deadline):
+            return conn.recv()
+        return None
+    except (EOFError, OSError):
+        return None
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join(1)
+        conn.close()
+
+def check_rule_costs(patterns, source, mode=None):
+    """加载规则时的性能检查（在独立进程中测量，有总时限）：记录问题；
+    mode 为 "refuse" 且有慢规则或检查超时时抛出 ValueError"""
+    mode = RULE_ANALYSIS if mode is None else mode
+    if mode == "off":
+        return []
+    reports = analyze_rules_isolated(patterns)
+    if reports is None:
+        log_message(f"规则性能检查未能在 {RULE_ANALYSIS_DEADLINE} 秒内完成或检查进程异常退出（{source}），"
+                    "可能包含灾难性回溯的规则", "WARNING")
+        if mode == "refuse":
+            raise ValueError(f"规则性能检查未能在 {RULE_ANALYSIS_DEADLINE} 秒内完成")
+        return []
+    for report in reports:
+        for warning in report.warnings:
+            log_message(f"规则 {report.rule_id}（{source}）: {warning}", "WARNING")
+        if report.slow:
+            log_message(f"规则 {report.rule_id}（{source}）性能较差：普通文本 {report.typical_mb_s:.1f} MB/s，"
+                        f"最坏情况 {report.worst_curve[-1][0]} 字符耗时 {report.worst_curve[-1][1] * 1000:.1f} ms"
+                        f"（{report.growth}）", "WARNING")
+    slow = [report.rule_id for report in reports if report.slow]
+    if slow and mode == "refuse":
+        raise ValueError(f"规则性能检查未通过: {', '.join(slow)}")
+    return reports
+
+class ConfigWatcher:
+    """配置文件监视 - 周期性比较修改时间和大小，变化时重新加载；新配置无效时保留当前规则集"""
+
+    def __init__(self, path):
+        self.path = path
+        self._stamp = None
+        self.checks = 0
+        self.reloads = 0
+        self.errors = 0
+
+    def check(self, force=False):
+        """配置文件变化（force 为 True 时不论是否变化）且有效时返回新规则集，否则返回 None"""
+        self.checks += 1
+        try:
+            st = os.stat(self.path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        if stamp == self._stamp and not force:
+            return None
+        self._stamp = stamp
+        if stamp is None:
+            log_message(f"配置文件 {self.path} 不存在，继续使用当前规则", "WARNING")
+            return None
+        try:
+            ruleset = load_ruleset(self.path)
+            check_rule_costs(ruleset.engine.rules, self.path)
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            log_message(f"配置文件 {self.path} 无效，继续使用当前规则: {str(e)}", "ERROR")
+            return None
+        self.reloads += 1
+        return ruleset
+
+    def stats(self):
+        return {"checks": self.checks, "reloads": self.reloads, "errors": self.errors}
+
+def set_ruleset(ruleset):
+    """原子替换当前规则集（检测线程下次读取 g_ruleset 时生效，不需要暂停）"""
+    global g_ruleset
+    old = g_ruleset
+    g_ruleset = ruleset
+    if old is not None and old.engine.version != ruleset.engine.version:
+        # 缓存键包含引擎版本，旧结论不会再命中；这里顺便释放旧条目
+        g_verdict_cache.clear()
+    log_message(f"已加载规则集 {ruleset.version}（{ruleset.source}）：{len(ruleset.engine.rules)} 条敏感规则，"
+                f"{len(ruleset.app_policy.apps)} 个标题关键词，{len(ruleset.blocked_processes)} 个进程名，"
+                f"图片名单 {len(ruleset.image_policy.allow)} 允许 / {len(ruleset.image_policy.deny)} 禁止")
+
+# 当前规则集（默认来自 safeclip.py 中的配置，main 中加载配置文件）
+g_ruleset = compile_ruleset({})
+g_startup.mark("编译内置规则")
+
+def verdict_key(text, snapshot=None, engine=None):
+    """检测结论的缓存键：(内容摘要, 长度, 规则版本)"""
+    engine = engine or g_ruleset.engine
+    # 超大内容只会扫描前 SCAN_MAX_CHARS 个字符，摘要也只取这部分，耗时与内容总长度无关
+    limit = SCAN_MAX_CHARS + engine.overlap
+    if snapshot is not None and len(text) <= limit:
+        digest = snapshot.digest
+    else:
+        digest = content_digest(text[:limit])
+    return (digest, len(text), engine.version)
+
+def scan_text(engine, text):
+    """用规则引擎扫描文本（不查缓存、不应用超预算策略）；超大内容分块扫描并受预算限制"""
+    if len(text) <= SCAN_CHUNK_SIZE:
+        return engine.evaluate(text)
+    match, complete = engine.scan_bounded(text, SCAN_MAX_CHARS, SCAN_TIME_BUDGET)
+    if match is not None:
+        return Verdict(True, match.rule_id, ((match.start, match.end),), complete)
+    return Verdict(False, None, (), complete)
+
+def merge_spans(spans):
+    """按起点排序并合并重叠或相邻的命中区间，合并后的区间使用最先开始的规则ID"""
+    merged = []
+    for start, end, rule_id in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end, merged[-1][2])
+        else:
+            merged.append((start, end, rule_id))
+    return merged
+
+def redact_text(text, spans, keep=None, mask=None):
+    """遮盖命中区间（保留 REDACT_KEEP 中指定的开头和结尾，如 1381234****）：
+    未命中的部分和遮盖串依次放入列表，最后一次 join，不为每个命中生成整段文本的副本"""
+    keep = REDACT_KEEP if keep is None else keep
+    mask = REDACT_MASK_CHAR if mask is None else mask
+    parts = []
+    pos = 0
+    for start, end, rule_id in spans:
+        head, tail = keep.get(rule_id, (0, 0))
+        if head + tail >= end - start:
+            head = tail = 0  # 命中太短时全部遮盖
+        parts.append(text[pos:start + head])
+        parts.append(mask * (end - start - head - tail))
+        pos = end - tail
+    parts.append(text[pos:])
+    return "".join(parts)
+
+def record_verdict(key, text, verdict):
+    """缓存新得到的检测结论并记录日志，返回应用超预算策略后的结论"""
+    g_verdict_cache.put(key, verdict)
+    if verdict.sensitive:
+        start, end = verdict.spans[0] if verdict.spans else (0, 0)
+        log_message(f"匹配到敏感内容({verdict.rule_id}): {text[start:end]}")
+    elif not verdict.complete:
+        log_message(f"剪贴板内容超出扫描预算（{len(text)} 字符），按策略 {SCAN_OVERBUDGET_POLICY} 处理", "WARNING")
+    return apply_scan_policy(verdict)
+
+def apply_scan_policy(verdict):
+    """没有扫描完（超出预算或匹配超时）且未命中时，按 SCAN_OVERBUDGET_POLICY 处理"""
+    if not verdict.complete and not verdict.sensitive and SCAN_OVERBUDGET_POLICY == "block":
+        return Verdict(True, SCAN_BUDGET_RULE, (), False)
+    return verdict
+
+@g_metrics.timed("content_check")
+def check_content(text, snapshot=None):
+    """获取文本的检测结论 - 相同内容直接查缓存，不重复扫描；超大内容分块扫描并受预算限制
+    （text 来自剪贴板快照时传入 snapshot，复用快照中的内容摘要）"""
+    if not text or not isinstance(text, str):
+        return Verdict(False, None, (), True)
+
+    engine = g_ruleset.engine
+    key = verdict_key(text, snapshot, engine)
+    verdict = g_verdict_cache.get(key)
+    if verdict is None:
+        with g_metrics.timer("rule_scan"):
+            verdict = scan_text(engine, text)
+        return record_verdict(key, text, verdict)
+    return apply_scan_policy(verdict)
+
+# Office 文档（zip 容器）中包含正文的 XML 部件
+OOXML_PARTS = re.compile(r'^(xl/sharedStrings\.xml|xl/worksheets/[^/]+\.xml|word/document\.xml|'
+                         r'ppt/slides/[^/]+\.xml)$')
+
+def _guess_encoding(sample):
+    """根据文件开头猜测文本编码，二进制文件返回 None"""
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if b"\0" in sample:
+        return None
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # 样本末尾截断的多字节字符不算解码失败
+        return "utf-8" if e.start >= len(sample) - 3 else "gb18030"
+
+def _decode_chunks(chunks, encoding):
+    """按块增量解码（多字节字符跨块时不会被截断）"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+def _mmap_chunks(path, max_bytes, chunk_size):
+    """内存映射文件，逐块产生前 max_bytes 个字节（每次只复制一块）"""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            limit = min(len(mapped), max_bytes)
+            for pos in range(0, limit, chunk_size):
+                yield mapped[pos:min(pos + chunk_size, limit)]
+
+def _ooxml_chunks(archive, names, max_bytes, chunk_size, state):
+    """逐块解压 Office 文档中的正文部件，总量超过 max_bytes 时停止（防止压缩炸弹）"""
+    total = 0
+    for name in names:
+        with archive.open(name) as member:
+            while True:
+                chunk = member.read(min(chunk_size, max_bytes - total))
+                if not chunk:
+                    break
+                total += len(chunk)
+                yield chunk
+                if total >= max_bytes:
+                    state["truncated"] = True
+                    return
+        yield b"\n"  # 部件之间不拼接内容
+
+def file_text_chunks(path, size, max_bytes, chunk_size, state):
+    """逐块产生文件中的文本：普通文本文件内存映射后按块解码，Office 文档逐个解压正文部件；
+    其他二进制文件不产生内容。文件超过 max_bytes 时 state["truncated"] 为 True"""
+    if size == 0:
+        return
+    with open(path, "rb") as f:
+        sample = f.read(min(size, 64 * 1024))
+    if sample.startswith(b"PK\x03\x04"):
+        try:
+            archive = zipfile.ZipFile(path)
+        except zipfile.BadZipFile:
+            return
+        with archive:
+            names = [info.filename for info in archive.infolist() if OOXML_PARTS.match(info.filename)]
+            yield from _decode_chunks(_ooxml_chunks(archive, names, max_bytes, chunk_size, state), "utf-8")
+        return
+    encoding = _guess_encoding(sample)
+    if encoding is None:
+        return
+    state["truncated"] = size > max_bytes
+    yield from _decode_chunks(_mmap_chunks(path, max_bytes, chunk_size), encoding)
+
+def scan_file(engine, path, size, max_bytes=None, time_budget=None, chunk_size=None):
+    """流式扫描一个文件，返回 Verdict（不含命中位置）；超出大小或时间上限时 complete 为 False"""
+    state = {"truncated": False}
+    chunks = file_text_chunks(path, size, FILE_SCAN_MAX_BYTES if max_bytes is None else max_bytes,
+                              FILE_SCAN_CHUNK_SIZE if chunk_size is None else chunk_size, state)
+    try:
+        match, complete = engine.scan_stream(chunks, FILE_SCAN_TIME_BUDGET if time_budget is None else time_budget)
+    finally:
+        chunks.close()
+    if match is not None:
+        return Verdict(True, match.rule_id, (), True)
+    return Verdict(False, None, (), complete and not state["truncated"])
+
+class FileScanner:
+    """复制文件检测 - 在线程池中并行流式扫描复制的文件，检测线程只拿到一个 Future；
+    结论按 (路径, 大小, 修改时间, inode, 规则版本) 缓存，重复复制同一文件不再扫描"""
+
+    def __init__(self, workers=None, cache_size=None, max_files=None):
+        self.max_files = FILE_SCAN_MAX_FILES if max_files is None else max_files
+        self.cache = VerdictCache(FILE_VERDICT_CACHE_SIZE if cache_size is None else cache_size)
+        self._pool = concurrent.futures.ThreadPoolExecutor(FILE_SCAN_WORKERS if workers is None else workers,
+                                                           thread_name_prefix="safeclip-file")
+        self._lock = threading.Lock()
+        self.scans = 0
+        self.scanned_bytes = 0
+        self.errors = 0
+        self.total_scan_time = 0.0
+
+    def submit(self, engine, paths):
+        """提交一次复制的所有文件，返回 concurrent.futures.Future（结果为合并后的 Verdict：任一文件命中即命中）"""
+        future = concurrent.futures.Future()
+        self._pool.submit(self._dispatch, future, engine, list(paths))
+        return future
+
+    def _expand(self, paths):
+        """展开目录，返回 (文件路径列表, 是否超出个数上限)"""
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    for name in names:
+                        if len(files) >= self.max_files:
+                            return files, True
+                        files.append(os.path.join(root, name))
+            else:
+                if len(files) >= self.max_files:
+                    return files, True
+                files.append(path)
+        return files, False
+
+    def _dispatch(self, future, engine, paths):
+        """展开目录、查询缓存，未命中的文件分别交给线程池扫描"""
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            files, truncated = self._expand(paths)
+            state = {"remaining": 0, "complete": not truncated, "lock": threading.Lock()}
+            jobs = []
+            for path in files:
+                try:
+                    st = os.stat(path)
+                except OSError as e:
+                    log_message(f"无法读取复制的文件 {path}: {str(e)}", "WARNING")
+                    state["complete"] = False
+                    continue
+                key = (os.path.abspath(path), st.st_size, st.st_mtime_ns, st.st_ino, engine.version)
+                verdict = self.cache.get(key)
+                if verdict is None:
+                    jobs.append((path, st.st_size, key))
+                elif verdict.sensitive:
+                    future.set_result(verdict)
+                    return
+                elif not verdict.complete:
+                    state["complete"] = False
+            if not jobs:
+                future.set_result(Verdict(False, None, (), state["complete"]))
+                return
+            state["remaining"] = len(jobs)
+            for path, size, key in jobs:
+                self._pool.submit(self._scan_one, future, state, engine, path, size, key)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+
+    def _scan_one(self, future, state, engine, path, size, key):
+        """扫描一个文件；任一文件命中立即给出结论，全部完成后给出合并结论"""
+        verdict = None
+        try:
+            if not future.done():
+                verdict = self._scan_path(engine, path, size, key)
+        finally:
+            # 无论扫描是否出错都要计数，否则合并结论永远不会给出
+            with state["lock"]:
+                if verdict is None or not verdict.complete:
+                    state["complete"] = False
+                state["remaining"] -= 1
+                done = state["remaining"] == 0
+            if not future.done():
+                try:
+                    if verdict is not None and verdict.sensitive:
+                        future.set_result(verdict)
+                    elif done:
+                        future.set_result(Verdict(False, None, (), state["complete"]))
+                except concurrent.futures.InvalidStateError:
+                    pass  # 其他文件已经给出结论
+
+    def _scan_path(self, engine, path, size, key):
+        """扫描一个文件并缓存结论；读取或解压失败（损坏、加密的文档等）时返回未扫描完的结论，
+        由 SCAN_OVERBUDGET_POLICY 处理"""
+        start = time.perf_counter()
+        try:
+            verdict = scan_file(engine, path, size)
+            self.cache.put(key, verdict)
+        except Exception as e:
+            log_message(f"扫描复制的文件 {path} 失败: {type(e).__name__}: {str(e)}", "WARNING")
+            with self._lock:
+                self.errors += 1
+            verdict = Verdict(False, None, (), False)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.scans += 1
+            self.scanned_bytes += min(size, FILE_SCAN_MAX_BYTES)
+            self.total_scan_time += elapsed
+        if g_metrics.enabled:
+            g_metrics.observe("file_scan", elapsed)
+        if verdict.sensitive:
+            log_message(f"复制的文件包含敏感内容({verdict.rule_id}): {path}")
+        return verdict
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "scans": self.scans,
+                "scanned_mb": self.scanned_bytes / (1024 * 1024),
+                "errors": self.errors,
+                "avg_scan_ms": self.total_scan_time / self.scans * 1000 if self.scans else 0.0,
+                "cache": self.cache.stats(),
+            }
+
+def _scan_worker_main(conn):
+    """匹配工作进程：接收 (规则版本, 规则, (校验器, 数字个数), 文本)，返回检测结论"""
+    engines = {}
+    conn.send("ready")
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+        version, rules, checks, text = request
+        engine = engines.get(version)
+        if engine is None:
+            engines.clear()
+            engine = engines[version] = RuleEngine(rules, validators=checks[0], min_digits=checks[1])
+        conn.send(tuple(scan_text(engine, text)))
+
+class ScanSupervisor:
+    """规则匹配监督器 - 在独立工作进程中匹配，超过硬性时限就终止并重启工作进程；
+    收发由监督线程完成，检测线程只拿到一个 Future，不会被失控的正则卡住"""
+
+    def __init__(self, timeout=None):
+        self.timeout = SCAN_HARD_TIMEOUT if timeout is None else timeout
+        self._jobs = queue.Queue()
+        self._process = None
+        self._conn = None
+        self.scans = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.superseded = 0
+        self.starts = 0
+        self.total_scan_time = 0.0
+        self.ready = threading.Event()  # 第一次启动工作进程结束（成功或失败）
+        self._thread = threading.Thread(target=self._supervisor, name="safeclip-scan-supervisor")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, engine, text):
+        """提交一次匹配，返回 concurrent.futures.Future（结果为 Verdict）"""
+        future = concurrent.futures.Future()
+        self._jobs.put((future, engine.version, engine.rules, engine.checks, text))
+        return future
+
+    def _supervisor(self):
+        # 预先启动工作进程，第一次匹配不用等进程启动
+        try:
+            self._start_worker()
+        except Exception as e:
+            log_message(f"匹配工作进程启动失败: {str(e)}", "ERROR")
+            self._stop_worker()
+        self.ready.set()
+        while True:
+            job = self._jobs.get()
+            # 只匹配最新提交的内容，排在前面的请求已经过时
+            while job is not None:
+                try:
+                    newer = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                job[0].cancel()
+                self.superseded += 1
+                job = newer
+            if job is None:
+                break
+            future, version, rules, checks, text = job
+            if future.set_running_or_notify_cancel():
+                future.set_result(self._run(version, rules, checks, text))
+        self._stop_worker()
+
+    def _start_worker(self):
+        """启动工作进程并等待其就绪（进程启动时间不计入匹配时限）"""
+        context = multiprocessing.get_context("spawn")
+        conn, child_conn = context.Pipe()
+        process = context.Process(target=_scan_worker_main, args=(child_conn,), name="safeclip-scan")
+        process.daemon = True
+        process.start()
+        child_conn.close()
+        self._process, self._conn = process, conn
+        self.starts += 1
+        if not conn.poll(SCAN_WORKER_START_TIMEOUT) or conn.recv() != "ready":
+            raise RuntimeError("匹配工作进程启动超时")
+
+    def _stop_worker(self):
+        """终止工作进程"""
+        if self._process is not None:
+            try:
+                self._process.kill()
+                self._process.join(1)
+            except Exception:
+                pass
+        if self._conn is not None:
+            self._conn.close()
+        self._process = self._conn = None
+
+    def _run(self, version, rules, checks, text):
+        """在工作进程中匹配一次；超时或工作进程异常时返回未完成的结论"""
+        start = time.perf_counter()
+        try:
+            if self._process is None or not self._process.is_alive():
+                self._stop_worker()
+                self._start_worker()
+            self._conn.send((version, rules, checks, text))
+            if self._conn.poll(self.timeout):
+                verdict = Verdict(*self._conn.recv())
+                self.scans += 1
+                self.total_scan_time += time.perf_counter() - start
+                return verdict
+            self.timeouts += 1
+            log_message(f"规则匹配超过 {self.timeout} 秒（{len(text)} 字符），终止并重启匹配进程", "WARNING")
+        except Exception as e:
+            self.failures += 1
+            log_message(f"匹配工作进程异常: {str(e)}", "ERROR")
+        self._stop_worker()
+        return Verdict(False, None, (), False)
+
+    def close(self):
+        """停止监督线程和工作进程"""
+        self._jobs.put(None)
+        self._thread.join(2)
+
+    def stats(self):
+        return {
+            "scans": self.scans,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "superseded": self.superseded,
+            "worker_starts": self.starts,
+            "avg_scan_ms": self.total_scan_time / self.scans * 1000 if self.scans else 0.0,
+        }
+
+def is_sensitive_content(text):
+    """用正则检测敏感内容"""
+    return check_content(text).sensitive
+
 def show_message_box(title, message):
     """显示消息框"""
     if IS_WINDOWS:
         try:
             user32.MessageBoxW(None, message, title, 0)
         except Exception as e:
-            log_message(f"显示消息框失败: {str(e)}")
+            log_message(f"显示消息框失败: {str(e)}", "ERROR")
     elif IS_MAC:
         try:
-            script = f'display dialog "{message}" with title "{title}" buttons {{"确定"}} default button "确定"'
-            subprocess.run(["osascript", "-e", script])
+            script = (f'display dialog "{message}" with title "{title}" buttons {{"确定"}} default button "确定" '
+                      f'giving up after {int(NOTIFY_DIALOG_TIMEOUT)}')
+            subprocess.run(["osascript", "-e", script], timeout=NOTIFY_DIALOG_TIMEOUT + NOTIFY_HELPER_GRACE)
         except Exception as e:
-            log_message(f"Mac显示消息框失败: {str(e)}")
+            log_message(f"Mac显示消息框失败: {str(e)}", "ERROR")
 
-def clipboard_monitor_thread():
-    """剪贴板监控线程"""
-    global g_clipboard_content, g_is_sensitive, g_last_check_time
-    
-    last_content = ""
-    last_window_title = ""
-    last_process_name = ""
-    
-    while g_is_running:
-        try:
-            # 控制检测频率
-            current_time = time.time()
-            if current_time - g_last_check_time < CHECK_INTERVAL:
-                time.sleep(0.01)  # 短暂休眠，减少CPU使用
+class MacDialogHelper:
+    """macOS 提示框 - 复用一个常驻的 osascript（JavaScript 交互模式）进程显示对话框，不再每条提示启动一个进程"""
+
+    def __init__(self):
+        self._process = None
+        self._sequence = 0
+        self._output = ""  # 已读取、尚未匹配到结束标记的输出
+        self.starts = 0
+        self.timeouts = 0
+
+    def _start(self):
+        self._process = subprocess.Popen(["osascript", "-l", "JavaScript", "-i"], stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                         text=True, encoding="utf-8", bufsize=1)
+        self.starts += 1
+
+    def _wait_for(self, token, deadline):
+        """读取 osascript 的输出直到出现 token；进程退出时抛出 EOFError，超过 deadline 时抛出 TimeoutError"""
+        fd = self._process.stdout.fileno()
+        while token not in self._output:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("osascript 没有应答")
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
                 continue
-            g_last_check_time = current_time
-            
-            # 获取当前窗口信息
-            current_title, current_process = get_active_window_info()
-            
-            # 检测窗口切换
-            window_switched = (current_title != last_window_title or current_process != last_process_name)
-            if window_switched:
-                log_message(f"窗口切换: {last_window_title} -> {current_title}")
-                log_message(f"进程切换: {last_process_name} -> {current_process}")
-                
-                # 如果切换到黑名单应用，立即检查剪贴板
-                if is_blocked_app_active():
-                    log_message("切换到黑名单应用，立即检查剪贴板")
-                    current_content = get_clipboard_content()
-                    
-                    # 检查是否为敏感内容
-                    if is_sensitive_content(current_content):
-                        log_message(f"检测到敏感内容: {current_content[:50]}...")
-                        clean_clipboard()
-                        # 显示警告消息
-                        threading.Thread(target=show_message_box, 
-                                     args=("SafeClip 安全拦截", "检测到敏感内容，已清空剪贴板！")).start()
-                    
-                    # 检查是否包含图片
-                    elif is_clipboard_has_image():
-                        log_message("检测到图片内容，在黑名单应用中禁止粘贴图片")
-                        clean_clipboard()
-                        # 显示警告消息
-                        threading.Thread(target=show_message_box, 
-                                     args=("SafeClip 安全拦截", "在敏感应用中禁止粘贴图片！")).start()
-                
-                # 更新上一次窗口信息
-                last_window_title = current_title
-                last_process_name = current_process
-            
-            # 获取当前剪贴板内容
-            current_content = get_clipboard_content()
-            g_clipboard_content = current_content
-            
-            # 检查剪贴板内容是否变化
-            if current_content != last_content:
-                log_message(f"剪贴板内容变化: {current_content[:30]}..." if current_content else "剪贴板为空")
-                
-                # 检查是否为敏感内容
-                if is_sensitive_content(current_content):
-                    g_is_sensitive = True
-                    log_message("检测到敏感内容")
-                    
-                    # 检查当前窗口是否在黑名单中
-                    if is_blocked_app_active():
-                        log_message("当前窗口在黑名单中")
-                        log_message(f"拦截内容：{current_content[:50]}...")
-                        
-                        # 执行清空和提醒
-                        clean_clipboard()
-                        
-                        # 在UI线程中显示消息框
-                        threading.Thread(target=show_message_box, 
-                                         args=("SafeClip 安全拦截", "检测到敏感内容，已阻止粘贴！")).start()
+            data = os.read(fd, 4096)
+            if not data:
+                raise EOFError("osascript 已退出")
+            self._output = (self._output + data.decode("utf-8", errors="ignore"))[-4096:]
+        self._output = ""
+
+    def show(self, title, message):
+        """显示对话框并等待关闭；常驻进程异常时重启一次，超时或仍失败则退回单次 osascript"""
+        for _ in range(2):
+            try:
+                if self._process is None or self._process.poll() is not None:
+                    self._start()
+                self._sequence += 1
+                token = f"safeclip-done-{self._sequence}"
+                # 参数用 JSON 编码，内容中的引号和换行不会破坏脚本
+                script = ("(function(){var app=Application.currentApplication();app.includeStandardAdditions=true;"
+                          f"try{{app.displayDialog({json.dumps(message)},{{withTitle:{json.dumps(title)},"
+                          f"buttons:[{json.dumps('确定')}],defaultButton:{json.dumps('确定')},"
+                          f"givingUpAfter:{int(NOTIFY_DIALOG_TIMEOUT)}}})}}catch(e){{}}return {json.dumps(token)}}})()\n")
+                self._process.stdin.write(script)
+                self._process.stdin.flush()
+                self._wait_for(token, time.monotonic() + NOTIFY_DIALOG_TIMEOUT + NOTIFY_HELPER_GRACE)
+                return
+            except TimeoutError as e:
+                # 对话框自动关闭后仍无应答：进程已经卡住，重启后再等一次可能又要等同样久
+                self.timeouts += 1
+                log_message(f"osascript 常驻进程超时，终止并改用单次 osascript: {str(e)}", "WARNING")
+                self.close()
+                break
+            except Exception as e:
+                log_message(f"osascript 常驻进程异常，重新启动: {str(e)}", "WARNING")
+                self.close()
+        show_message_box(title, message)
+
+    def close(self):
+        if self._process is not None:
+            try:
+                self._process.kill()
+                self._process.wait(1)
+            except Exception:
+                pass
+            self._process = None
+        self._output = ""
+
+class Notifier:
+    """拦截提示 - 单个后台线程依次显示提示框（同一时间最多一个）；相同提示在去重窗口内只显示一次，
+    显示频率受限，等待期间到达的提示合并为一条"""
+
+    def __init__(self, show=None, dedup_window=None, min_interval=None, queue_size=None, clock=time.monotonic):
+        self._helper = None
+        if show is None:
+            if IS_MAC:
+                self._helper = MacDialogHelper()
+                show = self._helper.show
+            elif IS_WINDOWS:
+                show = show_message_box  # MessageBoxW 是原生接口，不启动进程
+            else:
+                show = lambda title, message: log_message(f"[{title}] {message}")
+        self._show = show
+        self.dedup_window = NOTIFY_DEDUP_WINDOW if dedup_window is None else dedup_window
+        self.min_interval = NOTIFY_MIN_INTERVAL if min_interval is None else min_interval
+        self._clock = clock
+        self._queue = queue.Queue(NOTIFY_QUEUE_SIZE if queue_size is None else queue_size)
+        self._stop = threading.Event()
+        self._last_shown = {}  # (标题, 内容) -> 提示框关闭的时间
+        self._last_dialog = None
+        self.requests = 0
+        self.shown = 0  # 提示框个数
+        self.displayed = 0  # 作为单独一行显示的提示
+        self.deduplicated = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._thread = threading.Thread(target=self._worker, name="safeclip-notify")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def notify(self, title, message):
+        """提交一条提示（不阻塞）"""
+        self.requests += 1
+        try:
+            self._queue.put_nowait((title, message, self._clock()))
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self, batch):
+        """取出队列中已有的全部提示，收到停止标记时返回 False"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return True
+            if item is None:
+                return False
+            batch.append(item)
+
+    def _worker(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # 频率限制：距上一个提示框不足 min_interval 时先等待，期间到达的提示一起处理
+            if self._last_dialog is not None:
+                wait = self._last_dialog + self.min_interval - self._clock()
+                if wait > 0 and self._stop.wait(wait):
+                    break
+            running = self._drain(batch)
+
+            now = self._clock()
+            pending = OrderedDict()  # (标题, 内容) -> [次数, 最早提交时间]
+            for title, message, submitted in batch:
+                key = (title, message)
+                last = self._last_shown.get(key)
+                if last is not None and now - last < self.dedup_window:
+                    self.deduplicated += 1
+                elif key in pending:
+                    pending[key][0] += 1
+                    self.coalesced += 1
                 else:
-                    g_is_sensitive = False
-                
-                # 检查是否包含图片，且当前窗口在黑名单中
-                if is_clipboard_has_image() and is_blocked_app_active():
-                    log_message("检测到图片内容，在黑名单应用中禁止粘贴图片")
-                    clean_clipboard()
-                    # 显示警告消息
-                    threading.Thread(target=show_message_box, 
-                                     args=("SafeClip 安全拦截", "在敏感应用中禁止粘贴图片！")).start()
-            
-            # 更新上一次的剪贴板内容
-            last_content = current_content
-            
-        except Exception as e:
-            log_message(f"监控异常：{str(e)}")
-            traceback.print_exc()
-            time.sleep(1)
+                    pending[key] = [1, submitted]
+            if not pending:
+                continue
+            # 每条提示只计一次：显示为一行的计入 displayed，并入同一行的重复提示已计入 coalesced
+            self.displayed += len(pending)
+            lines = [message if count == 1 else f"{message}（{count} 次）"
+                     for (_, message), (count, _) in pending.items()]
+            latency = now - min(submitted for _, submitted in pending.values())
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            if g_metrics.enabled:
+                g_metrics.observe("notify_latency", latency)
+            try:
+                self._show(next(iter(pending))[0], "\n".join(lines))
+            except Exception as e:
+                log_message(f"显示提示失败: {str(e)}", "ERROR")
+            self.shown += 1
+            self._last_dialog = done = self._clock()
+            for key in pending:
+                self._last_shown[key] = done
+            self._last_shown = {key: at for key, at in self._last_shown.items() if done - at < self.dedup_window}
 
-def aggressive_clipboard_cleaner_thread():
-    """激进的剪贴板清理线程 - 定期检查并清空敏感内容"""
-    global g_clipboard_content, g_is_sensitive
-    
-    while g_is_running:
-        try:
-            # 如果当前窗口在黑名单中
-            if is_blocked_app_active():
-                # 检查敏感内容
-                if g_is_sensitive:
-                    current_content = get_clipboard_content()
-                    if is_sensitive_content(current_content):
-                        log_message("激进清理: 检测到敏感内容仍在剪贴板中")
-                        clean_clipboard()
-                
-                # 检查图片内容
-                if is_clipboard_has_image():
-                    log_message("激进清理: 检测到图片内容，在黑名单应用中禁止")
-                    clean_clipboard()
-            
-            # 短暂休眠
-            time.sleep(0.2)
-            
-        except Exception as e:
-            log_message(f"激进清理异常：{str(e)}")
-            time.sleep(1)
+    def close(self, timeout=1.0):
+        """停止后台线程（正在显示的提示框不等待）"""
+        self._stop.set()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        if self._helper is not None:
+            self._helper.close()
 
-def keyboard_hook_thread():
-    """模拟键盘钩子 - 定期检查并拦截粘贴操作"""
-    global g_is_running
-    
-    if IS_WINDOWS:
-        # Windows 键盘钩子
-        # 检测Ctrl+V组合键的状态
-        ctrl_state = 0
-        v_state = 0
-        
-        while g_is_running:
+    def stats(self):
+        """提交、显示、去重、合并和丢弃的次数，以及从提交到显示的延迟
+        （每条提示只计入 displayed / coalesced / deduplicated / dropped 之一，shown 为提示框个数）"""
+        return {
+            "requests": self.requests,
+            "shown": self.shown,
+            "displayed": self.displayed,
+            "deduplicated": self.deduplicated,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "avg_latency_ms": self.total_latency / self.shown * 1000 if self.shown else 0.0,
+            "max_latency_ms": self.max_latency * 1000,
+            "helper_starts": self._helper.starts if self._helper is not None else 0,
+            "helper_timeouts": self._helper.timeouts if self._helper is not None else 0,
+        }
+
+# 全局拦截提示（第一次拦截时创建）
+g_notifier = None
+g_notifier_lock = threading.Lock()
+
+def get_notifier():
+    """获取全局拦截提示，不存在时创建"""
+    global g_notifier
+    if g_notifier is None:
+        with g_notifier_lock:
+            if g_notifier is None:
+                g_notifier = Notifier()
+    return g_notifier
+
+class AdaptiveInterval:
+    """自适应检测间隔 - 有活动时回到最小间隔，空闲时按倍数退避，最大不超过安全时限"""
+
+    def __init__(self, min_interval=None, max_interval=None, factor=None):
+        self.min_interval = CHECK_INTERVAL if min_interval is None else min_interval
+        self.max_interval = max(self.min_interval, MAX_CHECK_INTERVAL if max_interval is None else max_interval)
+        self.factor = CHECK_BACKOFF_FACTOR if factor is None else factor
+        self.current = self.min_interval
+        self.resets = 0
+        self.backoffs = 0
+
+    def __call__(self):
+        return self.current
+
+    def reset(self):
+        """有活动：回到最小间隔，返回间隔是否变化"""
+        if self.current == self.min_interval:
+            return False
+        self.current = self.min_interval
+        self.resets += 1
+        return True
+
+    def backoff(self):
+        """空闲：间隔乘以退避倍数（不超过安全时限）"""
+        if self.current < self.max_interval:
+            self.current = min(self.current * self.factor, self.max_interval)
+            self.backoffs += 1
+
+class ScheduledTask:
+    """调度任务（interval 可以是秒数，也可以是返回秒数的可调用对象，如 AdaptiveInterval）"""
+
+    def __init__(self, name, interval, func, enabled=True):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.enabled = enabled
+        self.next_due = 0.0
+        self.runs = 0
+        self.errors = 0
+
+class Scheduler:
+    """单线程任务调度器 - 按周期运行各探测任务，空闲时基于事件等待，支持外部唤醒和干净退出"""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._triggered = set()
+        self.wakeups = 0
+        self.started = None
+
+    def add_task(self, name, interval, func, enabled=True):
+        """添加周期任务"""
+        with self._lock:
+            self._tasks[name] = ScheduledTask(name, interval, func, enabled)
+
+    def set_enabled(self, name, enabled, due=None):
+        """启用/停用任务，启用时立即到期（指定 due 时在 due 到期）"""
+        with self._lock:
+            task = self._tasks[name]
+            if due is not None:
+                task.next_due = due
+            elif enabled and not task.enabled:
+                task.next_due = 0.0
+            task.enabled = enabled
+
+    def expedite(self, name, due):
+        """把任务的下次运行时间提前到 due（已经更早到期时不变）"""
+        with self._lock:
+            task = self._tasks[name]
+            if task.next_due > due:
+                task.next_due = due
+        self._wake.set()
+
+    def trigger(self, name):
+        """让任务立即运行（可在其他线程中调用，如剪贴板变化事件）"""
+        with self._lock:
+            self._triggered.add(name)
+        self._wake.set()
+
+    def run_pending(self, now=None):
+        """运行所有到期任务，返回下一个任务的到期时间（没有任务时返回 None）"""
+        now = self._clock() if now is None else now
+        with self._lock:
+            triggered = self._triggered
+            self._triggered = set()
+            tasks = list(self._tasks.values())
+        for task in tasks:
+            if not task.enabled:
+                continue
+            if task.next_due > now and task.name not in triggered:
+                continue
+            task.runs += 1
             try:
-                # 检测Ctrl键状态
-                new_ctrl_state = win32api.GetAsyncKeyState(win32con.VK_CONTROL)
-                
-                # 检测V键状态
-                new_v_state = win32api.GetAsyncKeyState(ord('V'))
-                
-                # 检测Ctrl+V组合
-                if (new_ctrl_state & 0x8000) and (new_v_state & 0x8000) and not (ctrl_state & 0x8000) and not (v_state & 0x8000):
-                    log_message("检测到Ctrl+V组合键")
-                    
-                    # 检查当前窗口是否在黑名单中
-                    if is_blocked_app_active():
-                        # 获取当前剪贴板内容
-                        current_content = get_clipboard_content()
-                        
-                        # 检查是否为敏感内容
-                        if is_sensitive_content(current_content):
-                            log_message(f"拦截敏感内容粘贴: {current_content[:50]}...")
-                            clean_clipboard()
-                            
-                            # 在UI线程中显示消息框
-                            threading.Thread(target=show_message_box, 
-                                             args=("SafeClip 安全拦截", "检测到敏感内容，已阻止粘贴！")).start()
-                        
-                        # 检查是否包含图片
-                        elif is_clipboard_has_image():
-                            log_message("拦截图片粘贴")
-                            clean_clipboard()
-                            
-                            # 在UI线程中显示消息框
-                            threading.Thread(target=show_message_box, 
-                                             args=("SafeClip 安全拦截", "在敏感应用中禁止粘贴图片！")).start()
-                
-                # 更新按键状态
-                ctrl_state = new_ctrl_state
-                v_state = new_v_state
-                
-                # 短暂休眠
-                time.sleep(0.01)
-                
+                task.func()
+                # 运行后再计算间隔，任务本身调整的间隔（如自适应退避）立即生效
+                task.next_due = now + (task.interval() if callable(task.interval) else task.interval)
             except Exception as e:
-                log_message(f"键盘钩子异常：{str(e)}")
-                time.sleep(1)
-    
-    elif IS_MAC:
-        # Mac 键盘钩子 - 使用 Mac 特定的方法
-        log_message("Mac 键盘钩子启动")
-        
-        # 在 Mac 上，我们主要依赖剪贴板监控，因为 Mac 上的键盘钩子实现比较复杂
-        # 这里只是一个占位，实际上我们依赖剪贴板监控和激进清理线程
-        while g_is_running:
-            time.sleep(1)
-
-def main():
-    """主函数"""
-    global g_is_running, g_clipboard_content
+                task.errors += 1
+                task.next_due = now + 1  # 异常后稍后重试
+                log_message(f"{task.name} 任务异常：{str(e)}", "ERROR")
+                traceback.print_exc()
+        with self._lock:
+            due = [task.next_due for task in self._tasks.values() if task.enabled]
+        return min(due) if due else None
+
+    def run(self):
+        """在当前线程运行调度循环，直到 stop() 被调用"""
+        self.started = self._clock()
+        while not self._stop.is_set():
+            next_due = self.run_pending()
+            timeout = 1.0 if next_due is None else max(0.0, next_due - self._clock())
+            if timeout > 0:
+                self._wake.wait(timeout)
+            self._wake.clear()
+            self.wakeups += 1
+
+    def stop(self):
+        """停止调度循环"""
+        self._stop.set()
+        self._wake.set()
+
+    def is_running(self):
+        return not self._stop.is_set()
+
+    def stats(self):
+        """唤醒次数和各任务运行次数"""
+        with self._lock:
+            elapsed = self._clock() - self.started if self.started is not None else 0.0
+            return {
+                "wakeups": self.wakeups,
+                "wakeups_per_s": self.wakeups / elapsed if elapsed > 0 else 0.0,
+                "tasks": {name: {"runs": task.runs, "errors": task.errors, "enabled": task.enabled,
+                                 "interval": task.interval() if callable(task.interval) else task.interval}
+                          for name, task in self._tasks.items()},
+            }
+
+class SafeClipMonitor:
+    """SafeClip 监控器 - 窗口、剪贴板、按键探测作为同一调度器中的任务运行，共享每周期的状态快照"""
+
+    def __init__(self, clipboard, window_resolver, process_index, clock=time.monotonic, config_watcher=None,
+                 scanner=None, notifier=None, journal=None, shipper=None, file_scanner=None):
+        self.clipboard = clipboard
+        self.notifier = notifier
+        self.journal = journal
+        self.shipper = shipper
+        self.window_resolver = window_resolver
+        self.process_index = process_index
+        self.config_watcher = config_watcher
+        self.scanner = scanner
+        self.file_scanner = file_scanner
+        # 尚未返回的匹配：(Future, 缓存键, 内容)
+        self._pending = None
+        # 尚未返回的文件扫描：(Future, 文件路径)
+        self._file_pending = None
+        self.scheduler = Scheduler(clock)
+        self._clock = clock
+        # 窗口和剪贴板探测共用的自适应检测间隔
+        self.cadence = AdaptiveInterval(g_ruleset.check_interval)
+        self.last_activity = None
+        # 每周期状态快照（只在调度线程中修改）
+        self.window = None
+        self.blocked = False
+        self.change_count = None
+        self.snapshot = None
+        self.digest = None
+        # 连续读取剪贴板内容失败的次数（决定重试间隔）和累计失败次数
+        self._snapshot_failures = 0
+        self.snapshot_failures = 0
+        # verdict 为合并后的结论：文本命中时取文本结论，否则取复制文件的结论
+        self.text_verdict = Verdict(False, None, (), True)
+        self.file_verdict = Verdict(False, None, (), True)
+        self.verdict = self.text_verdict
+        self.verdict_source = "text"
+        self.has_image = False
+        # 图片的指纹和名单结论（没有图片时为 None）
+        self.image_verdict = None
+        self.blocked_reason = None
+        self.blocks = 0
+        # 暂停保护（控制接口）：暂停期间不检测也不拦截，paused_until 为自动恢复时间
+        self.paused = False
+        self.paused_until = None
+        # 控制接口提交的命令，在调度线程中执行
+        self._commands = queue.Queue()
+        self.started = None
+
+        self.scheduler.add_task("window", self.cadence, self.probe_window)
+        self.scheduler.add_task("clipboard", self.cadence, self.probe_clipboard)
+        self.scheduler.add_task("cleaner", CLEANER_INTERVAL, self.probe_cleaner, enabled=False)
+        # 读取剪贴板内容失败后按退避间隔重试，读取成功后停用
+        self.scheduler.add_task("snapshot_retry", self._snapshot_retry_delay, self.probe_clipboard, enabled=False)
+        if IS_WINDOWS:
+            self._ctrl_state = 0
+            self._v_state = 0
+            self.scheduler.add_task("keyboard", KEY_POLL_INTERVAL, self.probe_keyboard, enabled=False)
+        clipboard.add_listener(lambda: self.scheduler.trigger("clipboard"))
+        if config_watcher is not None:
+            self.scheduler.add_task("config", CONFIG_CHECK_INTERVAL, self.probe_config)
+        # 由 call_soon 唤醒；暂停保护且设置了时长时在到期时运行，自动恢复保护
+        self.scheduler.add_task("control", self._control_interval, self.probe_control)
+        if scanner is not None:
+            # 匹配结果返回时被唤醒；时限是兜底的检查周期
+            self.scheduler.add_task("verdict", SCAN_HARD_TIMEOUT, self.probe_verdict, enabled=False)
+            g_metrics.add_collector("scanner", scanner.stats)
+        if file_scanner is not None:
+            # 文件扫描结果返回时被唤醒
+            self.scheduler.add_task("files", SCAN_HARD_TIMEOUT, self.probe_files, enabled=False)
+            g_metrics.add_collector("file_scanner", file_scanner.stats)
+
+        if METRICS_FILE:
+            self.scheduler.add_task("metrics", METRICS_EXPORT_INTERVAL, self.export_metrics)
+        g_metrics.add_collector("scheduler", lambda: {k: v for k, v in self.scheduler.stats().items() if k != "tasks"})
+        g_metrics.add_collector("verdict_cache", g_verdict_cache.stats)
+        g_metrics.add_collector("process_index", process_index.stats)
+        g_metrics.add_collector("window_resolver", window_resolver.stats)
+        g_metrics.add_collector("app_policy", lambda: g_ruleset.app_policy.stats())
+        g_metrics.add_collector("image_policy", lambda: g_ruleset.image_policy.stats())
+        g_metrics.add_collector("rules", lambda: g_ruleset.engine.stats())
+        if config_watcher is not None:
+            g_metrics.add_collector("config", config_watcher.stats)
+        g_metrics.add_collector("monitor", lambda: {"blocks": self.blocks, "blocked_app": int(self.blocked),
+                                                    "check_interval": self.cadence.current,
+                                                    "snapshot_failures": self.snapshot_failures})
+        g_metrics.add_collector("logger", lambda: g_logger.stats() if g_logger else {})
+        if journal is not None:
+            g_metrics.add_collector("journal", journal.stats)
+        if shipper is not None:
+            g_metrics.add_collector("shipper", shipper.stats)
+        g_metrics.add_collector("notifier", lambda: (self.notifier or g_notifier).stats()
+                                if (self.notifier or g_notifier) else {})
+
+    def run(self):
+        """在当前线程运行监控，直到 stop() 被调用"""
+        self.started = time.time()
+        self._record("start", system=SYSTEM, ruleset=g_ruleset.version)
+        self.scheduler.run()
+
+    def stop(self):
+        if self.scheduler.is_running():
+            self._record("stop", blocks=self.blocks)
+        self.scheduler.stop()
+
+    def _record(self, type, **fields):
+        """写入事件日志，并上报 SHIP_EVENT_TYPES 中的事件（未启用时忽略）"""
+        if self.journal is not None:
+            self.journal.record(type, **fields)
+        if self.shipper is not None and type in SHIP_EVENT_TYPES:
+            self.shipper.ship(type, time.time(), fields)
+
+    def block(self, content, message, log):
+        """清空剪贴板（遮盖模式下敏感文本只遮盖命中部分）并提醒用户，content 为拦截的内容类型（"text" / "file" / "image"）"""
+        if self.paused:
+            return
+        if content == "text" and self.verdict_source == "file":
+            content = "file"
+        redacted = self._redact() if content == "text" else None
+        if redacted is not None:
+            message = f"检测到敏感内容，已遮盖剪贴板中的 {redacted[1]} 处敏感信息！"
+            log = f"{log}（遮盖 {redacted[1]} 处）"
+        image_hash = None
+        if content == "image" and self.image_verdict is not None and self.image_verdict.hash is not None:
+            image_hash = format_image_hash(self.image_verdict.hash)
+            # 日志中记下指纹，确认可以分享的图片可以加入允许名单
+            log = f"{log}（图片指纹 {image_hash}，{self.image_verdict.reason}）"
+        log_message(log)
+        window = self.window
+        self._record("block", content=content, rule=self.verdict.rule_id if content != "image" else None,
+                     app=self.blocked_reason, title=window.title if window else "",
+                     process=window.process_name if window else "",
+                     digest=self.digest if content == "text" else None,
+                     image=image_hash, reason=log, action="redact" if redacted else "clear",
+                     redacted=verdict_key(redacted[0])[0] if redacted else None)
+        with g_metrics.timer("clipboard_clear"):
+            if redacted is None or not self.clipboard.replace_text(redacted[0]):
+                self.clipboard.clear()
+        self.blocks += 1
+        g_metrics.inc("blocks", content=content, app=self.blocked_reason or "unknown")
+        # 清空后立即刷新状态；清空失败时状态不变，激进清理会重试
+        self._read_clipboard()
+        # 在UI线程中显示消息框
+        with g_metrics.timer("notify_enqueue"):
+            (self.notifier or get_notifier()).notify("SafeClip 安全拦截", message)
+
+    def _redact(self):
+        """遮盖模式：返回 (遮盖后的文本, 遮盖处数)；不是遮盖模式、没能在预算内找出全部命中位置
+        或遮盖后仍然命中规则时返回 None（改为清空剪贴板）"""
+        if CLIPBOARD_ACTION != "redact" or self.snapshot is None or not self.snapshot.text:
+            return None
+        text = self.snapshot.text
+        engine = g_ruleset.engine
+        with g_metrics.timer("redact"):
+            spans, complete = engine.find_spans(text)
+            if not complete:
+                log_message("无法在扫描预算内找出全部敏感内容，改为清空剪贴板", "WARNING")
+                return None
+            if not spans:
+                # 结论来自超预算策略或缓存，文本中没有可遮盖的位置
+                return None
+            redacted = redact_text(text, spans)
+        if engine.find_spans(redacted)[0]:
+            log_message("遮盖后的文本仍包含敏感内容，改为清空剪贴板", "WARNING")
+            return None
+        return redacted, len(spans)
+
+    def _update_cadence(self, activity=False):
+        """调整检测频率：黑名单应用在前台、剪贴板持有敏感内容或图片、或刚有操作时保持最快，否则逐步退避"""
+        now = self._clock()
+        if activity:
+            self.last_activity = now
+        recent = self.last_activity is not None and now - self.last_activity < ACTIVITY_HOLD_TIME
+        if self.blocked or self.verdict.sensitive or self.has_image or recent:
+            if self.cadence.reset():
+                # 退避期间已经排好的下次检测提前到最小间隔之后
+                self.scheduler.expedite("window", now + self.cadence.current)
+                self.scheduler.expedite("clipboard", now + self.cadence.current)
+        else:
+            self.cadence.backoff()
+
+    def probe_config(self, force=False):
+        """配置探测：配置文件修改后编译新规则集并整体替换，然后按新规则重新检测窗口和剪贴板"""
+        ruleset = self.config_watcher.check(force)
+        if ruleset is None:
+            return False
+        set_ruleset(ruleset)
+        self.apply_ruleset(ruleset)
+        return True
+
+    def call_soon(self, func, *args):
+        """在调度线程中执行 func（可在其他线程中调用），返回 concurrent.futures.Future"""
+        future = concurrent.futures.Future()
+        self._commands.put((future, func, args))
+        self.scheduler.trigger("control")
+        return future
+
+    def _control_interval(self):
+        if self.paused_until is None:
+            return 60.0
+        return max(0.0, self.paused_until - time.time())
+
+    def probe_control(self):
+        """执行控制接口提交的命令；暂停到期时自动恢复保护"""
+        while True:
+            try:
+                future, func, args = self._commands.get_nowait()
+            except queue.Empty:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+        if self.paused_until is not None and time.time() >= self.paused_until:
+            self.resume()
+
+    def pause(self, seconds=None):
+        """暂停保护：停止窗口、剪贴板和清理任务；seconds 秒后自动恢复（None 表示直到 resume）"""
+        self.paused = True
+        self.paused_until = time.time() + seconds if seconds else None
+        for name in ("window", "clipboard"):
+            self.scheduler.set_enabled(name, False)
+        self._set_blocked(None)
+        log_message(f"保护已暂停{f'，{seconds} 秒后自动恢复' if seconds else ''}", "WARNING")
+        self._record("pause", seconds=seconds)
+
+    def resume(self):
+        """恢复保护，并立即按当前规则重新检测窗口和剪贴板"""
+        if not self.paused:
+            return
+        self.paused = False
+        self.paused_until = None
+        # 暂停期间剪贴板可能已经变化
+        self.change_count = None
+        for name in ("window", "clipboard"):
+            self.scheduler.set_enabled(name, True)
+        log_message("保护已恢复")
+        self._record("resume")
+
+    def status(self):
+        """当前状态（只读取状态快照，可在其他线程中调用）"""
+        window = self.window
+        image = self.image_verdict
+        return {
+            "running": self.scheduler.is_running(),
+            "system": SYSTEM,
+            "uptime_s": time.time() - self.started if self.started else 0.0,
+            "paused": self.paused,
+            "paused_until": self.paused_until,
+            "blocked_app": self.blocked_reason,
+            "window": {"title": window.title, "process": window.process_name} if window else None,
+            "clipboard": {"sensitive": self.verdict.sensitive, "rule": self.verdict.rule_id,
+                          "image": self.has_image,
+                          "image_hash": format_image_hash(image.hash) if image and image.hash is not None else None,
+                          "image_allowed": image.allowed if image else None, "files": len(self.snapshot.files) if self.snapshot else 0,
+                          "scan_pending": self._pending is not None,
+                          "file_scan_pending": self._file_pending is not None},
+            "check_interval": self.cadence.current,
+            "blocks": self.blocks,
+            "ruleset": {"version": g_ruleset.version, "source": g_ruleset.source,
+                        "rules": len(g_ruleset.engine.rules), "apps": len(g_ruleset.app_policy.apps),
+                        "processes": len(g_ruleset.blocked_processes), "images": g_ruleset.image_policy.stats()},
+        }
+
+    def apply_ruleset(self, ruleset):
+        """让监控器使用新规则集"""
+        self._record("ruleset", version=ruleset.version, source=ruleset.source)
+        self.process_index.set_blocked_names(ruleset.blocked_processes)
+        self.cadence.min_interval = ruleset.check_interval
+        self.cadence.current = ruleset.check_interval
+        # 剪贴板内容没有变化也要按新规则重新检测
+        self.change_count = None
+        now = self._clock()
+        self.scheduler.expedite("window", now)
+        self.scheduler.expedite("clipboard", now)
+
+    def export_metrics(self):
+        """定期导出运行指标"""
+        if g_metrics.enabled:
+            g_metrics.export(METRICS_FILE)
+
+    def _set_blocked(self, reason):
+        """更新黑名单状态，只在黑名单应用前台时运行清理和按键任务"""
+        blocked = reason is not None
+        self.blocked_reason = reason
+        self.blocked = blocked
+        self.scheduler.set_enabled("cleaner", blocked)
+        if IS_WINDOWS:
+            self.scheduler.set_enabled("keyboard", blocked)
+
+    def probe_window(self):
+        """窗口探测：获取前台窗口快照，检测窗口切换"""
+        info = self.window_resolver.snapshot()
+        last = self.window
+        self.window = info
+        self._set_blocked(blocked_app_reason(info.title, info.process_name, self.process_index))
+
+        # 检测窗口切换
+        switched = last is None or info.title != last.title or info.process_name != last.process_name
+        if switched:
+            log_message(f"窗口切换: {last.title if last else ''} -> {info.title}")
+            log_message(f"进程切换: {last.process_name if last else ''} -> {info.process_name}")
+            self._record("focus", title=info.title, process=info.process_name, pid=info.pid,
+                         blocked=self.blocked_reason)
+
+            # 如果切换到黑名单应用，立即检查剪贴板
+            if self.blocked:
+                log_message("切换到黑名单应用，立即检查剪贴板")
+                self._read_clipboard()
+                if self.verdict.sensitive:
+                    self.block("text", "检测到敏感内容，已清空剪贴板！", "检测到敏感内容，已清空剪贴板")
+                elif self.image_blocked:
+                    self.block("image", "在敏感应用中禁止粘贴图片！", "检测到图片内容，在黑名单应用中禁止粘贴图片")
+        self._update_cadence(activity=switched)
+
+    def _read_clipboard(self):
+        """剪贴板序列号变化时读取内容并更新检测结论，返回内容是否变化"""
+        count = self.clipboard.change_count()
+        if count == self.change_count:
+            return False
+        snapshot = self.clipboard.snapshot()
+        if snapshot is None:
+            # 读取失败：序列号保持不变，这次变化稍后重试，不当作空剪贴板处理
+            self._snapshot_failures += 1
+            self.snapshot_failures += 1
+            g_metrics.inc("snapshot_failures")
+            self.scheduler.set_enabled("snapshot_retry", True, self._clock() + self._snapshot_retry_delay())
+            return False
+        if self._snapshot_failures:
+            self._snapshot_failures = 0
+            self.scheduler.set_enabled("snapshot_retry", False)
+        # 以快照中的序列号为准：读取前刚好又变化时，下次探测不会重复读取
+        self.change_count = count if snapshot.sequence is None else snapshot.sequence
+        self.snapshot = snapshot
+        content = snapshot.text
+        if content:
+            log_message(f"剪贴板内容变化: {content[:30]}...")
+        elif snapshot.files:
+            log_message(f"剪贴板内容变化: 复制了 {len(snapshot.files)} 个文件")
+        elif snapshot.has_image:
+            log_message("剪贴板内容变化: 图片")
+        else:
+            log_message("剪贴板为空")
+        self.text_verdict = self._check_content(content, snapshot)
+        self.file_verdict = self._check_files(snapshot)
+        self._combine_verdicts()
+        self.has_image = snapshot.has_image
+        self.image_verdict = check_image(snapshot) if snapshot.has_image else None
+        # 与检测结论缓存键相同的摘要（超大内容只取扫描范围内的部分），回放时按摘要对应原文
+        self.digest = verdict_key(content, snapshot)[0] if content else None
+        self._record("clipboard", seq=snapshot.sequence, digest=self.digest,
+                     length=len(content), formats=sorted(snapshot.formats), files=len(snapshot.files),
+                     image=format_image_hash(self.image_verdict.hash)
+                     if self.image_verdict and self.image_verdict.hash is not None else None,
+                     sensitive=self.verdict.sensitive, rule=self.verdict.rule_id,
+                     pending=self._pending is not None or self._file_pending is not None)
+        return True
+
+    def _snapshot_retry_delay(self):
+        """读取剪贴板内容失败后的重试间隔：从 SNAPSHOT_RETRY_DELAY 开始加倍，不超过 SNAPSHOT_RETRY_MAX"""
+        failures = max(self._snapshot_failures, 1)
+        return min(SNAPSHOT_RETRY_DELAY * 2 ** min(failures - 1, 16), SNAPSHOT_RETRY_MAX)
+
+    @property
+    def image_blocked(self):
+        """剪贴板中有图片，且不在允许名单中（或在禁止名单中）"""
+        return self.has_image and not (self.image_verdict is not None and self.image_verdict.allowed)
+
+    def _combine_verdicts(self):
+        """合并文本和复制文件的检测结论"""
+        if self.text_verdict.sensitive or not self.file_verdict.sensitive:
+            self.verdict, self.verdict_source = self.text_verdict, "text"
+        else:
+            self.verdict, self.verdict_source = self.file_verdict, "file"
+
+    def _check_files(self, snapshot):
+        """检测复制的文件；最多等待 SCAN_WAIT 秒，未返回的结果由 files 任务稍后处理"""
+        if self._file_pending is not None:
+            self._file_pending[0].cancel()
+            self._file_pending = None
+        if self.file_scanner is None or not snapshot.files:
+            return Verdict(False, None, (), True)
+        future = self.file_scanner.submit(g_ruleset.engine, snapshot.files)
+        try:
+            return apply_scan_policy(future.result(SCAN_WAIT))
+        except concurrent.futures.TimeoutError:
+            log_message(f"复制的 {len(snapshot.files)} 个文件尚未扫描完成，先继续窗口和图片检测", "DEBUG")
+            self._file_pending = (future, snapshot.files)
+            future.add_done_callback(lambda _: self.scheduler.trigger("files"))
+            self.scheduler.set_enabled("files", True)
+            # 与文本匹配相同：结果返回前结论保持待定（不拦截）；扫描超出 FILE_SCAN_TIME_BUDGET
+            # 或结果未扫描完时，由 probe_files 按 SCAN_OVERBUDGET_POLICY 处理
+            return Verdict(False, None, (), True)
+
+    def _check_content(self, content, snapshot):
+        """检测文本；使用匹配工作进程时最多等待 SCAN_WAIT 秒，未返回的结果由 verdict 任务稍后处理"""
+        if self._pending is not None:
+            # 内容又变化了，之前的匹配结果已经没有用
+            self._pending[0].cancel()
+            self._pending = None
+        if self.scanner is None or not content:
+            return check_content(content, snapshot)
+        engine = g_ruleset.engine
+        key = verdict_key(content, snapshot, engine)
+        verdict = g_verdict_cache.get(key)
+        if verdict is not None:
+            return apply_scan_policy(verdict)
+        future = self.scanner.submit(engine, content)
+        try:
+            verdict = future.result(SCAN_WAIT)
+        except concurrent.futures.TimeoutError:
+            log_message("规则匹配尚未完成，先继续窗口和图片检测", "DEBUG")
+            self._pending = (future, key, content)
+            future.add_done_callback(lambda _: self.scheduler.trigger("verdict"))
+            self.scheduler.set_enabled("verdict", True)
+            # 结果返回前结论保持待定（不拦截）；工作进程超时或结果未扫描完时，
+            # 由 probe_verdict 按 SCAN_OVERBUDGET_POLICY 处理
+            return Verdict(False, None, (), True)
+        return record_verdict(key, content, verdict)
+
+    def probe_verdict(self):
+        """匹配结果返回后更新检测结论，黑名单应用在前台时立即拦截"""
+        pending = self._pending
+        if pending is None:
+            self.scheduler.set_enabled("verdict", False)
+            return
+        future, key, content = pending
+        if not future.done():
+            return
+        self._pending = None
+        self.scheduler.set_enabled("verdict", False)
+        if future.cancelled():
+            return
+        self.text_verdict = record_verdict(key, content, future.result())
+        self._combine_verdicts()
+        self._record("verdict", digest=key[0], sensitive=self.text_verdict.sensitive, rule=self.text_verdict.rule_id)
+        if self.verdict.sensitive and self.blocked:
+            self.block("text", "检测到敏感内容，已阻止粘贴！", "匹配完成，当前窗口在黑名单中，拦截敏感内容")
+
+    def probe_files(self):
+        """文件扫描结果返回后更新检测结论，黑名单应用在前台时立即拦截"""
+        pending = self._file_pending
+        if pending is None:
+            self.scheduler.set_enabled("files", False)
+            return
+        future, files = pending
+        if not future.done():
+            return
+        self._file_pending = None
+        self.scheduler.set_enabled("files", False)
+        if future.cancelled():
+            return
+        self.file_verdict = apply_scan_policy(future.result())
+        self._combine_verdicts()
+        self._record("verdict", digest=None, files=len(files), sensitive=self.file_verdict.sensitive,
+                     rule=self.file_verdict.rule_id)
+        if self.verdict.sensitive and self.blocked:
+            self.block("file", "复制的文件包含敏感内容，已阻止粘贴！", "文件扫描完成，当前窗口在黑名单中，拦截敏感文件")
+
+    def probe_clipboard(self):
+        """剪贴板探测：序列号变化时才读取内容并检测"""
+        if not self._read_clipboard():
+            return
+        self._update_cadence(activity=True)
+
+        if self.verdict.sensitive:
+            log_message("检测到敏感内容")
+            if self.blocked:
+                self.block("text", "检测到敏感内容，已阻止粘贴！", "当前窗口在黑名单中，拦截敏感内容")
+        elif self.image_blocked and self.blocked:
+            self.block("image", "在敏感应用中禁止粘贴图片！", "检测到图片内容，在黑名单应用中禁止粘贴图片")
+
+    def probe_cleaner(self):
+        """激进清理：黑名单应用在前台时，敏感内容或图片仍在剪贴板中则再次清空"""
+        self._read_clipboard()
+        if not self.blocked:
+            return
+        if self.verdict.sensitive:
+            self.block("text", "检测到敏感内容，已阻止粘贴！", "激进清理: 检测到敏感内容仍在剪贴板中")
+        elif self.image_blocked:
+            self.block("image", "在敏感应用中禁止粘贴图片！", "激进清理: 检测到图片内容，在黑名单应用中禁止")
+
+    def probe_keyboard(self):
+        """按键探测（Windows）：检测 Ctrl+V 按下"""
+        new_ctrl_state = win32api.GetAsyncKeyState(win32con.VK_CONTROL)
+        new_v_state = win32api.GetAsyncKeyState(ord('V'))
+        pressed = ((new_ctrl_state & 0x8000) and (new_v_state & 0x8000)
+                   and not (self._ctrl_state & 0x8000) and not (self._v_state & 0x8000))
+        self._ctrl_state = new_ctrl_state
+        self._v_state = new_v_state
+        if pressed:
+            log_message("检测到Ctrl+V组合键")
+            self.handle_paste()
+
+    def handle_paste(self):
+        """粘贴时检查：黑名单应用中粘贴敏感内容或图片时拦截"""
+        self._record("paste", blocked=self.blocked_reason)
+        if not self.blocked:
+            return
+        self._read_clipboard()
+        if self._pending is not None:
+            # 粘贴时再看一次尚未取回的匹配结果
+            self.probe_verdict()
+        if self._file_pending is not None:
+            self.probe_files()
+        if self.verdict.sensitive:
+            self.block("text", "检测到敏感内容，已阻止粘贴！", "拦截敏感内容粘贴")
+        elif self.image_blocked:
+            self.block("image", "在敏感应用中禁止粘贴图片！", "拦截图片粘贴")
+
+def parse_control_address(address):
+    """控制接口地址 -> (地址, 地址族)：命名管道、Unix 域套接字或 "主机:端口"（本机 TCP）"""
+    if address.startswith("\\\\.\\pipe\\"):
+        return address, "AF_PIPE"
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return (host or "127.0.0.1", int(port)), "AF_INET"
+    return address, "AF_UNIX"
+
+def load_control_authkey(path=None, create=False):
+    """读取控制接口认证密钥；create 为 True 且文件不存在时生成（只有当前用户可读写）"""
+    return _load_key_file(path or CONTROL_AUTHKEY_FILE, create)
+
+def load_digest_key(path=None, create=False):
+    """读取内容摘要密钥；create 为 True 且文件不存在时生成（只有当前用户可读写）"""
+    return _load_key_file(path or DIGEST_KEY_FILE, create)
+
+def _load_key_file(path, create):
+    """读取密钥文件，create 为 True 且文件不存在时生成 32 字节随机密钥"""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        if not create:
+            raise
+    key = os.urandom(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+def _set_nodelay(conn):
+    """本机 TCP 连接关闭 Nagle 算法（请求头和内容分两次发送，否则每次应答要等待延迟确认）"""
+    sock = socket.fromfd(conn.fileno(), socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    finally:
+        sock.close()
+
+class ControlServer:
+    """本地控制接口 - 在独立线程中接受连接并应答，查询直接读取状态快照，不经过检测线程；
+    重新加载、暂停、恢复等修改状态的命令交给调度线程执行
+
+    请求和应答都是字典：{"cmd": "status"} -> {"ok": True, "result": {...}}"""
+
+    def __init__(self, monitor, address=None, authkey=None):
+        self.monitor = monitor
+        self.address, self.family = parse_control_address(address or CONTROL_ADDRESS)
+        if self.family == "AF_UNIX" and os.path.exists(self.address):
+            # 上次异常退出留下的套接字文件；仍有实例在监听时不抢占
+            try:
+                multiprocessing.connection.Client(self.address, self.family, authkey=authkey).close()
+            except OSError:
+                os.remove(self.address)
+            else:
+                raise RuntimeError(f"控制接口 {self.address} 已被另一个 SafeClip 实例使用")
+        self._listener = multiprocessing.connection.Listener(self.address, self.family, authkey=authkey)
+        if self.family == "AF_INET":
+            self.address = self._listener.address  # 端口为 0 时使用系统分配的端口
+        self.requests = 0
+        self.errors = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._serve, name="safeclip-control")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _serve(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                if self._closed:
+                    break
+                self.errors += 1
+                log_message(f"控制接口连接失败: {str(e)}", "WARNING")
+                continue
+            if self.family == "AF_INET":
+                _set_nodelay(conn)
+            thread = threading.Thread(target=self._handle, args=(conn,), name="safeclip-control-conn")
+            thread.daemon = True
+            thread.start()
+
+    def _handle(self, conn):
+        """处理一个连接上的请求，直到客户端关闭连接"""
+        with conn:
+            while not self._closed:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                self.requests += 1
+                try:
+                    response = {"ok": True, "result": self.dispatch(request)}
+                except Exception as e:
+                    self.errors += 1
+                    response = {"ok": False, "error": str(e)}
+                try:
+                    conn.send(response)
+                except (OSError, ValueError):
+                    break
+
+    def dispatch(self, request):
+        """执行一条命令并返回结果"""
+        if not isinstance(request, dict):
+            raise ValueError("请求必须是字典")
+        command = request.get("cmd")
+        monitor = self.monitor
+        if command == "status":
+            return monitor.status()
+        if command == "ruleset":
+            return monitor.status()["ruleset"]
+        if command == "metrics":
+            return g_metrics.snapshot()
+        if command == "reload":
+            if monitor.config_watcher is None:
+                raise ValueError("未配置 CONFIG_FILE，无法重新加载规则")
+            reloaded = monitor.call_soon(monitor.probe_config, True).result(CONTROL_TIMEOUT)
+            return {"reloaded": reloaded, "version": g_ruleset.version, "source": g_ruleset.source,
+                    "errors": monitor.config_watcher.errors}
+        if command == "pause":
+            seconds = request.get("seconds")
+            if seconds is not None and (isinstance(seconds, bool) or not isinstance(seconds, (int, float))
+                                        or not math.isfinite(seconds) or seconds <= 0):
+                raise ValueError("seconds 必须是正数")
+            monitor.call_soon(monitor.pause, seconds).result(CONTROL_TIMEOUT)
+            return {"paused": True, "paused_until": monitor.paused_until}
+        if command == "resume":
+            monitor.call_soon(monitor.resume).result(CONTROL_TIMEOUT)
+            return {"paused": False}
+        if command == "stop":
+            monitor.stop()
+            return {"stopping": True}
+        raise ValueError(f"未知命令: {command}")
+
+    def close(self):
+        """停止接受连接"""
+        self._closed = True
+        # 关闭监听不一定能让阻塞中的 accept() 返回，先连接一次把线程唤醒
+        try:
+            multiprocessing.connection.Client(self.address, self.family).close()
+        except Exception:
+            pass
+        try:
+            self._listener.close()
+        except OSError:
+            pass
+        self._thread.join(1.0)
+
+    def stats(self):
+        return {"requests": self.requests, "errors": self.errors}
+
+def control_request(request, address=None, authkey=None):
+    """向运行中的 SafeClip 发送一条控制命令，返回应答中的结果；命令失败时抛出 RuntimeError"""
+    address, family = parse_control_address(address or CONTROL_ADDRESS)
+    if authkey is None:
+        authkey = load_control_authkey()
+    with multiprocessing.connection.Client(address, family, authkey=authkey) as conn:
+        if family == "AF_INET":
+            _set_nodelay(conn)
+        conn.send(request)
+        response = conn.recv()
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error", "未知错误"))
+    return response["result"]
+
+def main(startup_profile=False):
+    """主函数；startup_profile 为 True 时完成初始化后输出各阶段耗时并退出，不进入监控"""
+    global g_clipboard_backend, g_process_index, g_window_resolver, g_monitor, g_digest_key
+    scanner = None
+    file_scanner = None
+    journal = None
+    control = None
+    shipper = None
     
     try:
         log_message(f"SafeClip 已启动，在{SYSTEM}系统上运行...")
         log_message("按Ctrl+C可退出程序")
+        g_startup.mark("启动日志")
         
-        # 获取初始剪贴板内容
-        g_clipboard_content = get_clipboard_content()
-        log_message(f"初始剪贴板内容: {g_clipboard_content[:30]}..." if g_clipboard_content else "剪贴板为空")
+        # 平台模块在这里才导入，缺少依赖时直接报错退出
+        load_platform_modules()
         
-        # 启动剪贴板监控线程
-        monitor_thread = threading.Thread(target=clipboard_monitor_thread)
-        monitor_thread.daemon = True
-        monitor_thread.start()
+        # 加载配置文件（不存在时使用 safeclip.py 中的默认配置）
+        config_watcher = None
+        if CONFIG_FILE:
+            config_watcher = ConfigWatcher(CONFIG_FILE)
+            ruleset = config_watcher.check()
+            if ruleset is not None:
+                set_ruleset(ruleset)
+        if g_ruleset.source == "内置配置":
+            # 内置规则无法拒绝加载，只记录警告
+            check_rule_costs(g_ruleset.engine.rules, g_ruleset.source, "off" if RULE_ANALYSIS == "off" else "warn")
+        g_startup.mark("加载配置和规则检查")
         
-        # 启动激进的剪贴板清理线程
-        cleaner_thread = threading.Thread(target=aggressive_clipboard_cleaner_thread)
-        cleaner_thread.daemon = True
-        cleaner_thread.start()
+        # 创建前台窗口解析器、运行进程索引和剪贴板后端
+        g_window_resolver = create_window_resolver()
+        g_startup.mark("创建窗口解析器")
+        g_process_index = ProcessIndex(g_ruleset.blocked_processes)
+        g_startup.mark("创建进程索引")
+        g_clipboard_backend = create_clipboard_backend()
+        g_startup.mark("创建剪贴板后端")
         
-        # 启动键盘钩子线程
-        keyboard_thread = threading.Thread(target=keyboard_hook_thread)
-        keyboard_thread.daemon = True
-        keyboard_thread.start()
+        # 规则匹配在独立的工作进程中进行，失控的正则不会卡住监控
+        if SCAN_ISOLATION == "process":
+            scanner = ScanSupervisor()
+        # 复制的文件在线程池中流式扫描
+        if FILE_SCAN_ENABLED:
+            file_scanner = FileScanner()
         
-        # 主线程等待用户中断
-        while g_is_running:
-            time.sleep(0.1)
+        # 内容摘要带本机密钥（事件日志和上报中只有摘要）
+        try:
+            g_digest_key = load_digest_key(create=True)
+        except OSError as e:
+            # 密钥文件不可用时使用本次运行的临时密钥：摘要仍然无法穷举，只是不能跨运行匹配
+            g_digest_key = os.urandom(32)
+            log_message(f"摘要密钥文件不可用，使用临时密钥: {str(e)}", "WARNING")
+
+        # 所有探测任务运行在主线程的调度器中
+        if JOURNAL_FILE:
+            journal = EventJournal(JOURNAL_FILE)
+        if SHIP_URL and not startup_profile:
+            try:
+                shipper = EventShipper(SHIP_URL)
+            except (ValueError, OSError) as e:
+                log_message(f"事件上报未开启: {str(e)}", "ERROR")
+        g_monitor = SafeClipMonitor(g_clipboard_backend, g_window_resolver, g_process_index,
+                                    config_watcher=config_watcher, scanner=scanner, journal=journal,
+                                    shipper=shipper, file_scanner=file_scanner)
+        g_startup.mark("创建监控器")
+        
+        # 本地控制接口（查询状态、重新加载规则、暂停/恢复保护）
+        if CONTROL_ADDRESS and not startup_profile:
+            try:
+                control = ControlServer(g_monitor, CONTROL_ADDRESS, load_control_authkey(create=True))
+                g_metrics.add_collector("control", control.stats)
+                log_message(f"控制接口已开启: {control.address}")
+            except Exception as e:
+                log_message(f"控制接口开启失败: {str(e)}", "WARNING")
+        if startup_profile:
+            g_process_index.refresh(force=True)
+            g_startup.mark("首次刷新进程列表")
+            g_monitor.scheduler.run_pending(time.monotonic())
+            g_startup.mark("首轮检测")
+            if scanner:
+                # 工作进程在后台启动，不阻塞首轮检测；这里单独记录它就绪的时间
+                scanner.ready.wait(SCAN_WORKER_START_TIMEOUT)
+                g_startup.mark("匹配工作进程就绪")
+            print(g_startup.report())
+            return
+        g_monitor.run()
             
     except KeyboardInterrupt:
         log_message("用户中断，程序即将退出...")
-        g_is_running = False
     except Exception as e:
-        log_message(f"程序异常: {str(e)}")
+        log_message(f"程序异常: {str(e)}", "ERROR")
         traceback.print_exc()
     finally:
-        g_is_running = False
+        if g_monitor:
+            g_monitor.stop()
+            log_message(f"调度统计: {g_monitor.scheduler.stats()}")
+            if g_metrics.enabled and METRICS_FILE:
+                g_monitor.export_metrics()
+        if control:
+            control.close()
+        if scanner:
+            scanner.close()
+        if file_scanner:
+            log_message(f"文件扫描统计: {file_scanner.stats()}")
+            file_scanner.close()
+        if g_notifier:
+            log_message(f"提示统计: {g_notifier.stats()}")
+            g_notifier.close()
+        if g_clipboard_backend:
+            g_clipboard_backend.close()
+        if journal:
+            journal.close()
+        if shipper:
+            shipper.close()
+            log_message(f"上报统计: {shipper.stats()}")
         log_message("程序已退出")
+        if g_logger:
+            log_message(f"日志统计: {g_logger.stats()}")
+            g_logger.close()
 
 if __name__ == "__main__":
+    # 打包后的程序启动匹配工作进程时需要
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="SafeClip 剪贴板安全监控")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="输出启动各阶段（模块导入、初始化）的耗时后退出")
+    parser.add_argument("--ctl", nargs="+", metavar="命令",
+                        help="控制运行中的 SafeClip：status / ruleset / metrics / reload / pause [秒] / resume / stop")
+    args = parser.parse_args()
+    if args.ctl:
+        request = {"cmd": args.ctl[0]}
+        if args.ctl[0] == "pause" and len(args.ctl) > 1:
+            try:
+                seconds = float(args.ctl[1])
+            except ValueError:
+                seconds = None
+            if len(args.ctl) > 2 or seconds is None or not math.isfinite(seconds) or seconds <= 0:
+                parser.error(f"pause 的参数必须是一个正数（秒），收到: {' '.join(args.ctl[1:])}")
+            request["seconds"] = seconds
+        try:
+            result = control_request(request)
+        except (OSError, EOFError, RuntimeError, multiprocessing.AuthenticationError) as e:
+            print(f"控制命令失败: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        sys.exit(0)
     try:
-        # 检查操作系统并安装必要的依赖
-        if IS_WINDOWS:
-            # Windows 依赖已在顶部导入
-            pass
-        elif IS_MAC:
-            # Mac 依赖已在顶部导入
-            pass
-        else:
+        if not IS_WINDOWS and not IS_MAC and not args.startup_profile:
             log_message(f"不支持的操作系统: {SYSTEM}")
             sys.exit(1)
-            
-        main()
+        load_platform_modules()
+        main(startup_profile=args.startup_profile)
+    except MissingDependencyError as e:
+        log_message(str(e), "ERROR")
+        sys.exit(1)
     except Exception as e:
-        log_message(f"程序启动异常: {str(e)}")
+        log_message(f"程序启动异常: {str(e)}", "ERROR")
         traceback.print_exc()
         input("按Enter键退出...")
\ No newline at end of file
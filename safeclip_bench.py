@@ -0,0 +1,1486 @@
+#!/usr/bin/env python3
+"""
+SafeClip 性能基准脚本 - 在任意平台（包括无图形界面的 Linux）上测量检测逻辑的耗时
+
+用法:
+    python3 safeclip_bench.py rules            # 规则引擎 vs 旧的逐条正则扫描
+    python3 safeclip_bench.py validators       # 数字串预检和结构校验：吞吐量、误报率和召回率
+    python3 safeclip_bench.py redos            # 病态输入：直接匹配 vs 受监督的工作进程（硬性时限，监控不中断）
+    python3 safeclip_bench.py analyze          # 规则性能检查：回溯风险、吞吐量和最坏情况增长曲线
+    python3 safeclip_bench.py analyze --config safeclip_config.json
+    python3 safeclip_bench.py cache            # 检测结论缓存命中 vs 重新扫描
+    python3 safeclip_bench.py latency          # 剪贴板变化到检测结论的延迟（内存后端）
+    python3 safeclip_bench.py processes        # 黑名单进程检测：进程索引 vs 全量遍历
+    python3 safeclip_bench.py window           # 前台窗口查询：共享快照 vs 各自查询
+    python3 safeclip_bench.py policy           # 黑名单应用匹配：逐项检查 vs 编译后的匹配器（7 ~ 500 项）
+    python3 safeclip_bench.py idle             # 空闲时的唤醒次数和 CPU 占用：调度器 vs 旧线程结构
+    python3 safeclip_bench.py logging          # 写日志耗时：异步队列 vs 同步写文件
+    python3 safeclip_bench.py huge             # 超大内容：全文扫描 vs 受预算限制的分块扫描
+    python3 safeclip_bench.py replay           # 回放操作序列，输出拦截延迟、CPU 和系统调用次数（JSON）
+    python3 safeclip_bench.py replay --trace trace.json
+    python3 safeclip_bench.py replay --journal safeclip_events.jsonl --texts suspects.txt
+    python3 safeclip_bench.py cadence          # 检测频率：固定间隔 vs 空闲退避（回放同一操作序列）
+    python3 safeclip_bench.py metrics          # 运行指标的开销：关闭 vs 开启，并输出一次指标快照
+    python3 safeclip_bench.py notify           # 拦截提示：每次拦截一个线程 vs 去重合并的提示队列
+    python3 safeclip_bench.py ship             # 拦截事件上报：逐条 POST vs 攒批压缩 + 保持连接（本机收集端）
+    python3 safeclip_bench.py files            # 复制文件检测：整个读入串行扫描 vs 内存映射流式扫描（线程池）和缓存
+    python3 safeclip_bench.py images           # 图片名单：指纹耗时随分辨率、名单查询耗时随名单大小的变化（需要 numpy）
+    python3 safeclip_bench.py redact           # 遮盖模式：单次扫描 + 一次拼接 vs 逐条规则 re.sub，对比只检测的扫描
+    python3 safeclip_bench.py rules --json     # 以 JSON 输出结果
+"""
+
+import argparse
+import gzip
+import http.server
+import json
+import os
+import random
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+from datetime import datetime
+
+import safeclip
+
+# 剪贴板负载大小（字节）：100 B ~ 10 MB
+PAYLOAD_SIZES = [100, 1000, 10 * 1000, 100 * 1000, 1000 * 1000, 10 * 1000 * 1000]
+
+# 生成负载时使用的普通文本片段（不包含敏感内容）
+FILLER_WORDS = ["今天", "开会", "项目", "进度", "hello", "world", "order", "2025", "ok", "收到",
+                "report", "v1.2.3", "12345", "下午三点", "meeting", "#42", "价格", "99.5"]
+
+
+def make_payload(size, seed=0, sensitive_tail=""):
+    """生成指定大小的普通文本负载，可在末尾追加敏感内容（最坏情况：全文扫描后才命中）"""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    target = max(0, size - len(sensitive_tail))
+    while length < target:
+        word = rng.choice(FILLER_WORDS)
+        parts.append(word)
+        parts.append(" ")
+        length += len(word) + 1
+    return "".join(parts)[:target] + sensitive_tail
+
+
+def legacy_is_sensitive(text):
+    """旧实现：逐条规则调用 re.search（依赖 re 模块缓存，每条规则扫描一遍文本）"""
+    for _, pattern in safeclip.SENSITIVE_PATTERNS:
+        if re.search(pattern, text, re.IGNORECASE):
+            return True
+    return False
+
+
+def time_call(func, arg, min_time=0.2, max_repeat=1000):
+    """多次调用取单次最短耗时（秒）"""
+    best = float("inf")
+    total = 0.0
+    repeat = 0
+    while repeat < max_repeat and (total < min_time or repeat < 3):
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+        repeat += 1
+    return best
+
+
+def bench_rules(args):
+    """规则引擎单次扫描 vs 旧的逐条正则扫描"""
+    # 只比较正则部分（不含数字串预检和结构校验，结果与旧实现一致）
+    engine = safeclip.RuleEngine(safeclip.SENSITIVE_PATTERNS, validators={}, min_digits={})
+    results = []
+    for size in PAYLOAD_SIZES:
+        for case, tail in (("clean", ""), ("hit_at_end", " 13812345678")):
+            text = make_payload(size, sensitive_tail=tail)
+            assert legacy_is_sensitive(text) == (engine.scan(text) is not None)
+            legacy = time_call(legacy_is_sensitive, text, args.min_time)
+            engine_time = time_call(engine.scan, text, args.min_time)
+            results.append({
+                "size": size,
+                "case": case,
+                "legacy_ms": legacy * 1000,
+                "engine_ms": engine_time * 1000,
+                "speedup": legacy / engine_time if engine_time else None,
+                "engine_mb_s": size / engine_time / 1e6 if engine_time else None,
+            })
+    return results
+
+
+def make_id_card(rng):
+    """生成校验位正确的 18 位身份证号"""
+    body = "110105" + f"{rng.randint(1950, 2005)}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}{rng.randint(0, 999):03d}"
+    total = sum(int(ch) * weight for ch, weight in zip(body, safeclip.GB11643_WEIGHTS))
+    return body + safeclip.GB11643_CHECK_CODES[total % 11]
+
+
+def separate_id_card(number, rng):
+    """按常见写法给身份证号加空格或横线：6-8-4（区划-生日-顺序码）或每 4 位一组"""
+    sep = rng.choice(" -")
+    if rng.random() < 0.5:
+        return sep.join((number[:6], number[6:14], number[14:]))
+    return sep.join(number[i:i + 4] for i in range(0, 18, 4))
+
+
+def make_corpus(count, seed=0):
+    """生成带标注的语料：(文本, 是否真正敏感)。负例包含订单号、流水号、时间戳等长数字，
+    正例中一半的身份证号带空格/横线分隔，一半的手机号后面紧跟 7 位数字（分机号、日期等，
+    连起来恰好是 18 位，会先被当成分隔写法的身份证号再被校验排除）"""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        kind = i % 6
+        text = make_payload(rng.randint(50, 400), seed=rng.random())
+        if kind == 0:
+            corpus.append((text, False))  # 普通文本
+        elif kind == 1:
+            order = f"2025{rng.randint(10 ** 13, 10 ** 14 - 1)}"
+            corpus.append((f"{text} 订单号 {order}", False))
+        elif kind == 2:
+            serial = "".join(rng.choice("0123456789") for _ in range(rng.choice((11, 15, 18))))
+            corpus.append((f"{text} 流水号 {serial}", False))
+        elif kind == 3:
+            corpus.append((f"{text} 时间戳 {rng.randint(10 ** 12, 10 ** 13 - 1)} 编号 1{rng.randint(0, 2)}{rng.randint(10 ** 8, 10 ** 9 - 1)}", False))
+        elif kind == 4:
+            number = make_id_card(rng)
+            if i % 12 == 10:
+                number = separate_id_card(number, rng)
+            corpus.append((f"{text} 身份证 {number}", True))
+        else:
+            mobile = rng.choice(("138", "139", "150", "186", "199")) + f"{rng.randint(0, 10 ** 8 - 1):08d}"
+            if i % 12 == 11:
+                mobile += rng.choice(" -") + f"{rng.randint(0, 10 ** 7 - 1):07d}"
+            corpus.append((f"{text} 电话 {mobile}", True))
+    return corpus
+
+
+def bench_validators(args):
+    """数字串预检和结构校验：语料吞吐量、误报率和召回率（对比只用正则）；
+    带校验的引擎漏掉任何正例（包括分隔写法的身份证号）时以失败退出"""
+    corpus = make_corpus(3000, args.seed)
+    rng = random.Random(args.seed)
+    separated = [(f"身份证 {separate_id_card(make_id_card(rng), rng)}", True) for _ in range(200)]
+    total_chars = sum(len(text) for text, _ in corpus)
+    # 没有长数字串的普通文本（日常复制内容的大多数）
+    plain = corpus[::6]
+    results = []
+    engines = (
+        ("regex_only", safeclip.RuleEngine(safeclip.SENSITIVE_PATTERNS, validators={}, min_digits={})),
+        ("prefilter_validators", safeclip.RuleEngine(safeclip.SENSITIVE_PATTERNS)),
+    )
+    for mode, engine in engines:
+        def run(items, engine=engine):
+            return [engine.scan(text) is not None for text, _ in items]
+        flagged = run(corpus)
+        separated_hits = run(separated)
+        negatives = [hit for hit, (_, sensitive) in zip(flagged, corpus) if not sensitive]
+        positives = [hit for hit, (_, sensitive) in zip(flagged, corpus) if sensitive]
+        elapsed = time_call(run, corpus, args.min_time, max_repeat=20)
+        plain_elapsed = time_call(run, plain, args.min_time, max_repeat=20)
+        results.append({
+            "mode": mode,
+            "mb_s": total_chars / elapsed / 1e6 if elapsed else None,
+            "plain_text_mb_s": sum(len(text) for text, _ in plain) / plain_elapsed / 1e6 if plain_elapsed else None,
+            "false_positive_rate": sum(negatives) / len(negatives),
+            "recall": sum(positives) / len(positives),
+            "separated_recall": sum(separated_hits) / len(separated_hits),
+            "prefilter_skips": engine.prefilter_skips,
+            "rejected": engine.rejected,
+        })
+    checked = results[-1]
+    if checked["recall"] < 1.0 or checked["separated_recall"] < 1.0:
+        print_table(results)
+        raise SystemExit(f"结构校验漏报：recall={checked['recall']:.4f}，"
+                         f"separated_recall={checked['separated_recall']:.4f}")
+    return results
+
+
+# 会发生灾难性回溯的规则（嵌套量词）和对应的病态输入
+REDOS_RULE = ("evil_nested", r"(\d+)+[A-Z]")
+
+
+def redos_text(n):
+    return "1" * n + "!"
+
+
+def check_redos_policy(monitor, clipboard, scanner, engine, policy, n):
+    """在 policy 下检查病态输入：等待结果期间结论保持待定（黑名单应用中也不提前拦截），超时后工作进程被终止、
+    结论为未扫描完并按策略处理，下一次匹配时工作进程重新启动；返回 (结果行, 失败原因列表)"""
+    safeclip.SCAN_OVERBUDGET_POLICY = policy
+    blocked = policy == "block"
+    problems = []
+    before = scanner.stats()
+    text = redos_text(n)
+    start = time.perf_counter()
+    clipboard.set_text(text)
+    # 等待期间的结论：不论策略都不拦截
+    while monitor._pending is None and time.perf_counter() - start < 5:
+        time.sleep(0.001)
+    time.sleep(0.01)
+    if monitor._pending is None:
+        problems.append("匹配没有进入等待状态")
+    elif monitor.verdict.sensitive:
+        problems.append(f"等待期间的结论为 {monitor.verdict}")
+    while monitor._pending is not None and time.perf_counter() - start < scanner.timeout + 5:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    verdict = monitor.verdict
+    if verdict.complete or verdict.sensitive != blocked:
+        problems.append(f"超时后的结论为 {verdict}")
+    killed = scanner.stats()
+    if killed["timeouts"] != before["timeouts"] + 1:
+        problems.append("病态规则没有被终止")
+    # 终止后的下一次匹配重新启动工作进程并正常给出结论
+    normal = scanner.submit(engine, f"客户电话 13812345678 #{n}").result(safeclip.SCAN_WORKER_START_TIMEOUT)
+    if scanner.stats()["worker_starts"] != killed["worker_starts"] + 1 or normal.rule_id != "mobile":
+        problems.append(f"工作进程没有重新启动（{scanner.stats()}，{normal}）")
+    row = {"mode": f"check_{policy}", "input_len": len(text), "verdict_ms": elapsed * 1000,
+           "rule": verdict.rule_id or "allow", "window_checks": 0, "check": "FAIL" if problems else "pass"}
+    return row, [f"{policy}: {problem}" for problem in problems]
+
+
+def bench_redos(args):
+    """病态输入压力测试：灾难性回溯的规则在检测线程中直接匹配 vs 在受监督的工作进程中匹配（带硬性时限）；
+    两种超预算策略下都检查病态规则被终止、工作进程重启、结论为未扫描完，任一项不通过时以失败退出"""
+    ruleset = safeclip.compile_ruleset({"sensitive_patterns": list(safeclip.SENSITIVE_PATTERNS) + [REDOS_RULE]},
+                                       "压力测试")
+    saved = (safeclip.g_ruleset, safeclip.ENABLE_LOG, safeclip.SCAN_OVERBUDGET_POLICY)
+    results = []
+    problems = []
+    safeclip.ENABLE_LOG = False
+    safeclip.g_ruleset = ruleset
+    scanner = safeclip.ScanSupervisor(timeout=0.5)
+    try:
+        # 直接匹配：耗时随输入长度指数增长，期间检测线程完全停止
+        for n in (14, 16, 18, 20, 22):
+            start = time.perf_counter()
+            ruleset.engine.evaluate(redos_text(n))
+            elapsed = time.perf_counter() - start
+            results.append({"mode": "inline", "input_len": n + 1, "verdict_ms": elapsed * 1000,
+                             "rule": "-", "window_checks": 0, "check": "-"})
+
+        # 受监督匹配：监控器在后台线程运行，病态输入（直接匹配需要数小时）在时限后按策略处理
+        scanner.submit(ruleset.engine, "warmup").result(safeclip.SCAN_WORKER_START_TIMEOUT)
+        table = FakeProcessTable(400)
+        clipboard = safeclip.MemoryClipboardBackend()
+        resolver = safeclip.FakeWindowResolver()
+        resolver.set_foreground("微信", "WeChat.exe", 4242)
+        index = safeclip.ProcessIndex(safeclip.BLOCKED_PROCESSES, list_pids=table.pids, get_name=table.name,
+                                      get_identity=table.create_time)
+        monitor = safeclip.SafeClipMonitor(clipboard, resolver, index, scanner=scanner)
+        monitor.block = lambda content, message, log: None  # 不弹窗，只看检测结论
+        thread = threading.Thread(target=monitor.run)
+        thread.start()
+        time.sleep(0.3)
+        cases = (("normal", "客户电话 13812345678", "mobile"),
+                 ("pathological", redos_text(40), safeclip.SCAN_BUDGET_RULE))
+        for label, text, expected in cases:
+            window_runs = monitor.scheduler.stats()["tasks"]["window"]["runs"]
+            start = time.perf_counter()
+            clipboard.set_text(text)
+            while ((monitor.verdict.rule_id != expected or monitor._pending is not None)
+                   and time.perf_counter() - start < 5):
+                time.sleep(0.001)
+            elapsed = time.perf_counter() - start
+            results.append({
+                "mode": f"supervised_{label}",
+                "input_len": len(text),
+                "verdict_ms": elapsed * 1000,
+                "rule": monitor.verdict.rule_id,
+                "window_checks": monitor.scheduler.stats()["tasks"]["window"]["runs"] - window_runs,
+                "check": "-",
+            })
+        for n, policy in ((41, "block"), (42, "allow")):
+            row, failed = check_redos_policy(monitor, clipboard, scanner, ruleset.engine, policy, n)
+            results.append(row)
+            problems.extend(failed)
+        monitor.stop()
+        thread.join()
+    finally:
+        scanner.close()
+        safeclip.g_ruleset, safeclip.ENABLE_LOG, safeclip.SCAN_OVERBUDGET_POLICY = saved
+    if problems:
+        print_table(results)
+        raise SystemExit("病态输入检查失败: " + "；".join(problems))
+    return results
+
+
+def bench_analyze(args):
+    """规则性能检查：静态检查容易灾难性回溯的结构，测量普通文本吞吐量和最坏情况耗时曲线"""
+    if args.config:
+        patterns = safeclip.load_ruleset(args.config).engine.rules
+    else:
+        patterns = safeclip.SENSITIVE_PATTERNS
+    results = []
+    for report in safeclip.analyze_rules(patterns):
+        row = {
+            "rule": report.rule_id,
+            "typical_mb_s": report.typical_mb_s,
+            "worst_len": report.worst_curve[-1][0],
+            "worst_ms": report.worst_curve[-1][1] * 1000,
+            "growth": report.growth,
+            "slow": report.slow,
+            "warnings": "; ".join(report.warnings) or "-",
+        }
+        if args.json:
+            row["curve"] = [{"len": length, "ms": seconds * 1000} for length, seconds in report.worst_curve]
+        results.append(row)
+    return results
+
+
+def bench_cache(args):
+    """粘贴时检查：命中检测结论缓存（仅计算摘要）vs 重新扫描"""
+    engine = safeclip.RuleEngine(safeclip.SENSITIVE_PATTERNS)
+    cache = safeclip.VerdictCache()
+    results = []
+    for size in PAYLOAD_SIZES:
+        text = make_payload(size, sensitive_tail=" 13812345678")
+        key = (safeclip.content_digest(text), engine.version)
+        cache.put(key, engine.evaluate(text))
+
+        def lookup(value):
+            return cache.get((safeclip.content_digest(value), engine.version))
+
+        rescan = time_call(engine.evaluate, text, args.min_time)
+        cached = time_call(lookup, text, args.min_time)
+        results.append({
+            "size": size,
+            "rescan_ms": rescan * 1000,
+            "cached_ms": cached * 1000,
+            "speedup": rescan / cached if cached else None,
+        })
+    return results
+
+
+def percentile(values, pct):
+    """计算百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_change_latency(mode, changes, gap, payload_size):
+    """模拟用户多次复制，测量从剪贴板变化到得出检测结论的延迟
+
+    mode 为 "event" 时等待后端的变化事件、只在序列号变化时读取内容；
+    为 "poll" 时按旧逻辑每 CHECK_INTERVAL 读取一次完整内容并比较字符串。
+    """
+    backend = safeclip.MemoryClipboardBackend()
+    engine = safeclip.RuleEngine(safeclip.SENSITIVE_PATTERNS)
+    stop = threading.Event()
+    changed_at = {}
+    latencies = []
+
+    def consumer():
+        last_count = backend.change_count()
+        last_content = ""
+        while not stop.is_set():
+            if mode == "event":
+                count = backend.wait_for_change(last_count, safeclip.CHECK_INTERVAL)
+                if count == last_count:
+                    continue
+                last_count = count
+                content = backend.snapshot().text
+            else:
+                time.sleep(safeclip.CHECK_INTERVAL)
+                content = backend.snapshot().text
+                if content == last_content:
+                    continue
+            last_content = content
+            engine.evaluate(content)
+            start = changed_at.get(content)
+            if start is not None:
+                latencies.append(time.perf_counter() - start)
+
+    worker = threading.Thread(target=consumer)
+    worker.start()
+    started = time.perf_counter()
+    for index in range(changes):
+        text = make_payload(payload_size, seed=index, sensitive_tail=f" {index}")
+        changed_at[text] = time.perf_counter()
+        backend.set_text(text)
+        time.sleep(gap)
+    time.sleep(safeclip.CHECK_INTERVAL * 2)
+    stop.set()
+    worker.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "changes": changes,
+        "detected": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+        "reads_per_s": backend.reads / elapsed,
+    }
+
+
+def bench_latency(args):
+    """剪贴板变化到检测结论的延迟：事件驱动后端 vs 固定间隔轮询"""
+    return [run_change_latency(mode, changes=40, gap=0.25, payload_size=10 * 1000)
+            for mode in ("event", "poll")]
+
+
+class FakeProcessTable:
+    """模拟进程表 - 统计进程名查询次数（真实系统中每次都是一次系统调用）"""
+
+    def __init__(self, count, seed=0):
+        self.rng = random.Random(seed)
+        self.next_pid = 1000
+        self.names = {}
+        self.started = {}  # pid -> 启动序号（模拟进程启动时间）
+        self.launches = 0
+        self.name_calls = 0
+        for _ in range(count):
+            self.spawn()
+        self.spawn("WeChat.exe")
+
+    def spawn(self, name=None, pid=None):
+        """启动进程；传入 pid 表示复用已退出进程的 PID"""
+        if pid is None:
+            self.next_pid += self.rng.randint(1, 7)
+            pid = self.next_pid
+        self.launches += 1
+        self.names[pid] = name or f"proc{pid}.exe"
+        self.started[pid] = self.launches
+
+    def churn(self, count):
+        """模拟进程启动/退出"""
+        for _ in range(count):
+            victim = self.rng.choice(list(self.names))
+            if self.names[victim] != "WeChat.exe":
+                del self.names[victim]
+            self.spawn()
+
+    def pids(self):
+        return list(self.names)
+
+    def name(self, pid):
+        self.name_calls += 1
+        return self.names.get(pid)
+
+    def create_time(self, pid):
+        return self.started.get(pid)
+
+
+def check_process_reuse(count):
+    """黑名单进程退出后 PID 在一个刷新周期内被普通进程复用（以及反过来），索引结果要随之变化"""
+    table = FakeProcessTable(count)
+    clock = [0.0]
+    index = safeclip.ProcessIndex(["WeChat.exe"], refresh_interval=2.0, list_pids=table.pids,
+                                  get_name=table.name, get_identity=table.create_time, clock=lambda: clock[0])
+    wechat = next(pid for pid, name in table.names.items() if name == "WeChat.exe")
+    other = next(pid for pid in table.names if pid != wechat)
+    expected = []
+    for pid, name, blocked in ((wechat, "notepad.exe", False), (other, "WeChat.exe", True)):
+        table.spawn(name, pid=pid)
+        clock[0] += 2.0
+        expected.append(index.is_blocked_running() == blocked)
+    return all(expected)
+
+
+def bench_processes(args):
+    """黑名单进程检测：进程索引 vs 每次遍历全部进程"""
+    blocked = ["WeChat.exe", "wechat.exe", "QQ.exe", "qq.exe", "TIM.exe", "tim.exe", "Telegram.exe", "telegram.exe"]
+    results = []
+    for count in (100, 400, 1000):
+        checks = 500
+        # 旧实现：每次检查都取全部进程名，再对每个黑名单名称做线性查找
+        table = FakeProcessTable(count)
+        start = time.perf_counter()
+        for index in range(checks):
+            if index % 20 == 0:
+                table.churn(3)
+            running = [table.name(pid) for pid in table.pids()]
+            any(proc in running for proc in blocked)
+        legacy = time.perf_counter() - start
+        legacy_calls = table.name_calls
+
+        # 进程索引：每次检查 O(1)，按刷新周期只查询新增 PID 的名称
+        table = FakeProcessTable(count)
+        clock = [0.0]
+        index_obj = safeclip.ProcessIndex(blocked, refresh_interval=2.0, list_pids=table.pids, get_name=table.name,
+                                          get_identity=table.create_time, clock=lambda: clock[0])
+        start = time.perf_counter()
+        for index in range(checks):
+            if index % 20 == 0:
+                table.churn(3)
+            clock[0] += safeclip.CHECK_INTERVAL
+            index_obj.is_blocked_running()
+        indexed = time.perf_counter() - start
+        stats = index_obj.stats()
+        results.append({
+            "processes": count,
+            "legacy_us": legacy / checks * 1e6,
+            "index_us": indexed / checks * 1e6,
+            "legacy_names": legacy_calls,
+            "index_names": table.name_calls,
+            "refreshes": stats["refreshes"],
+            "refresh_ms": stats["avg_refresh_ms"],
+            "staleness_s": stats["staleness_s"],
+            "pid_reuse": "pass" if check_process_reuse(count) else "FAIL",
+        })
+    if any(row["pid_reuse"] == "FAIL" for row in results):
+        print_table(results)
+        raise SystemExit("PID 被复用后进程索引没有更新")
+    return results
+
+
+def check_pid_reuse(resolver, clock):
+    """黑名单应用退出后 PID 被普通进程复用（以及反过来）：缓存的进程名不能沿用旧进程的"""
+    ok = True
+    for started, name in ((100.0, "WeChat.exe"), (200.0, "notepad.exe"), (300.0, "WeChat.exe")):
+        clock[0] += 1.0
+        resolver.set_foreground("聊天", name, 7777, started=started)
+        ok = ok and resolver.snapshot().process_name == name
+    return ok
+
+
+def bench_window(args):
+    """前台窗口查询：三个检测线程共享缓存快照 vs 各自查询系统；并检查 PID 被复用时不会沿用旧进程名"""
+    apps = [("微信", "WeChat.exe", 4242), ("safeclip.py - editor", "Code.exe", 5151),
+            ("Chrome", "chrome.exe", 6262)]
+    consumers = 3  # 监控线程、激进清理线程、键盘钩子线程
+    simulated_seconds = 60
+    results = []
+    for label, max_age in (("per_call", 0.0), ("shared", safeclip.CHECK_INTERVAL / 2)):
+        clock = [0.0]
+        resolver = safeclip.FakeWindowResolver(max_age=max_age, clock=lambda: clock[0])
+        ticks = int(simulated_seconds / safeclip.CHECK_INTERVAL)
+        start = time.perf_counter()
+        for tick in range(ticks):
+            clock[0] = tick * safeclip.CHECK_INTERVAL
+            if tick % 20 == 0:
+                title, name, pid = apps[(tick // 20) % len(apps)]
+                resolver.set_foreground(title, name, pid)
+            for _ in range(consumers):
+                resolver.snapshot()
+        elapsed = time.perf_counter() - start
+        stats = resolver.stats()
+        results.append({
+            "mode": label,
+            "snapshots": ticks * consumers,
+            "os_calls_per_s": resolver.os_calls / simulated_seconds,
+            "name_hits": stats["name_hits"],
+            "name_misses": stats["name_misses"],
+            "us_per_call": elapsed / (ticks * consumers) * 1e6,
+            "pid_reuse": "pass" if check_pid_reuse(resolver, clock) else "FAIL",
+        })
+    # 旧实现：每次调用 GetForegroundWindow + GetWindowText + GetWindowThreadProcessId + Process().name()
+    results.append({
+        "mode": "legacy",
+        "snapshots": int(simulated_seconds / safeclip.CHECK_INTERVAL) * consumers,
+        "os_calls_per_s": 4 * consumers / safeclip.CHECK_INTERVAL,
+        "name_hits": 0,
+        "name_misses": int(simulated_seconds / safeclip.CHECK_INTERVAL) * consumers,
+        "us_per_call": None,
+        "pid_reuse": "-",
+    })
+    if any(row["pid_reuse"] == "FAIL" for row in results):
+        print_table(results)
+        raise SystemExit("PID 被复用后沿用了旧进程的进程名")
+    return results
+
+
+def legacy_app_match(title, process_name, apps, processes):
+    """旧实现：每次转小写并逐个关键字做子串检查，进程名按原样在列表中查找"""
+    title_lower = title.lower()
+    for app in apps:
+        if app.lower() in title_lower:
+            return "title"
+    if process_name and process_name in processes:
+        return "process"
+    return None
+
+
+def bench_policy(args):
+    """黑名单应用匹配：旧的逐项检查 vs 编译后的匹配器（同一窗口每个周期重复检查）"""
+    title, process = "safeclip.py - editor", "Code.exe"
+    results = []
+    for size in (7, 100, 500):
+        apps = list(safeclip.BLOCKED_APPS) + [f"app{i}" for i in range(size - len(safeclip.BLOCKED_APPS))]
+        processes = [f"App{i}.exe" for i in range(size)] + [f"app{i}.exe" for i in range(size)]
+        legacy = time_call(lambda t: legacy_app_match(t, process, apps, processes), title, args.min_time)
+        policy = safeclip.AppPolicy(apps, processes)
+        cached = time_call(lambda t: policy.match(t, process), title, args.min_time)
+        fresh = time_call(lambda t: safeclip.AppPolicy._evaluate(policy, t, process), title, args.min_time)
+        results.append({
+            "entries": size,
+            "legacy_us": legacy * 1e6,
+            "compiled_us": fresh * 1e6,
+            "memoized_us": cached * 1e6,
+            "speedup": legacy / cached if cached else None,
+        })
+    return results
+
+
+def make_fake_monitor():
+    """用内存剪贴板、模拟窗口和模拟进程表搭建监控器"""
+    table = FakeProcessTable(400)
+    clipboard = safeclip.MemoryClipboardBackend()
+    resolver = safeclip.FakeWindowResolver()
+    resolver.set_foreground("safeclip.py - editor", "Code.exe", 5151)
+    index = safeclip.ProcessIndex(safeclip.BLOCKED_PROCESSES, list_pids=table.pids, get_name=table.name,
+                                  get_identity=table.create_time)
+    return safeclip.SafeClipMonitor(clipboard, resolver, index), table
+
+
+def run_legacy_idle(duration):
+    """模拟旧实现的线程结构：监控线程 10ms 自旋、清理线程 200ms、按键线程 10ms、主线程 100ms"""
+    monitor, table = make_fake_monitor()
+    stop = threading.Event()
+    wakeups = [0]
+
+    def loop(interval, work):
+        while not stop.is_set():
+            work()
+            wakeups[0] += 1
+            time.sleep(interval)
+
+    def monitor_work(state={"last": 0.0}):
+        now = time.time()
+        if now - state["last"] >= safeclip.CHECK_INTERVAL:
+            state["last"] = now
+            monitor.window_resolver.snapshot()
+            monitor.clipboard.snapshot()
+
+    def cleaner_work():
+        info = monitor.window_resolver.snapshot()
+        safeclip.is_blocked_window(info.title, info.process_name, monitor.process_index)
+
+    threads = [threading.Thread(target=loop, args=args) for args in (
+        (0.01, monitor_work), (0.2, cleaner_work), (0.01, lambda: None), (0.1, lambda: None))]
+    return run_for(duration, threads, stop.set, lambda: wakeups[0])
+
+
+def run_for(duration, threads, stop, wakeups):
+    """运行线程 duration 秒，返回每秒唤醒次数和 CPU 占用"""
+    cpu_start = time.process_time()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop()
+    for thread in threads:
+        thread.join()
+    return {
+        "wakeups_per_s": wakeups() / duration,
+        "cpu_ms_per_s": (time.process_time() - cpu_start) / duration * 1000,
+    }
+
+
+def bench_idle(args):
+    """空闲时（非黑名单应用在前台、剪贴板不变）的唤醒次数和 CPU 占用"""
+    duration = max(1.0, args.min_time * 10)
+    safeclip.ENABLE_LOG = False
+    try:
+        legacy = run_legacy_idle(duration)
+        monitor, _ = make_fake_monitor()
+        scheduler = monitor.scheduler
+        unified = run_for(duration, [threading.Thread(target=monitor.run)], monitor.stop,
+                          lambda: scheduler.wakeups)
+    finally:
+        safeclip.ENABLE_LOG = True
+    return [dict(mode="legacy_threads", **legacy), dict(mode="scheduler", **unified)]
+
+
+def bench_logging(args):
+    """检测线程写日志的耗时：旧的同步打开-追加-关闭 vs 异步队列"""
+    count = 5000
+    messages = ["当前窗口标题：safeclip.py - editor"] * (count // 2) + [f"剪贴板内容变化: {i}" for i in range(count // 2)]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_path = os.path.join(directory, "legacy_log.txt")
+        start = time.perf_counter()
+        for message in messages:
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+            with open(legacy_path, "a", encoding="utf-8") as f:
+                f.write(f"[{timestamp}] {message}\n")
+        legacy = time.perf_counter() - start
+        results.append({"mode": "sync", "us_per_call": legacy / count * 1e6,
+                        "lines_on_disk": sum(1 for _ in open(legacy_path, encoding="utf-8"))})
+
+        logger = safeclip.AsyncLogger(os.path.join(directory, "async_log.txt"), echo=False)
+        start = time.perf_counter()
+        for message in messages:
+            logger.log(message)
+        elapsed = time.perf_counter() - start
+        logger.close()
+        stats = logger.stats()
+        results.append({"mode": "async", "us_per_call": elapsed / count * 1e6,
+                        "lines_on_disk": stats["written"]})
+    return results
+
+
+def bench_huge(args):
+    """超大剪贴板内容：全文扫描 vs 分块扫描（受字符数和时间预算限制，缓存未命中）"""
+    engine = safeclip.g_ruleset.engine
+    results = []
+    for size in PAYLOAD_SIZES:
+        text = make_payload(size)
+
+        def bounded(value):
+            safeclip.g_verdict_cache.clear()
+            return safeclip.check_content(value)
+
+        full = time_call(engine.evaluate, text, args.min_time, max_repeat=20)
+        budgeted = time_call(bounded, text, args.min_time, max_repeat=20)
+        verdict = bounded(text)
+        results.append({
+            "size": size,
+            "full_ms": full * 1000,
+            "bounded_ms": budgeted * 1000,
+            "complete": verdict.complete,
+            "verdict": verdict.rule_id or "allow",
+        })
+    return results
+
+
+def make_redact_payload(size, every=1000, seed=0):
+    """生成每隔约 every 个字符出现一个手机号或身份证号的文本"""
+    rng = random.Random(seed)
+    every = min(every, size // 2)
+    parts = []
+    length = 0
+    while length < size:
+        filler = make_payload(every, seed=rng.randrange(1 << 30))
+        secret = f" 13{rng.randrange(10 ** 9):09d} " if rng.random() < 0.7 else f" {make_id_card(rng)} "
+        parts.append(filler)
+        parts.append(secret)
+        length += len(filler) + len(secret)
+    return "".join(parts)[:size]
+
+
+def legacy_redact(engine, text):
+    """逐条规则 re.sub（每条规则生成一份整段文本的副本，不做结构校验）"""
+    for _, pattern in engine.rules:
+        text = re.sub(pattern, lambda m: "*" * len(m.group(0)), text, flags=re.IGNORECASE)
+    return text
+
+
+def bench_redact(args):
+    """遮盖模式：单次扫描找出全部命中并一次拼接 vs 逐条规则 re.sub，对比现有的只检测扫描（命中即停止 / 全文扫描）"""
+    engine = safeclip.g_ruleset.engine
+    results = []
+    for size in PAYLOAD_SIZES:
+        text = make_redact_payload(size)
+
+        def redact(value):
+            spans, _ = engine.find_spans(value, max_chars=len(value), time_budget=float("inf"))
+            return safeclip.redact_text(value, spans)
+
+        spans, complete = engine.find_spans(text, max_chars=len(text), time_budget=float("inf"))
+        redacted = redact(text)
+        results.append({
+            "size": size,
+            "spans": len(spans),
+            "detect_ms": time_call(lambda value: safeclip.scan_text(engine, value), text, args.min_time) * 1000,
+            "full_scan_ms": time_call(engine.evaluate, text, args.min_time, max_repeat=50) * 1000,
+            "redact_ms": time_call(redact, text, args.min_time, max_repeat=50) * 1000,
+            "re_sub_ms": time_call(lambda value: legacy_redact(engine, value), text, args.min_time, max_repeat=20) * 1000,
+            # 遮盖后的文本不再命中任何规则
+            "clean": engine.scan(redacted) is None,
+        })
+    return results
+
+
+# 复制文件测试用例：(名称, 文件个数, 每个文件大小 MB)；多个文件时只有最后一个包含敏感内容
+FILE_CASES = [("1 x 1MB", 1, 1), ("1 x 16MB", 1, 16), ("1 x 64MB", 1, 64), ("4 x 16MB", 4, 16)]
+
+
+def write_csv(path, size_mb, seed, sensitive=True):
+    """生成 CSV 文件，sensitive 为 True 时敏感内容在末尾（最坏情况：读完整个文件才命中）"""
+    row = "\n".join(make_payload(1000, seed + i) for i in range(8)) + "\n"
+    block = row * (1024 * 1024 // len(row.encode("utf-8")) + 1)
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(size_mb):
+            f.write(block)
+        if sensitive:
+            f.write("联系人,13812345678\n")
+
+
+def read_all_scan(engine, paths):
+    """旧方式：整个文件读入内存后全文匹配，逐个文件串行"""
+    for path in paths:
+        with open(path, "rb") as f:
+            verdict = engine.evaluate(f.read().decode("utf-8", "replace"))
+        if verdict.sensitive:
+            return verdict
+    return safeclip.Verdict(False, None, (), True)
+
+
+def measure(func, *args):
+    """运行一次，返回 (结果, 耗时秒, 峰值 Python 内存 MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def bench_files(args):
+    """复制文件检测：整个读入后全文匹配（串行） vs 内存映射分块流式扫描（线程池并行）和缓存命中"""
+    engine = safeclip.g_ruleset.engine
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, count, size_mb in FILE_CASES:
+            paths = []
+            for i in range(count):
+                path = os.path.join(tmp, f"{name.replace(' ', '')}-{i}.csv")
+                write_csv(path, size_mb, i, sensitive=i == count - 1)
+                paths.append(path)
+            _, read_all, read_peak = measure(read_all_scan, engine, paths)
+            scanner = safeclip.FileScanner()
+            try:
+                verdict, stream, stream_peak = measure(lambda: scanner.submit(engine, paths).result())
+                _, cached, _ = measure(lambda: scanner.submit(engine, paths).result())
+            finally:
+                scanner.close()
+            results.append({
+                "case": name,
+                "read_all_ms": read_all * 1000,
+                "stream_ms": stream * 1000,
+                "cached_ms": cached * 1000,
+                "read_all_mb": read_peak,
+                "stream_mb": stream_peak,
+                "complete": verdict.complete,
+                "verdict": verdict.rule_id or "allow",
+            })
+    return results
+
+
+# 回放时使用的模拟应用：(窗口标题, 进程名, pid)
+TRACE_APPS = [
+    ("微信", "WeChat.exe", 4242),
+    ("QQ", "QQ.exe", 4343),
+    ("safeclip.py - editor", "Code.exe", 5151),
+    ("Chrome", "chrome.exe", 6262),
+    ("终端", "Terminal.exe", 7373),
+]
+
+# 回放时使用的剪贴板内容
+TRACE_SENSITIVE_TEXTS = ["客户电话 13812345678", "身份证 110101199003077774", "订单号 202510170000123456", "联系人 李四"]
+TRACE_NORMAL_TEXTS = ["下午三点开会", "https://example.com/report", "order #12345 shipped", "ok 收到"]
+
+
+def bench_metrics(args):
+    """运行指标的开销：检测一次已缓存的内容，关闭指标 vs 开启指标"""
+    text = make_payload(1000)
+    safeclip.check_content(text)
+    results = []
+    saved = safeclip.g_metrics.enabled
+    try:
+        for enabled in (False, True):
+            safeclip.g_metrics.enabled = enabled
+            seconds = time_call(safeclip.check_content, text, args.min_time)
+            results.append({"metrics": "on" if enabled else "off", "us_per_call": seconds * 1e6})
+        if args.json:
+            results.append({"snapshot": safeclip.g_metrics.snapshot()})
+    finally:
+        safeclip.g_metrics.enabled = saved
+    return results
+
+
+# 图片分辨率：(宽, 高)
+IMAGE_SIZES = [(640, 480), (1920, 1080), (3840, 2160), (7680, 4320)]
+
+# 图片名单大小
+IMAGE_INDEX_SIZES = [10, 1000, 100 * 1000, 1000 * 1000]
+
+
+def make_dib(np, width, height, seed=0):
+    """生成 32 位 CF_DIB 数据（渐变背景上的随机色块，自下而上存储）"""
+    rng = np.random.default_rng(seed)
+    ys, xs = np.mgrid[0:height, 0:width]
+    pixels = np.zeros((height, width, 4), np.uint8)
+    pixels[..., 0] = xs * 255 // width
+    pixels[..., 1] = ys * 255 // height
+    pixels[..., 2] = (xs + ys) % 256
+    for _ in range(8):
+        x, y = rng.integers(0, width // 2), rng.integers(0, height // 2)
+        pixels[y:y + height // 4, x:x + width // 4, :3] = rng.integers(0, 256, 3)
+    header = struct.pack("<IiiHHIIiiII", 40, width, height, 1, 32, safeclip.BI_RGB, 0, 0, 0, 0, 0)
+    return header + pixels[::-1].tobytes()
+
+
+def bench_images(args):
+    """图片名单：解码 + 感知指纹耗时随分辨率的变化（抽样 vs 全分辨率缩小），名单查询耗时随名单大小的变化
+    （向量化汉明距离 vs 逐条比较）"""
+    np = safeclip.load_numpy()
+    if np is None:
+        raise SystemExit("images 基准需要 numpy")
+    results = []
+    for width, height in IMAGE_SIZES:
+        data = make_dib(np, width, height)
+
+        def phash(value):
+            return safeclip.image_phash(safeclip.decode_clipboard_image(value))
+
+        sampled = time_call(phash, data, args.min_time, max_repeat=100)
+        sample = safeclip.PHASH_SAMPLE
+        safeclip.PHASH_SAMPLE = 1 << 30
+        try:
+            full = time_call(phash, data, args.min_time, max_repeat=20)
+            full_hash = phash(data)
+        finally:
+            safeclip.PHASH_SAMPLE = sample
+        results.append({
+            "case": f"hash {width}x{height}",
+            "size": width * height,
+            "ms": sampled * 1000,
+            "baseline_ms": full * 1000,
+            # 抽样与全分辨率指纹的汉明距离
+            "result": bin(phash(data) ^ full_hash).count("1"),
+        })
+    rng = random.Random(0)
+    probe = rng.getrandbits(64)
+    for size in IMAGE_INDEX_SIZES:
+        hashes = [rng.getrandbits(64) for _ in range(size)]
+        index = safeclip.ImageHashIndex([(value, "") for value in hashes])
+        index.nearest(probe)  # 生成数组
+
+        def naive(value):
+            return min(bin(value ^ item).count("1") for item in hashes)
+
+        vectorized = time_call(lambda value: index.nearest(value)[0], probe, args.min_time, max_repeat=200)
+        loop = time_call(naive, probe, args.min_time, max_repeat=20)
+        results.append({
+            "case": f"lookup {size}",
+            "size": size,
+            "ms": vectorized * 1000,
+            "baseline_ms": loop * 1000,
+            "result": index.nearest(probe)[0],
+        })
+    return results
+
+
+def bench_notify(args):
+    """拦截提示：每次拦截启动一个线程显示提示框（旧结构） vs 去重合并的提示队列
+
+    模拟一次连续拦截：三种提示交替出现，每个提示框需要用户 50 ms 才能关闭。
+    """
+    messages = [f"检测到敏感内容 #{i % 3}，已清空剪贴板" for i in range(60)]
+    dialog_time = 0.05
+    results = []
+
+    shown = [0]
+    peak = [0]
+    active = [0]
+    lock = threading.Lock()
+
+    def slow_show(title, message):
+        with lock:
+            shown[0] += 1
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(dialog_time)
+        with lock:
+            active[0] -= 1
+
+    threads = []
+    start = time.perf_counter()
+    for message in messages:
+        thread = threading.Thread(target=slow_show, args=("SafeClip 安全拦截", message))
+        thread.start()
+        threads.append(thread)
+    enqueue = time.perf_counter() - start
+    for thread in threads:
+        thread.join()
+    results.append({"dispatcher": "thread", "blocks": len(messages), "dialogs": shown[0],
+                    "peak_open": peak[0], "threads": len(threads),
+                    "us_per_block": enqueue / len(messages) * 1e6, "avg_latency_ms": 0.0})
+
+    shown[0] = peak[0] = 0
+    notifier = safeclip.Notifier(show=slow_show, dedup_window=1.0, min_interval=0.1)
+    enqueue = 0.0
+    for message in messages:
+        start = time.perf_counter()
+        notifier.notify("SafeClip 安全拦截", message)
+        enqueue += time.perf_counter() - start
+        time.sleep(0.002)  # 拦截之间的间隔
+    time.sleep(0.3)
+    notifier.close()
+    stats = notifier.stats()
+    accounted = stats["displayed"] + stats["coalesced"] + stats["deduplicated"] + stats["dropped"] + stats["queued"]
+    if accounted != stats["requests"]:
+        raise SystemExit(f"提示计数不一致: {accounted} != {stats['requests']}（{stats}）")
+    results.append({"dispatcher": "notifier", "blocks": len(messages), "dialogs": stats["shown"],
+                    "peak_open": peak[0], "threads": 1,
+                    "us_per_block": enqueue / len(messages) * 1e6, "avg_latency_ms": stats["avg_latency_ms"]})
+    if args.json:
+        results.append({"notifier_stats": stats})
+    return results
+
+
+class LocalCollector:
+    """本机事件收集端（测试用）：接收 gzip 压缩的 JSONL 批次，统计请求数、事件数和连接数；
+    fail_first 个请求返回 503，用来测试退避重试"""
+
+    def __init__(self, fail_first=0):
+        collector = self
+        self.requests = 0
+        self.events = []
+        self.connections = 0
+        self.bytes = 0
+        self.fail_first = fail_first
+        self._lock = threading.Lock()
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 保持连接
+
+            def setup(self):
+                super().setup()
+                with collector._lock:
+                    collector.connections += 1
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with collector._lock:
+                    collector.requests += 1
+                    collector.bytes += len(body)
+                    fail = collector.requests <= collector.fail_first
+                    if not fail:
+                        if self.headers.get("Content-Encoding") == "gzip":
+                            body = gzip.decompress(body)
+                        collector.events.extend(json.loads(line) for line in body.splitlines() if line)
+                status = 503 if fail else 200
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/events"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def bench_ship(args):
+    """拦截事件上报：每个事件单独 POST（新连接、未压缩） vs 攒批压缩 + 保持连接 + 本地缓存
+
+    per_event_us 是检测线程上每个事件的耗时；outage 场景中收集端前 3 个请求返回 503。
+    """
+    count = 2000
+    fields = {"content": "text", "rule": "id_card_18", "app": "title", "title": "微信", "process": "WeChat.exe",
+              "digest": "30b3746492f16cf442723dad9db3cf80", "reason": "当前窗口在黑名单中，拦截敏感内容"}
+    results = []
+
+    collector = LocalCollector()
+    start = time.perf_counter()
+    for i in range(count):
+        data = json.dumps(dict(fields, t=time.time(), type="block", seq=i), ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(collector.url, data=data, headers={"Content-Type": "application/json"})
+        urllib.request.urlopen(request).read()
+    elapsed = time.perf_counter() - start
+    results.append({"mode": "per_event", "events": count, "delivered": len(collector.events),
+                    "requests": collector.requests, "connections": collector.connections, "kbytes": collector.bytes / 1024,
+                    "per_event_us": elapsed / count * 1e6, "deliver_s": elapsed, "send_ms": elapsed / count * 1000})
+    collector.close()
+
+    enable_log = safeclip.ENABLE_LOG
+    safeclip.ENABLE_LOG = False
+    try:
+        for scenario, fail_first in (("batched", 0), ("outage", 3)):
+            collector = LocalCollector(fail_first)
+            with tempfile.TemporaryDirectory() as spool:
+                shipper = safeclip.EventShipper(collector.url, spool_dir=spool, flush_interval=0.05,
+                                                max_backoff=0.05)
+                start = time.perf_counter()
+                for i in range(count):
+                    shipper.ship("block", time.time(), dict(fields, seq=i))
+                enqueue = time.perf_counter() - start
+                while len(collector.events) < count and time.perf_counter() - start < 30:
+                    time.sleep(0.005)
+                elapsed = time.perf_counter() - start
+                stats = shipper.stats()
+                shipper.close()
+            collector.close()
+            results.append({"mode": scenario, "events": count, "delivered": len(collector.events),
+                            "requests": collector.requests, "connections": collector.connections,
+                            "kbytes": collector.bytes / 1024, "per_event_us": enqueue / count * 1e6,
+                            "deliver_s": elapsed, "send_ms": stats["last_send_ms"]})
+    finally:
+        safeclip.ENABLE_LOG = enable_log
+    return results
+
+
+def generate_trace(duration, seed=0):
+    """生成模拟的操作序列：窗口切换、复制（文本/图片）和粘贴"""
+    rng = random.Random(seed)
+    events = []
+    t = 0.0
+    while t < duration:
+        t += rng.uniform(2.0, 20.0)
+        title, process, pid = rng.choice(TRACE_APPS)
+        events.append({"t": round(t, 3), "type": "focus", "title": title, "process": process, "pid": pid})
+        for _ in range(rng.randint(0, 3)):
+            t += rng.uniform(0.5, 8.0)
+            roll = rng.random()
+            if roll < 0.05:
+                events.append({"t": round(t, 3), "type": "copy", "text": "", "image": True})
+            else:
+                texts = TRACE_SENSITIVE_TEXTS if roll < 0.35 else TRACE_NORMAL_TEXTS
+                events.append({"t": round(t, 3), "type": "copy", "text": rng.choice(texts)})
+            if rng.random() < 0.5:
+                t += rng.uniform(0.05, 1.5)
+                events.append({"t": round(t, 3), "type": "paste"})
+    return [event for event in events if event["t"] < duration]
+
+
+class RecordingClipboard(safeclip.MemoryClipboardBackend):
+    """记录系统调用次数和清空时间的内存剪贴板"""
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+        self.count_calls = 0
+        self.clears = []
+
+    def change_count(self):
+        self.count_calls += 1
+        return super().change_count()
+
+    def clear(self):
+        self.clears.append(self.clock())
+        super().clear()
+
+    def replace_text(self, text):
+        self.clears.append(self.clock())
+        return super().replace_text(text)
+
+
+def replay_trace(events, duration, journal_path=None):
+    """在模拟时钟上回放操作序列，驱动 safeclip.py 中的监控器
+
+    模拟时钟在调度间隔之外还会加上每次处理的真实耗时，所以延迟同时反映调度节奏和处理开销。
+    “暴露”指敏感内容（或图片）位于剪贴板且黑名单应用在前台；暴露开始到剪贴板被清空的时间即拦截延迟。
+    """
+    sim = [0.0]
+    running_since = [None]  # 调度器运行期间模拟时钟随真实时间前进
+
+    def clock():
+        if running_since[0] is None:
+            return sim[0]
+        return sim[0] + time.perf_counter() - running_since[0]
+
+    table = FakeProcessTable(400)
+    clipboard = RecordingClipboard(clock)
+    resolver = safeclip.FakeWindowResolver(clock=clock)
+    index = safeclip.ProcessIndex(safeclip.BLOCKED_PROCESSES or ["WeChat.exe", "QQ.exe"],
+                                  list_pids=table.pids, get_name=table.name, get_identity=table.create_time,
+                                  clock=clock)
+    notifier = safeclip.Notifier(show=lambda title, message: None)
+    # 事件日志使用模拟时钟（从 Unix 时间 0 开始）
+    journal = safeclip.EventJournal(journal_path, clock=clock) if journal_path else None
+    monitor = safeclip.SafeClipMonitor(clipboard, resolver, index, clock=clock, notifier=notifier,
+                                       journal=journal)
+
+    exposure = {"start": None}
+    latencies = []
+    stats = {"exposures": 0, "escaped": 0, "leaked_pastes": 0, "pastes": 0, "wakeups": 0}
+
+    def exposed():
+        window = resolver._foreground
+        title = window[0]
+        process = resolver._processes.get(window[1], (None, ""))[1]
+        if not safeclip.is_blocked_window(title, process, index):
+            return False
+        # 直接读取内存剪贴板的状态，不计入系统调用次数
+        return clipboard._image or safeclip.check_content(clipboard._text).sensitive
+
+    def track(cleared_before):
+        now_exposed = exposed()
+        if now_exposed and exposure["start"] is None:
+            exposure["start"] = sim[0]
+            stats["exposures"] += 1
+        elif not now_exposed and exposure["start"] is not None:
+            if len(clipboard.clears) > cleared_before:
+                latencies.append(clipboard.clears[-1] - exposure["start"])
+            else:
+                stats["escaped"] += 1
+            exposure["start"] = None
+
+    events = sorted(events, key=lambda event: event["t"])
+    position = 0
+    next_due = 0.0
+    cpu_start = time.process_time()
+    while True:
+        next_event = events[position]["t"] if position < len(events) else None
+        if next_event is not None and next_event <= next_due:
+            event = events[position]
+            position += 1
+            sim[0] = max(sim[0], event["t"])
+            cleared_before = len(clipboard.clears)
+            if event["type"] == "focus":
+                resolver.set_foreground(event["title"], event.get("process", ""), event.get("pid", 0))
+            elif event["type"] == "copy":
+                clipboard.set_text(event.get("text", ""), image=event.get("image", False))
+            elif event["type"] == "paste":
+                stats["pastes"] += 1
+                if exposure["start"] is not None:
+                    stats["leaked_pastes"] += 1
+                monitor.handle_paste()
+            track(cleared_before)
+            next_due = min(next_due, sim[0])
+            continue
+        if next_due > duration:
+            break
+        sim[0] = max(sim[0], next_due)
+        cleared_before = len(clipboard.clears)
+        running_since[0] = time.perf_counter()
+        next_due = monitor.scheduler.run_pending(sim[0])
+        sim[0] = clock()
+        running_since[0] = None
+        stats["wakeups"] += 1
+        track(cleared_before)
+    cpu = time.process_time() - cpu_start
+    notifier.close()
+    if journal is not None:
+        journal.close()
+
+    return {
+        "simulated_s": duration,
+        "events": len(events),
+        "blocks": monitor.blocks,
+        "exposures": stats["exposures"],
+        "escaped": stats["escaped"],
+        "pastes": stats["pastes"],
+        "leaked_pastes": stats["leaked_pastes"],
+        "latency_p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "latency_p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+        "latency_max_ms": max(latencies) * 1000 if latencies else None,
+        "cpu_s_per_hour": cpu / duration * 3600,
+        "wakeups_per_s": stats["wakeups"] / duration,
+        "os_calls": {
+            "clipboard_sequence": clipboard.count_calls,
+            "clipboard_reads": clipboard.reads,
+            "clipboard_clears": len(clipboard.clears),
+            "window_queries": resolver.os_calls,
+            "process_names": table.name_calls,
+        },
+        "os_calls_per_s": (clipboard.count_calls + clipboard.reads + len(clipboard.clears)
+                           + resolver.os_calls + table.name_calls) / duration,
+    }
+
+
+def journal_to_trace(path, texts=None, since=None, until=None):
+    """把事件日志转换为操作序列（时间从第一条记录起算）
+
+    事件日志只有剪贴板内容的摘要：texts（摘要 -> 原文）中有的内容用原文回放，由检测引擎重新判断；
+    其余内容用占位文本回放，并把记录下的检测结论预先放入缓存，窗口、频率和拦截逻辑仍然完整运行。
+    记录的时间是监控器观察到变化的时间，所以回放得到的延迟是从观察到变化到清空剪贴板的处理延迟。
+    """
+    texts = texts or {}
+    events = []
+    recorded = {}  # 摘要 -> 记录下的 (是否敏感, 规则ID)
+    info = {"records": 0, "recorded_blocks": 0, "resolved_texts": 0, "placeholders": 0}
+    start = None
+    # 上一条是拦截记录：紧随其后的空剪贴板（遮盖模式下为遮盖后的文本）是监控器自己写入的，回放时由监控器自己产生
+    cleared = False
+    redacted = None
+    for entry in safeclip.iter_journal(path, types=("focus", "clipboard", "verdict", "paste", "block"),
+                                       since=since, until=until):
+        info["records"] += 1
+        if start is None:
+            start = entry["t"]
+        t = round(entry["t"] - start, 3)
+        kind = entry["type"]
+        if kind == "focus":
+            events.append({"t": t, "type": "focus", "title": entry.get("title", ""),
+                           "process": entry.get("process", ""), "pid": entry.get("pid", 0)})
+        elif kind == "clipboard":
+            digest = entry.get("digest")
+            if cleared and digest == redacted:
+                cleared = False
+                continue
+            cleared = False
+            if digest is None:
+                text = ""
+            elif digest in texts:
+                text = texts[digest]
+                info["resolved_texts"] += 1
+            else:
+                text = f"\0journal:{digest}"
+                info["placeholders"] += 1
+            if digest is not None and not entry.get("pending"):
+                recorded[digest] = (entry.get("sensitive", False), entry.get("rule"))
+            events.append({"t": t, "type": "copy", "text": text, "image": "image" in entry.get("formats", ())})
+        elif kind == "verdict" and entry.get("digest"):
+            # 文件扫描结论（digest 为空）不对应剪贴板文本
+            recorded[entry["digest"]] = (entry.get("sensitive", False), entry.get("rule"))
+        elif kind == "paste":
+            events.append({"t": t, "type": "paste"})
+        elif kind == "block":
+            info["recorded_blocks"] += 1
+            cleared = True
+            redacted = entry.get("redacted")
+    # 占位文本使用记录下的检测结论
+    for digest, (sensitive, rule_id) in recorded.items():
+        if digest not in texts:
+            placeholder = f"\0journal:{digest}"
+            verdict = safeclip.Verdict(sensitive, rule_id, (), True)
+            safeclip.g_verdict_cache.put(safeclip.verdict_key(placeholder), verdict)
+    return events, info
+
+
+def load_texts(path, key_path=None):
+    """读取候选原文（每行一条），用本机摘要密钥（与写事件日志时相同）按摘要建立索引"""
+    try:
+        safeclip.g_digest_key = safeclip.load_digest_key(key_path)
+    except FileNotFoundError:
+        print(f"未找到摘要密钥 {key_path or safeclip.DIGEST_KEY_FILE}，按不带密钥的摘要匹配原文", file=sys.stderr)
+    texts = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            text = line.rstrip("\n")
+            if text:
+                texts[safeclip.verdict_key(text)[0]] = text
+    return texts
+
+
+def bench_replay(args):
+    """回放操作序列：拦截延迟 p50/p99、每模拟小时 CPU 时间和系统调用次数（JSON）"""
+    journal_info = None
+    if args.config:
+        safeclip.set_ruleset(safeclip.load_ruleset(args.config))
+    if args.journal:
+        texts = load_texts(args.texts, args.digest_key) if args.texts else {}
+        events, journal_info = journal_to_trace(args.journal, texts, args.since, args.until)
+        duration = args.duration or (max(event["t"] for event in events) + 1.0 if events else 1.0)
+    elif args.trace:
+        with open(args.trace, encoding="utf-8") as f:
+            events = json.load(f)
+        duration = args.duration or (max(event["t"] for event in events) + 1.0 if events else 1.0)
+    else:
+        duration = args.duration or 3600.0
+        events = generate_trace(duration, args.seed)
+    if args.save_trace:
+        with open(args.save_trace, "w", encoding="utf-8") as f:
+            json.dump(events, f, ensure_ascii=False, indent=1)
+
+    enable_log = safeclip.ENABLE_LOG
+    safeclip.ENABLE_LOG = False
+    try:
+        result = replay_trace(events, duration, args.save_journal)
+    finally:
+        safeclip.ENABLE_LOG = enable_log
+    result["trace"] = args.journal or args.trace or f"generated(seed={args.seed})"
+    result["check_interval"] = safeclip.CHECK_INTERVAL
+    if journal_info is not None:
+        result["journal"] = journal_info
+    return result
+
+
+def bench_cadence(args):
+    """自适应检测频率：固定 100ms vs 空闲退避（回放同一操作序列，对比唤醒次数、CPU 和拦截延迟）"""
+    duration = args.duration or 3600.0
+    scenarios = [
+        ("idle", [{"t": 0.0, "type": "focus", "title": "safeclip.py - editor", "process": "Code.exe", "pid": 5151}]),
+        ("trace", generate_trace(duration, args.seed)),
+    ]
+    saved = (safeclip.ENABLE_LOG, safeclip.MAX_CHECK_INTERVAL)
+    results = []
+    try:
+        safeclip.ENABLE_LOG = False
+        for scenario, events in scenarios:
+            for mode, max_interval in (("fixed", safeclip.CHECK_INTERVAL), ("adaptive", saved[1])):
+                safeclip.MAX_CHECK_INTERVAL = max_interval
+                result = replay_trace(events, duration)
+                results.append({
+                    "scenario": scenario,
+                    "mode": mode,
+                    "max_interval_s": max_interval,
+                    "wakeups_per_s": result["wakeups_per_s"],
+                    "cpu_s_per_hour": result["cpu_s_per_hour"],
+                    "os_calls_per_s": result["os_calls_per_s"],
+                    "blocks": result["blocks"],
+                    "escaped": result["escaped"],
+                    "latency_p99_ms": result["latency_p99_ms"],
+                })
+    finally:
+        safeclip.ENABLE_LOG, safeclip.MAX_CHECK_INTERVAL = saved
+    return results
+
+
+def print_table(results):
+    """以表格形式输出结果"""
+    if not results:
+        return
+    columns = list(results[0].keys())
+    print("  ".join(f"{c:>12}" for c in columns))
+    for row in results:
+        cells = []
+        for c in columns:
+            value = row[c]
+            cells.append(f"{value:>12.4f}" if isinstance(value, float) else f"{str(value):>12}")
+        print("  ".join(cells))
+
+
+BENCHMARKS = {
+    "rules": bench_rules,
+    "validators": bench_validators,
+    "redos": bench_redos,
+    "analyze": bench_analyze,
+    "cache": bench_cache,
+    "latency": bench_latency,
+    "processes": bench_processes,
+    "window": bench_window,
+    "policy": bench_policy,
+    "idle": bench_idle,
+    "logging": bench_logging,
+    "huge": bench_huge,
+    "replay": bench_replay,
+    "cadence": bench_cadence,
+    "metrics": bench_metrics,
+    "notify": bench_notify,
+    "ship": bench_ship,
+    "files": bench_files,
+    "images": bench_images,
+    "redact": bench_redact,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SafeClip 性能基准")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每个用例的最少测量时间（秒）")
+    parser.add_argument("--trace", help="replay: 回放的操作序列文件（JSON），不指定时自动生成")
+    parser.add_argument("--save-trace", help="replay: 保存本次使用的操作序列")
+    parser.add_argument("--duration", type=float, help="replay: 模拟时长（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="replay: 生成操作序列的随机种子")
+    parser.add_argument("--config", help="analyze: 检查此配置文件中的规则（默认检查内置规则）；replay: 使用此配置回放")
+    parser.add_argument("--journal", help="replay: 回放事件日志（包括轮转分段）")
+    parser.add_argument("--save-journal", help="replay: 把本次回放写入事件日志（模拟时钟）")
+    parser.add_argument("--texts", help="replay --journal: 候选原文文件（每行一条），摘要相同的内容用原文重新检测")
+    parser.add_argument("--digest-key", help="replay --texts: 写事件日志的那台机器的摘要密钥文件（默认为本机的 DIGEST_KEY_FILE）")
+    parser.add_argument("--since", type=float, help="replay --journal: 起始时间（Unix 时间戳）")
+    parser.add_argument("--until", type=float, help="replay --journal: 结束时间（Unix 时间戳）")
+    args = parser.parse_args()
+
+    results = BENCHMARKS[args.benchmark](args)
+    if args.json or isinstance(results, dict):
+        json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+SafeClip 事件日志工具 - 逐行读取事件日志（包括所有轮转分段），过滤和汇总，内存占用与日志大小无关
+
+用法:
+    python3 safeclip_journal.py stats                          # 按类型、规则、应用汇总
+    python3 safeclip_journal.py stats --since 2026-10-01 --until 2026-10-08
+    python3 safeclip_journal.py show --type block              # 输出过滤后的记录（JSONL）
+    python3 safeclip_journal.py show --type block --rule id_card_18 --process WeChat.exe
+    python3 safeclip_journal.py stats --journal /path/to/safeclip_events.jsonl --json
+
+回放事件日志（通过检测引擎重现拦截过程并测量延迟）见 safeclip_bench.py replay --journal。
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from datetime import datetime
+
+import safeclip
+
+
+def parse_time(value):
+    """时间参数：Unix 时间戳或 ISO 格式（2026-10-17 / 2026-10-17T09:30）"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def select(args):
+    """按命令行参数过滤记录（生成器）"""
+    for entry in safeclip.iter_journal(args.journal, types=args.type, since=args.since, until=args.until):
+        if args.rule and entry.get("rule") != args.rule:
+            continue
+        if args.process and str(entry.get("process", "")).casefold() != args.process.casefold():
+            continue
+        yield entry
+
+
+def summarize(entries):
+    """汇总记录：各类型数量、拦截按规则/应用/内容类型/处理方式计数、每天的拦截数和时间范围"""
+    types = Counter()
+    rules = Counter()
+    apps = Counter()
+    contents = Counter()
+    actions = Counter()
+    days = Counter()
+    sensitive_copies = 0
+    first = last = None
+    for entry in entries:
+        types[entry["type"]] += 1
+        t = entry["t"]
+        first = t if first is None else min(first, t)
+        last = t if last is None else max(last, t)
+        if entry["type"] == "clipboard" and entry.get("sensitive"):
+            sensitive_copies += 1
+        elif entry["type"] == "block":
+            rules[entry.get("rule") or "-"] += 1
+            apps[entry.get("process") or entry.get("title") or "-"] += 1
+            contents[entry.get("content") or "-"] += 1
+            actions[entry.get("action") or "clear"] += 1
+            days[datetime.fromtimestamp(t).strftime("%Y-%m-%d")] += 1
+
+    def stamp(value):
+        return datetime.fromtimestamp(value).isoformat(timespec="seconds") if value is not None else None
+
+    return {
+        "records": sum(types.values()),
+        "first": stamp(first),
+        "last": stamp(last),
+        "types": dict(types.most_common()),
+        "sensitive_copies": sensitive_copies,
+        "blocks_by_rule": dict(rules.most_common()),
+        "blocks_by_app": dict(apps.most_common()),
+        "blocks_by_content": dict(contents.most_common()),
+        "blocks_by_action": dict(actions.most_common()),
+        "blocks_by_day": dict(sorted(days.items())),
+    }
+
+
+def print_summary(summary):
+    """以文本形式输出汇总"""
+    print(f"记录数: {summary['records']}  时间范围: {summary['first']} ~ {summary['last']}")
+    print(f"敏感内容复制: {summary['sensitive_copies']}")
+    for title, key in (("记录类型", "types"), ("拦截（按规则）", "blocks_by_rule"),
+                       ("拦截（按应用）", "blocks_by_app"), ("拦截（按内容）", "blocks_by_content"),
+                       ("拦截（按处理方式）", "blocks_by_action"), ("拦截（按天）", "blocks_by_day")):
+        if summary[key]:
+            print(f"{title}:")
+            for name, count in summary[key].items():
+                print(f"  {count:>10}  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SafeClip 事件日志工具")
+    parser.add_argument("command", choices=["stats", "show"])
+    parser.add_argument("--journal", default=safeclip.JOURNAL_FILE or "safeclip_events.jsonl",
+                        help="事件日志路径（自动包含 .1、.2 等轮转分段）")
+    parser.add_argument("--type", action="append", choices=safeclip.JOURNAL_TYPES,
+                        help="只保留此类型的记录（可重复）")
+    parser.add_argument("--since", type=parse_time, help="起始时间（含）")
+    parser.add_argument("--until", type=parse_time, help="结束时间（不含）")
+    parser.add_argument("--rule", help="只保留命中此规则的记录")
+    parser.add_argument("--process", help="只保留此进程的记录（不区分大小写）")
+    parser.add_argument("--json", action="store_true", help="stats: 以 JSON 输出")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        try:
+            for entry in select(args):
+                sys.stdout.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except BrokenPipeError:
+            # 输出被 head 等命令提前关闭；退出时不再向已关闭的管道写入
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return
+    summary = summarize(select(args))
+    if args.json:
+        json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
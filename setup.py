@@ -13,8 +13,10 @@ OPTIONS = {
         'CFBundleShortVersionString': '1.0.0',
         'NSHumanReadableCopyright': 'Copyright © 2025 SafeClip. All rights reserved.',
     },
-    'packages': ['pyperclip', 'psutil'],
-    'includes': ['re', 'time', 'threading', 'sys', 'os', 'subprocess', 'traceback', 'datetime', 'platform'],
+    'packages': ['pyperclip', 'psutil', 'numpy'],
+    # AppKit/Quartz 在 safeclip.py 中按需导入（importlib），需要显式包含
+    'includes': ['re', 'time', 'threading', 'sys', 'os', 'subprocess', 'traceback', 'datetime', 'platform',
+                 'AppKit', 'Quartz'],
 }
 
 setup(